@@ -1,90 +1,871 @@
 import dash
-from dash import dcc, html, Input, Output, State, ctx
+from dash import (callback, clientside_callback, dash_table, dcc, html, Input, Output, State, Patch,
+                  ClientsideFunction, ctx)
 import pandas as pd
 import plotly.graph_objects as go
-import base64
-import io
-import plotly.express as px
-
-app = dash.Dash(__name__)
-
-app.layout = html.Div([
-    html.H2("IsoPS Window Designer"),
-
-    dcc.Upload(
-        id="upload-data",
-        children=html.Button("Upload CSV", style={"margin-bottom": "20px"}),
-        accept=".csv"
-    ),
-
-    dcc.Graph(
-        id="scatter-plot",
-        config={
-            'editable': True,
-            'edits': {'shapePosition': True},
-            'modeBarButtonsToAdd': ['drawline', 'eraseshape']
+import binascii
+import functools
+import hashlib
+import importlib.util
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import cached_property
+import numpy as np
+from plotly.colors import qualitative
+
+# Callbacks are registered at import, so these stay at module level: dash itself
+# imports plotly.graph_objects and pandas, and the isops modules add about 15 ms
+from isops.background import DEFAULT_RT_TOLERANCE, BackgroundLibrary, add_interference
+from isops.engine import apply_precursor_dtypes, auto_fill_lines, build_mz_index, read_precursors, seed_lines
+from isops.envelope import DEFAULT_ISOTOPES, NOMINAL_SPACING, IsotopeEnvelope
+from isops.export import FORMATS, HAVE_PYARROW, MEDIA_TYPES, WindowAssignment, export_filename
+from isops.metrics import CallbackMetrics, dataframe_timer, peak_rss_bytes
+from isops.project import Project, is_project, read_project, write_project
+from isops.pyramid import MzPyramid
+from isops.segments import (SegmentIndex, merge_segment, segment_label, segment_mask, split_segment, whole_gradient,
+                            with_segment_lines)
+from isops.store import SharedUploadStore
+from isops.solver import DEFAULT_MARGIN_END, DEFAULT_MARGIN_START, solve_boundaries
+from isops.sweep import RESULT_COLUMNS, parameter_grid, parse_values, run_sweep
+from isops.violations import EnvelopeIndex, ViolationTracker
+from isops.window_stats import STATS_COLUMNS, WindowStats
+
+# Multi-worker deployments (see wsgi.py) point ISOPS_STATE_DIR at a directory all
+# workers share; uploads and background job results are kept there
+STATE_DIR = os.environ.get("ISOPS_STATE_DIR")
+
+# Optional background precursor library (built with "python -m isops library") whose
+# co-isolated precursors are counted in exports; memory-mapped, so each worker opens it for free
+BACKGROUND_LIBRARY_DIR = os.environ.get("ISOPS_BACKGROUND_LIBRARY")
+background_library = BackgroundLibrary(BACKGROUND_LIBRARY_DIR) if BACKGROUND_LIBRARY_DIR else None
+
+
+# Isotope envelope of every target: ISOPS_ISOTOPES peaks from MZ, ISOPS_ISOTOPE_SPACING / Charge
+# apart (1, as in MZp1/MZp2 of prepared tables, or 1.00336 for the 13C spacing)
+ISOTOPES = int(os.environ.get("ISOPS_ISOTOPES", DEFAULT_ISOTOPES))
+ISOTOPE_SPACING = float(os.environ.get("ISOPS_ISOTOPE_SPACING", NOMINAL_SPACING))
+
+# Background callbacks need dash[diskcache]. Whether callbacks are registered as background
+# jobs is decided here without importing it; the manager is only created with the app.
+HAVE_BACKGROUND_JOBS = all(importlib.util.find_spec(name) is not None
+                           for name in ("diskcache", "multiprocess", "psutil"))
+
+
+def make_background_manager(state_dir):
+    """DiskcacheManager for background callbacks, or None to run everything in the request."""
+    try:
+        import diskcache
+        manager = dash.DiskcacheManager(diskcache.Cache(
+            os.path.join(state_dir, "jobs") if state_dir else tempfile.mkdtemp(prefix="isops-jobs-")))
+    except ImportError:  # Needs dash[diskcache]
+        return None
+    return manager
+
+
+# Callback timings and payload sizes, served at /metrics once the app is created.
+# Set ISOPS_PROFILE_DIR to also dump a cProfile per callback.
+metrics = CallbackMetrics(profile_dir=os.environ.get("ISOPS_PROFILE_DIR"))
+
+# Rendering thresholds, counted in plotted points (rows x m/z columns)
+WEBGL_POINT_THRESHOLD = 10_000  # Switch from SVG to WebGL scatter traces
+DENSITY_POINT_THRESHOLD = 200_000  # Draw a density raster instead of every point
+VIEWPORT_POINT_LIMIT = 50_000  # Max points drawn on top of the raster when zoomed in, thinned beyond
+OVERVIEW_BINS = 600  # m/z bins in the overview strip
+PRECISION_SPAN = 10  # m/z units on each side of the centre in precision mode
+MAX_SEGMENT_CACHES = 8  # Per dataset and cache, one entry per recently edited RT segment
+LINE_LIST_LIMIT = 20  # Boundaries spelled out in the line-positions text, the table has the rest
+WINDOW_TABLE_PAGE_SIZE = 25
+VIOLATION_LIST_LIMIT = 10  # Cutting boundaries spelled out in the status line
+VIOLATION_POINT_LIMIT = 2_000  # Max cut targets ringed on the plot, thinned beyond
+DENSITY_BINS = (400, 150)  # MZ x RT bins of the density raster
+SWEEP_WORKERS = os.cpu_count()  # Processes scoring sweep schemes
+# Inputs whose values are saved with a project and restored when it is opened
+REQUIRED_COLUMNS = ["MZ", "RT"]  # An upload without them cannot be plotted
+PROJECT_PARAMETERS = ["max-region-width", "margin-start", "margin-end", "interference-rt-tolerance"]
+EXPORT_ROUTE = "export"  # Under the app's URL prefix; see register_export_route
+JOB_STATUS_SHOWN = {"display": "block", "color": "gray"}
+JOB_STATUS_HIDDEN = {"display": "none"}
+
+
+class Dataset:
+    """A parsed upload together with the summary values every callback needs."""
+
+    def __init__(self, key, df, indexes=None, session=None):
+        self.key = key
+        self.df = df
+        self.session = session  # Design state saved in a project file, restored when it is opened
+        self.mz_min = df["MZ"].min()
+        self.mz_max = df["MZ"].max()
+        self.rt_min = float(df["RT"].min())
+        self.rt_max = float(df["RT"].max())
+        # Plotting, auto-fill, violations and exports all read this one (isotopes, targets) array
+        self.envelope = IsotopeEnvelope.from_frame(df, ISOTOPES, ISOTOPE_SPACING)
+        # Grows as caches are built, see _cache
+        self.nbytes = int(df.memory_usage(deep=True).sum()) + self.envelope.values.nbytes
+        self.registry = None  # DatasetRegistry holding this dataset, told when it grows
+        self.scatter_columns = self.envelope.columns
+        self.n_points = self.envelope.values.size
+        # Per-RT-segment helpers, keyed by the segment's RT range (None when unscheduled)
+        self._trackers = OrderedDict()
+        self._window_stats = OrderedDict()
+        self._segment_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        # Saved indexes are only valid for the envelope they were built from
+        if indexes and (session or {}).get("envelope") == self.envelope_settings:
+            self._restore_indexes(indexes)
+
+    @property
+    def envelope_settings(self):
+        return {"isotopes": self.envelope.isotopes, "spacing": self.envelope.spacing}
+
+    @property
+    def render_mode(self):
+        if self.n_points > DENSITY_POINT_THRESHOLD:
+            return "density"
+        if self.n_points > WEBGL_POINT_THRESHOLD:
+            return "webgl"
+        return "svg"
+
+    @cached_property
+    def marker_colors(self):
+        """Per-point colour codes and the discrete colorscale they index into.
+
+        Numeric codes keep plotly from validating one colour string per point.
+        """
+        if "Name" not in self.df.columns:
+            return None, None
+        # Only the first names get a palette colour, the rest stay gray
+        palette = list(qualitative.Set2) + ["gray"]
+        unique_names = self.df["Name"].unique()
+        codes = pd.Series(range(len(unique_names)), index=unique_names).clip(upper=len(palette) - 1)
+        color_codes = self.df["Name"].map(codes).fillna(len(palette) - 1).to_numpy(dtype=np.int8)
+        last = len(palette) - 1
+        colorscale = []
+        for i, color in enumerate(palette):
+            colorscale.append([max(0.0, (i - 0.5) / last), color])
+            colorscale.append([min(1.0, (i + 0.5) / last), color])
+        return self._cache("marker_colors", (color_codes, colorscale))
+
+    @cached_property
+    def marker_opacity(self):
+        if "Types" not in self.df.columns:
+            return 1.0
+        return self._cache("marker_opacity", np.where(self.df["Types"] == "Light", 0.5, 1.0))
+
+    @cached_property
+    def name_labels(self):
+        """Name of every row as a plain string array, for hover text on point subsets."""
+        if "Name" not in self.df.columns:
+            return None
+        return self._cache("name_labels", self.df["Name"].astype(str).to_numpy())
+
+    @cached_property
+    def mz_index(self):
+        return self._cache("mz_index", build_mz_index(self.df, self.envelope))
+
+    @cached_property
+    def pyramid(self):
+        """Sorted index and histogram pyramid over every plotted m/z value (all isotopes)."""
+        # Row-major (isotopes, targets): flattening is free and keeps isotope-by-isotope order
+        return self._cache("pyramid", MzPyramid(self.envelope.values.ravel()))
+
+    @cached_property
+    def density(self):
+        """MZ x RT histogram over all plotted isotopes, as (x centers, y centers, z)."""
+        mz = self.envelope.values.ravel()
+        rt = np.tile(self.df["RT"].to_numpy(dtype=float), self.envelope.isotopes)
+        valid = ~(np.isnan(mz) | np.isnan(rt))
+        counts, x_edges, y_edges = np.histogram2d(mz[valid], rt[valid], bins=DENSITY_BINS)
+        x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+        y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+        # Empty bins are left transparent
+        z = np.where(counts.T > 0, counts.T, np.nan)
+        return self._cache("density", (x_centers, y_centers, z))
+
+    def _cache(self, name, value):
+        """Keep a lazily built cache under name and count its size; a value built first wins."""
+        with self._cache_lock:
+            if name in self.__dict__:
+                return self.__dict__[name]
+            self.__dict__[name] = value
+        self._grow(cache_nbytes(value))
+        return value
+
+    def _grow(self, nbytes):
+        if self.registry is not None:
+            self.registry.resize(self, nbytes)
+        else:
+            self.nbytes += nbytes
+
+    def project_indexes(self):
+        """Cached indexes saved with a project, so opening it skips the sorting; built now if missing."""
+        envelopes = self.violation_tracker([], 0).index
+        return {
+            "mz_index": self.mz_index,
+            "pyramid_mz": self.pyramid.mz, "pyramid_positions": self.pyramid.positions,
+            "envelope_lo": envelopes.lo, "envelope_hi": envelopes.hi, "envelope_rows": envelopes.rows,
         }
-    ),
-
-    html.Div([
-        html.Button("Add Line", id="add-line-btn", n_clicks=0),
-        dcc.Input(id="line-position", type="number", placeholder="Enter MZ position", debounce=True),
-        html.Button("Remove Last Line", id="remove-line-btn", n_clicks=0),
-        html.Button("Download Lines", id="download-lines-btn", n_clicks=0, style={"margin-left": "10px"}),
-        html.Button("Precise Line Drag Mode", id="zoom-in-btn", n_clicks=0),
-        html.Button("Reset Zoom", id="reset-zoom-btn", n_clicks=0),
-        html.Button("Auto-Fill", id="auto-fill-btn", n_clicks=0),
-        dcc.Input(id="max-region-width", type="number", value=10, placeholder="Max width between lines", debounce=True),
-        dcc.Download(id="download-lines")
-    ], style={"margin-bottom": "20px"}),
-
-    html.Div(id="line-positions"),
-
-    dcc.Store(id="lines", data=[]),
-    dcc.Store(id="dataframe", data=None),
-    dcc.Store(id="current-mode", data="normal"),
-    dcc.Store(id="last-altered-line", data=None),
-])
-
-
-@app.callback(
-    Output("dataframe", "data"),
+
+    def _restore_indexes(self, indexes):
+        # Fill the caches of mz_index, pyramid and the whole-gradient tracker from project_indexes() arrays
+        if "mz_index" in indexes:
+            self._cache("mz_index", indexes["mz_index"])
+        if "pyramid_mz" in indexes and "pyramid_positions" in indexes:
+            self._cache("pyramid", MzPyramid.from_sorted(indexes["pyramid_mz"], indexes["pyramid_positions"]))
+        if all(name in indexes for name in ("envelope_lo", "envelope_hi", "envelope_rows")):
+            self._trackers[None] = ViolationTracker(EnvelopeIndex.from_sorted(
+                indexes["envelope_lo"], indexes["envelope_hi"], indexes["envelope_rows"]))
+            self._grow(self._trackers[None].nbytes)
+
+    def _segment_cached(self, cache, segments, active, build):
+        segment = segments[active] if segments else None
+        key = (segment["rt_start"], segment["rt_end"]) if segment else None
+        grown = 0
+        with self._segment_lock:
+            value = cache.get(key)
+            if value is None:
+                rows = np.flatnonzero(segment_mask(self.df, segments, active)) if segment else None
+                value = cache[key] = build(rows)
+                grown += value.nbytes
+                if len(cache) > MAX_SEGMENT_CACHES:
+                    grown -= cache.popitem(last=False)[1].nbytes
+            else:
+                cache.move_to_end(key)
+        if grown:
+            self._grow(grown)
+        return value
+
+    def violation_tracker(self, segments, active):
+        """Envelope violation tracker for the active RT segment's targets (all targets when unscheduled)."""
+        return self._segment_cached(self._trackers, segments, active,
+                                    lambda rows: ViolationTracker(EnvelopeIndex.from_frame(self.df, rows, self.envelope)))
+
+    def window_stats(self, segments, active):
+        """Cached per-window statistics for the active RT segment's targets."""
+        return self._segment_cached(self._window_stats, segments, active,
+                                    lambda rows: WindowStats(self.df, rows, self.envelope))
+
+
+class DatasetRegistry:
+    """Server-side LRU cache of uploaded datasets keyed by a content hash.
+
+    The browser only ever holds the key, so callbacks no longer ship the
+    whole table back and forth. Entries are evicted least-recently-used
+    first once either the entry count or the memory cap is exceeded.
+    """
+
+    def __init__(self, max_entries=8, max_bytes=1024 ** 3, shared=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.shared = shared  # SharedUploadStore holding the raw uploads of every worker
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def content_key(raw_bytes):
+        return hashlib.blake2b(raw_bytes, digest_size=16).hexdigest()
+
+    def get(self, key):
+        if key is None:
+            return None
+        with dataframe_timer():
+            with self._lock:
+                dataset = self._entries.get(key)
+                if dataset is not None:
+                    self._entries.move_to_end(key)
+                    return dataset
+            # Uploaded through another worker: parse it here from the shared copy
+            raw_bytes = self.shared.get(key) if self.shared is not None else None
+            if raw_bytes is None:
+                return None
+            return self.put(key, *read_upload(raw_bytes))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def put(self, key, df, indexes=None, session=None):
+        dataset = Dataset(key, df, indexes, session)
+        if HAVE_BACKGROUND_JOBS:
+            # Jobs are forked from this process and inherit the index, instead of
+            # rebuilding it for every auto-fill
+            dataset.mz_index
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                old.registry = None
+                self._nbytes -= old.nbytes
+            self._entries[key] = dataset
+            dataset.registry = self
+            self._nbytes += dataset.nbytes
+            self._evict()
+        return dataset
+
+    def resize(self, dataset, nbytes):
+        """Count nbytes more (or fewer) for a dataset whose caches changed, evicting others over the cap."""
+        with self._lock:
+            dataset.nbytes += nbytes
+            if self._entries.get(dataset.key) is not dataset:
+                return
+            self._nbytes += nbytes
+            self._entries.move_to_end(dataset.key)
+            self._evict()
+
+    def _evict(self):
+        # Least recently used first; always keep the newest entry, even if it alone exceeds the cap
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries or self._nbytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            evicted.registry = None
+            self._nbytes -= evicted.nbytes
+
+
+# The shared upload store is attached by create_app
+datasets = DatasetRegistry()
+
+
+def cache_nbytes(value):
+    """Bytes held by a cached array, index object or tuple of them."""
+    if isinstance(value, tuple):
+        return sum(cache_nbytes(item) for item in value)
+    return getattr(value, "nbytes", 0)
+
+
+def ignore_progress(values):
+    pass
+
+
+def background_callback(*dependencies, progress, running=(), **kwargs):
+    """Callback that runs in a background job when dash[diskcache] is installed.
+
+    The decorated function always gets set_progress as its first argument;
+    without background jobs it runs in the request and progress is dropped.
+    """
+    def decorator(func):
+        if HAVE_BACKGROUND_JOBS:
+            callback(*dependencies, background=True, progress=progress, running=list(running),
+                     **kwargs)(metrics.job(func))
+            return func
+
+        @functools.wraps(func)
+        def foreground(*args):
+            return func(ignore_progress, *args)
+
+        callback(*dependencies, running=list(running), **kwargs)(foreground)
+        return func
+
+    return decorator
+
+
+def format_line_positions(lines):
+    """Short boundary summary; mirrors formatLinePositions in assets/isops_clientside.js."""
+    if not lines:
+        return "No lines added yet."
+    shown = ", ".join(f"{x:.2f}" for x in lines[:LINE_LIST_LIMIT])
+    if len(lines) > LINE_LIST_LIMIT:
+        return f"Lines ({len(lines)}): {shown}, ... (see the window table)"
+    return f"Lines: {shown}"
+
+
+def padded_rt_range(dataset):
+    """RT axis range with 10% padding, also used as the extent of the boundary lines."""
+    padding = 0.1 * (dataset.rt_max - dataset.rt_min)
+    return dataset.rt_min - padding, dataset.rt_max + padding
+
+
+def line_shape(line_pos, y0, y1):
+    return {
+        'type': 'line',
+        'x0': line_pos,
+        'x1': line_pos,
+        'y0': y0,  # Extended below
+        'y1': y1,  # Extended above
+        'xref': 'x',
+        'yref': 'y',
+        'line': {
+            'color': 'grey',
+            'width': 1.2,
+        },
+    }
+
+
+def patch_line_shapes(patched, old_lines, new_lines, y0, y1):
+    """Record on a figure Patch only the shape changes turning old_lines into new_lines.
+
+    Both lists are sorted, so an edit touches one contiguous run of shapes:
+    the unchanged prefix and suffix are skipped, changed positions are
+    moved in place and any surplus is inserted or deleted.
+    """
+    shapes = patched["layout"]["shapes"]
+    if not old_lines:
+        # Nothing drawn yet, so there is no shapes list to edit in place
+        patched["layout"]["shapes"] = [line_shape(x, y0, y1) for x in new_lines]
+        return patched
+
+    prefix = 0
+    while prefix < min(len(old_lines), len(new_lines)) and old_lines[prefix] == new_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    while (suffix < min(len(old_lines), len(new_lines)) - prefix
+           and old_lines[-1 - suffix] == new_lines[-1 - suffix]):
+        suffix += 1
+    old_middle = old_lines[prefix:len(old_lines) - suffix]
+    new_middle = new_lines[prefix:len(new_lines) - suffix]
+
+    for i, (old, new) in enumerate(zip(old_middle, new_middle)):
+        if old != new:
+            shapes[prefix + i]["x0"] = new
+            shapes[prefix + i]["x1"] = new
+    for _ in range(len(old_middle) - len(new_middle)):
+        del shapes[prefix + len(new_middle)]
+    for i in range(len(old_middle), len(new_middle)):
+        shapes.insert(prefix + i, line_shape(new_middle[i], y0, y1))
+    return patched
+
+
+def violation_mz_range(dataset, view_range):
+    """m/z range whose cut targets get a ring: the zoomed-in view in density mode, like the points."""
+    if dataset.render_mode != "density":
+        return None
+    return view_range["x"] if view_range else None
+
+
+def in_mz_range(dataset, rows, mz_range):
+    """The given rows whose MZ lies in mz_range (all of them when it is None)."""
+    if mz_range is None:
+        return rows
+    mz = dataset.df["MZ"].to_numpy(dtype=float)[rows]
+    return rows[(mz >= mz_range[0]) & (mz <= mz_range[1])]
+
+
+def violation_trace_data(dataset, report, mz_range, y0, y1):
+    """x/y (and hover text) for the violation traces, as plain lists so a Patch can carry them.
+
+    Only cut targets inside mz_range are ringed, thinned to every 2**k-th
+    row beyond VIOLATION_POINT_LIMIT; the status line still counts them all.
+    """
+    rows = in_mz_range(dataset, report.rows, mz_range)
+    stride = 1
+    while len(rows) > VIOLATION_POINT_LIMIT * stride:
+        stride *= 2
+    rows = rows[::stride]
+    targets = {
+        "x": dataset.df["MZ"].to_numpy(dtype=float)[rows].tolist(),
+        "y": dataset.df["RT"].to_numpy(dtype=float)[rows].tolist(),
+        "text": dataset.name_labels[rows].tolist() if dataset.name_labels is not None else None,
+    }
+    # One vertical segment per cutting boundary, separated by gaps
+    boundaries = {"x": [], "y": []}
+    for boundary in report.boundaries.tolist():
+        boundaries["x"] += [boundary, boundary, None]
+        boundaries["y"] += [y0, y1, None]
+    return targets, boundaries
+
+
+def violation_traces(dataset, report, mz_range, y0, y1):
+    """Rings around targets whose envelope a boundary cuts, plus those boundaries in red.
+
+    They are always the first two traces, so edits can patch them in place.
+    Returned as figure dicts: their data are plain lists, which plotly
+    validation would walk value by value.
+    """
+    targets, boundaries = violation_trace_data(dataset, report, mz_range, y0, y1)
+    trace_type = "scatter" if dataset.render_mode == "svg" else "scattergl"
+    return [
+        dict(
+            targets, type=trace_type, mode="markers", name="Envelope cut by a boundary",
+            marker={"symbol": "circle-open", "size": 14, "color": "red", "line": {"width": 2}},
+            hovertemplate="%{text}<br>MZ: %{x:.4f}<br>RT: %{y:.2f}<extra>cut</extra>",
+        ),
+        dict(
+            boundaries, type=trace_type, mode="lines", name="Boundary cutting an envelope",
+            line={"color": "red", "width": 3}, hoverinfo="skip",
+        ),
+    ]
+
+
+def violation_status(report):
+    if not report.count:
+        return ""
+    shown = ", ".join(f"{b:.1f}" for b in report.boundaries[:VIOLATION_LIST_LIMIT])
+    if len(report.boundaries) > VIOLATION_LIST_LIMIT:
+        shown += ", ..."
+    return (f"{report.count} target(s) have their isotope envelope cut by "
+            f"{len(report.boundaries)} boundary(ies): {shown}")
+
+
+def patch_violations(patched, dataset, report, mz_range, y0, y1, changed=None):
+    """Patch the violation traces to match report.
+
+    changed holds the rows whose cut status differs from what is drawn
+    (see ViolationTracker.status_changes); when none of them is inside
+    mz_range the rings are left alone and only the red boundaries are sent.
+    """
+    targets, boundaries = violation_trace_data(dataset, report, mz_range, y0, y1)
+    if changed is None or len(in_mz_range(dataset, changed, mz_range)):
+        for key, values in targets.items():
+            patched["data"][0][key] = values
+    for key, values in boundaries.items():
+        patched["data"][1][key] = values
+
+
+def segment_band_trace(dataset, segment):
+    """Shaded RT band behind the points, marking the segment the drawn lines belong to."""
+    x0, x1 = dataset.mz_min - 5, dataset.mz_max + 5
+    y0, y1 = segment["rt_start"], segment["rt_end"]
+    return go.Scatter(
+        x=[x0, x1, x1, x0, x0], y=[y0, y0, y1, y1, y0],
+        fill="toself", fillcolor="rgba(100, 149, 237, 0.12)", mode="none",
+        hoverinfo="skip", name=f"Editing RT {y0:.2f}-{y1:.2f}"
+    )
+
+
+def scatter_points(dataset, col, rows):
+    """x/y/marker/text of one isotope column for the given rows (a slice or an index array)."""
+    df = dataset.df
+    color_codes, colorscale = dataset.marker_colors
+    if color_codes is None:
+        color = {"color": "gray"}
+    else:
+        color = {"color": color_codes[rows], "colorscale": colorscale,
+                 "cmin": 0, "cmax": len(colorscale) // 2 - 1}
+    opacity = dataset.marker_opacity
+    return {
+        "x": dataset.envelope[col][rows],
+        "y": df["RT"].to_numpy()[rows],
+        "marker": dict(
+            size=8,
+            opacity=opacity[rows] if isinstance(opacity, np.ndarray) else opacity,
+            showscale=False,
+            **color
+        ),
+        "text": dataset.name_labels[rows] if dataset.name_labels is not None else None,
+    }
+
+
+def viewport_rows(dataset, mz_range):
+    """Rows to draw per scatter column inside mz_range, from the sorted m/z index.
+
+    The cost depends on the points returned (at most VIEWPORT_POINT_LIMIT),
+    not on the size of the dataset.
+    """
+    n_rows = len(dataset.df)
+    rows = {col: np.empty(0, dtype=np.intp) for col in dataset.scatter_columns}
+    if mz_range is None:
+        return rows, 1
+    positions, stride = dataset.pyramid.viewport(mz_range[0], mz_range[1], VIEWPORT_POINT_LIMIT)
+    column = positions // n_rows
+    for i, col in enumerate(dataset.scatter_columns):
+        rows[col] = np.sort(positions[column == i] % n_rows)
+    return rows, stride
+
+
+def point_trace_index(segments):
+    """Index of the first scatter-point trace in a density-mode figure built by update_plot."""
+    # Two violation traces, the optional RT segment band, then the density raster
+    return 2 + (1 if segments else 0) + 1
+
+
+def build_scatter_traces(dataset, mz_range=None):
+    """Scatter traces for a dataset, picking SVG, WebGL or density rendering by size."""
+    mode = dataset.render_mode
+    traces = []
+
+    if mode == "density":
+        x_centers, y_centers, z = dataset.density
+        traces.append(go.Heatmap(
+            x=x_centers, y=y_centers, z=z,
+            colorscale="Greys", showscale=False, hoverongaps=False,
+            name="Density",
+            hovertemplate="MZ %{x:.1f}<br>RT %{y:.1f}<br>%{z} points<extra></extra>",
+        ))
+        # Individual points are only drawn for the zoomed-in view; the traces are
+        # always there so zooming can patch them in place
+        rows, _ = viewport_rows(dataset, mz_range)
+    else:
+        rows = {col: slice(None) for col in dataset.scatter_columns}
+
+    scatter_cls = go.Scatter if mode == "svg" else go.Scattergl
+    for col in dataset.scatter_columns:
+        traces.append(scatter_cls(mode="markers", name=f"Scatter ({col})", **scatter_points(dataset, col, rows[col])))
+    return traces
+
+
+def patch_viewport(patched, dataset, view_range, segments):
+    """Swap the zoomed-in points of a density-mode figure and pin the axes to view_range."""
+    mz_range = view_range["x"] if view_range else None
+    rows, _ = viewport_rows(dataset, mz_range)
+    first = point_trace_index(segments)
+    for i, col in enumerate(dataset.scatter_columns):
+        points = scatter_points(dataset, col, rows[col])
+        for key, values in points.items():
+            patched["data"][first + i][key] = values
+    if view_range:
+        patched["layout"]["xaxis"]["range"] = view_range["x"]
+        if "y" in view_range:
+            patched["layout"]["yaxis"]["range"] = view_range["y"]
+
+
+def build_overview(dataset, view_range):
+    """m/z density strip over the whole dataset, with the zoomed-in range shaded."""
+    centers, counts, width = dataset.pyramid.histogram(dataset.mz_min, dataset.mz_max, OVERVIEW_BINS)
+    fig = go.Figure(go.Bar(
+        x=centers, y=counts, width=width, marker={"color": "gray", "line": {"width": 0}},
+        hovertemplate=f"MZ %{{x:.1f}} \u00b1 {width / 2:g}<br>%{{y}} points<extra></extra>",
+    ))
+    fig.update_layout(
+        height=120, margin={"l": 60, "r": 20, "t": 10, "b": 30}, bargap=0,
+        xaxis={"range": [dataset.mz_min, dataset.mz_max], "fixedrange": True},
+        yaxis={"visible": False, "fixedrange": True},
+        shapes=[overview_window(view_range)], showlegend=False,
+    )
+    return fig
+
+
+def overview_window(view_range):
+    x0, x1 = view_range["x"] if view_range else (0, 0)
+    return {
+        "type": "rect", "xref": "x", "yref": "paper", "x0": x0, "x1": x1, "y0": 0, "y1": 1,
+        "fillcolor": "rgba(100, 149, 237, 0.25)", "line": {"width": 1, "color": "cornflowerblue"},
+        "visible": view_range is not None,
+    }
+
+
+def read_upload(raw_bytes):
+    """(table, saved indexes, saved session) of an upload; only project files have the last two.
+
+    Raises ValueError for a table without the columns the plot needs.
+    """
+    if is_project(raw_bytes):
+        project = read_project(raw_bytes)
+        df, indexes, session = apply_precursor_dtypes(project.df), project.arrays, project.state
+    else:
+        df, indexes, session = read_precursors(raw_bytes), None, None
+    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"missing column(s) {', '.join(missing)}")
+    return df, indexes, session
+
+
+def load_dataset(raw_bytes):
+    """Parse an upload (CSV, .csv.gz, Parquet or a saved project) into the registry, reusing identical uploads."""
+    key = DatasetRegistry.content_key(raw_bytes)
+    dataset = datasets.get(key)
+    if dataset is not None:
+        return dataset
+
+    with dataframe_timer():
+        dataset = datasets.put(key, *read_upload(raw_bytes))
+    if datasets.shared is not None:
+        datasets.shared.put(key, raw_bytes)
+    return dataset
+
+
+def build_layout():
+    """Upload, plot, controls and tables, plus the dcc.Store state of a session."""
+    return html.Div([
+        html.H2("IsoPS Window Designer"),
+
+        dcc.Upload(
+            id="upload-data",
+            children=html.Button("Upload CSV or Project", style={"margin-bottom": "20px"}),
+            accept=".csv,.tsv,.txt,.gz,.parquet,.isops"
+        ),
+        html.Div(id="upload-status", style={"margin-bottom": "10px"}),
+
+        dcc.Graph(
+            id="scatter-plot",
+            config={
+                'editable': True,
+                'edits': {'shapePosition': True},
+                'modeBarButtonsToAdd': ['drawline', 'eraseshape']
+            }
+        ),
+        # Where the precursors are along m/z, and which part the plot above shows; click to jump there
+        dcc.Graph(id="mz-overview", config={"displayModeBar": False}),
+
+        html.Div([
+            html.Button("Add Line", id="add-line-btn", n_clicks=0),
+            dcc.Input(id="line-position", type="number", placeholder="Enter MZ position", debounce=True),
+            html.Button("Remove Last Line", id="remove-line-btn", n_clicks=0),
+            html.Button("Undo", id="undo-btn", n_clicks=0, disabled=True),
+            html.Button("Redo", id="redo-btn", n_clicks=0, disabled=True),
+            html.Button("Download Lines", id="download-lines-btn", n_clicks=0, style={"margin-left": "10px"}),
+            dcc.Dropdown(id="export-content", value="windows", clearable=False, searchable=False,
+                         options=[{"label": "Window assignment", "value": "windows"},
+                                  {"label": "Isolation list", "value": "isolation_list"}],
+                         style={"width": "170px", "display": "inline-block", "vertical-align": "middle"}),
+            dcc.Dropdown(id="export-format", value="csv", clearable=False, searchable=False,
+                         options=[{"label": FORMATS[fmt], "value": fmt,
+                                   "disabled": fmt == "parquet" and not HAVE_PYARROW} for fmt in FORMATS],
+                         style={"width": "100px", "display": "inline-block", "vertical-align": "middle"}),
+            html.Button("Save Project", id="save-project-btn", n_clicks=0),
+            html.Button("Precise Line Drag Mode", id="zoom-in-btn", n_clicks=0),
+            html.Button("Reset Zoom", id="reset-zoom-btn", n_clicks=0),
+            html.Button("Auto-Fill", id="auto-fill-btn", n_clicks=0),
+            dcc.Input(id="max-region-width", type="number", value=10, placeholder="Max width between lines",
+                      debounce=True),
+            html.Button("Optimize Windows", id="optimize-btn", n_clicks=0),
+            dcc.Input(id="margin-start", type="number", value=DEFAULT_MARGIN_START, step=0.05,
+                      placeholder="Min MZ - Round_start", debounce=True),
+            dcc.Input(id="margin-end", type="number", value=DEFAULT_MARGIN_END, step=0.05,
+                      placeholder="Min Round_end - MZp2", debounce=True),
+            dcc.Download(id="download-project"),
+        ], style={"margin-bottom": "20px"}),
+
+        html.Div([
+            dcc.Input(id="segment-rt", type="number", placeholder="Split at RT", debounce=True),
+            html.Button("Split RT Segment", id="split-segment-btn", n_clicks=0),
+            html.Button("Merge RT Segment", id="merge-segment-btn", n_clicks=0),
+            dcc.Dropdown(id="segment-select", options=[], value=None, clearable=False,
+                         placeholder="Whole gradient", style={"width": "320px", "display": "inline-block",
+                                                              "vertical-align": "middle"}),
+        ], style={"margin-bottom": "20px"}),
+
+        # Only shown when a background library is configured
+        html.Div([
+            html.Span(f"Background library: {len(background_library):,} precursors. Exports count the ones "
+                      f"co-isolated within \u00b1" if background_library is not None else ""),
+            dcc.Input(id="interference-rt-tolerance", type="number", value=DEFAULT_RT_TOLERANCE, min=0, step=0.1,
+                      debounce=True, style={"width": "70px", "margin": "0 5px"}),
+            html.Span("min of each target's RT."),
+        ], style={"margin-bottom": "20px"} if background_library is not None else {"display": "none"}),
+
+        # Progress of background jobs, only shown while they run
+        html.Div(id="auto-fill-status", style=JOB_STATUS_HIDDEN),
+        html.Div(id="project-status", style=JOB_STATUS_HIDDEN),
+        html.Div(id="line-positions"),
+        html.Div(id="violation-status", style={"color": "darkred"}),
+
+        # Only the visible page is sent to the browser, however many windows there are
+        dash_table.DataTable(
+            id="window-table",
+            columns=[{"name": col.replace("_", " "), "id": col} for col in STATS_COLUMNS],
+            data=[],
+            page_action="custom",
+            page_current=0,
+            page_size=WINDOW_TABLE_PAGE_SIZE,
+            page_count=0,
+            style_table={"margin-top": "10px", "max-width": "1100px"},
+            style_cell={"font-family": "monospace", "padding": "2px 8px"},
+            style_data_conditional=[
+                {"if": {"filter_query": "{Min_margin} < 0"}, "color": "darkred", "font-weight": "bold"},
+            ],
+        ),
+
+        # Parameter sweep: score every combination of the comma-separated values below
+        html.H4("Parameter sweep", style={"margin-top": "30px"}),
+        html.Div([
+            dcc.Input(id="sweep-max-widths", type="text", value="5, 7.5, 10",
+                      placeholder="Max widths, e.g. 5, 7.5, 10"),
+            dcc.Input(id="sweep-steps", type="text", value="0.5", placeholder="Rounding steps, e.g. 0.5, 1"),
+            dcc.Input(id="sweep-margins-start", type="text", value="0.25, 0.5", placeholder="Margins MZ - Round_start"),
+            dcc.Input(id="sweep-margins-end", type="text", value="0.25, 0.5", placeholder="Margins Round_end - MZp2"),
+            dcc.Checklist(id="sweep-methods", value=["optimize", "auto_fill"], inline=True,
+                          options=[{"label": "Optimize", "value": "optimize"},
+                                   {"label": "Auto-Fill from current lines", "value": "auto_fill"}],
+                          style={"display": "inline-block", "margin-left": "10px"}),
+            html.Button("Run Sweep", id="sweep-btn", n_clicks=0),
+        ]),
+        html.Div(id="sweep-status", style=JOB_STATUS_HIDDEN),
+        html.Div(id="sweep-summary", style={"color": "gray"}),
+        dash_table.DataTable(
+            id="sweep-table",
+            columns=[{"name": col.replace("_", " "), "id": col} for col in RESULT_COLUMNS],
+            data=[],
+            sort_action="native",
+            page_size=WINDOW_TABLE_PAGE_SIZE,
+            style_table={"margin-top": "10px", "max-width": "1100px"},
+            style_cell={"font-family": "monospace", "padding": "2px 8px"},
+            style_data_conditional=[
+                {"if": {"filter_query": "{violations} > 0", "column_id": "violations"},
+                 "color": "darkred", "font-weight": "bold"},
+            ],
+        ),
+
+        dcc.Store(id="lines", data=[]),
+        dcc.Store(id="plotted-lines", data=None),  # Boundaries currently drawn as shapes
+        dcc.Store(id="draft-lines", data=None),  # Boundaries while a drag is still settling
+        dcc.Store(id="violation-lines", data=None),  # Boundaries the violation traces were drawn for
+        dcc.Store(id="view-range", data=None),  # Zoomed axis ranges, None when zoomed out
+        dcc.Store(id="dataset-key", data=None),
+        dcc.Store(id="current-mode", data="normal"),
+        dcc.Store(id="last-altered-line", data=None),
+        dcc.Store(id="rt-segments", data=[]),  # Per-RT-segment boundary sets, empty when unscheduled
+        dcc.Store(id="active-segment", data=0),  # Segment whose boundaries are in "lines"
+        dcc.Store(id="line-history", data=None),  # Undo/redo deltas of "lines", only used in the browser
+        dcc.Store(id="export-request", data=None),  # Last export request posted to EXPORT_ROUTE
+    ])
+
+
+def decode_upload(contents):
+    """Raw bytes of a dcc.Upload data URL, decoded without copying the base64 payload first."""
+    encoded = memoryview(contents.encode("ascii"))
+    return binascii.a2b_base64(encoded[contents.index(",") + 1:])
+
+
+def format_mib(n_bytes):
+    return f"{n_bytes / 2 ** 20:.1f} MiB"
+
+
+@callback(
+    Output("dataset-key", "data"),
     Output("lines", "data"),
+    Output("current-mode", "data", allow_duplicate=True),  # A new dataset is drawn fully zoomed out
+    Output("upload-status", "children"),
+    *[Output(component, "value") for component in PROJECT_PARAMETERS],
     Input("upload-data", "contents"),
     State("upload-data", "filename"),
+    prevent_initial_call=True
 )
+@metrics.instrument
 def upload_file(contents, filename):
+    unchanged = [dash.no_update] * len(PROJECT_PARAMETERS)
     if contents is not None:
-        content_type, content_string = contents.split(",")
-        decoded = base64.b64decode(content_string)
+        peak_before = peak_rss_bytes()
         try:
-            df = pd.read_csv(io.StringIO(decoded.decode("utf-8")))
-            initial_lines = []
-            if 'Win_start' in df.columns:
-                initial_lines = df['Win_start'].unique().tolist()
-            return df.to_dict("records"), initial_lines
-        except pd.errors.ParserError:
-            return None, []
-    return None, []
-
-
-@app.callback(
+            dataset = load_dataset(decode_upload(contents))
+        except (pd.errors.ParserError, ValueError, OSError, EOFError) as error:
+            return None, [], "normal", f"Could not read {filename}: {error}", *unchanged
+
+        status = f"Loaded {filename}: {dataset.n_points:,} points, {format_mib(dataset.nbytes)} in memory"
+        peak_after = peak_rss_bytes()
+        if peak_after is not None:
+            status += f", peak RSS {format_mib(peak_after)} (+{format_mib(peak_after - peak_before)} during upload)"
+        if dataset.session is None:
+            return dataset.key, seed_lines(dataset.df), "normal", status, *unchanged
+        # A saved project resumes where it was left; its RT segments are restored by edit_rt_segments
+        parameters = dataset.session.get("parameters", {})
+        return (dataset.key, dataset.session.get("lines", []), "normal", status,
+                *[parameters.get(component, dash.no_update) for component in PROJECT_PARAMETERS])
+    return None, [], "normal", "", *unchanged
+
+
+@callback(
     Output("scatter-plot", "figure", allow_duplicate=True),
     Output("current-mode", "data"),
+    Output("view-range", "data", allow_duplicate=True),
     Input("zoom-in-btn", "n_clicks"),
-    State("scatter-plot", "figure"),
-    State("dataframe", "data"),
+    State("view-range", "data"),
+    State("dataset-key", "data"),
     State("lines", "data"),
     State("last-altered-line", "data"),  # Add this state
     prevent_initial_call=True
 )
-def zoom_in_for_precision(n_clicks, current_figure, dataframe, lines, last_altered_line):
-    if dataframe is None or n_clicks == 0:
-        return dash.no_update, dash.no_update
+@metrics.instrument
+def zoom_in_for_precision(n_clicks, view_range, dataset_key, lines, last_altered_line):
+    dataset = datasets.get(dataset_key)
+    if dataset is None or n_clicks == 0:
+        return dash.no_update, dash.no_update, dash.no_update
 
-    df = pd.DataFrame(dataframe)
-    mz_min = df["MZ"].min()
-    mz_max = df["MZ"].max()
+    mz_min = dataset.mz_min
+    mz_max = dataset.mz_max
 
     # Determine center for zoom - prioritize last altered line if it exists
     if last_altered_line is not None:
@@ -92,30 +873,23 @@ def zoom_in_for_precision(n_clicks, current_figure, dataframe, lines, last_alter
     elif lines and len(lines) > 0:
         # If we have lines but no recorded last altered line, use the last line
         center = float(lines[-1])
-    elif 'layout' in current_figure and 'xaxis' in current_figure['layout'] and 'range' in current_figure['layout']['xaxis']:
-        current_range = current_figure['layout']['xaxis']['range']
-        center = (float(current_range[0]) + float(current_range[1])) / 2
+    elif view_range:
+        center = (float(view_range["x"][0]) + float(view_range["x"][1])) / 2
     else:
         center = (mz_min + mz_max) / 2
 
-    # Use a wider zoom span of 5 m/z units on each side as requested
-    zoom_span = 10  # 5 m/z units on each side
-
     # Calculate zoom boundaries
-    x_min = max(center - zoom_span, mz_min)
-    x_max = min(center + zoom_span, mz_max)
+    x_min = max(center - PRECISION_SPAN, mz_min)
+    x_max = min(center + PRECISION_SPAN, mz_max)
 
-    # Create a new figure based on the current one
-    new_figure = dict(current_figure)
-
-    # Ensure layout exists
-    if 'layout' not in new_figure:
-        new_figure['layout'] = {}
+    # Only the layout changes; the points for the new range (if the dataset is
+    # drawn as a density raster) follow through the view-range store
+    patched = Patch()
 
     # Update xaxis with wider zoom but keep the 0.5 tick spacing
-    new_figure['layout']['xaxis'] = {
+    patched['layout']['xaxis'] = {
         'title': "MZ",
-        'range': [x_min, x_max],  # ±5 m/z zoom
+        'range': [x_min, x_max],
         'tick0': round(x_min * 2) / 2,  # Round to nearest 0.5
         'dtick': 0.5,  # Keep 0.5 unit ticks as requested
         'showgrid': True,
@@ -123,52 +897,40 @@ def zoom_in_for_precision(n_clicks, current_figure, dataframe, lines, last_alter
     }
 
     # Visually indicate we're in precision mode
-    new_figure['layout']['title'] = "PRECISION MODE: Zoomed In for Enhanced Line Positioning"
+    patched['layout']['title'] = "PRECISION MODE: Zoomed In for Enhanced Line Positioning"
 
     # Change drag mode to pan for easier adjustment
-    new_figure['layout']['dragmode'] = 'pan'
+    patched['layout']['dragmode'] = 'pan'
 
     # Force a complete redraw with new ui revision
-    new_figure['layout']['uirevision'] = f'precision-mode-{n_clicks}'
+    patched['layout']['uirevision'] = f'precision-mode-{n_clicks}'
 
-    return new_figure, "precision"
+    return patched, "precision", {"x": [x_min, x_max]}
 
 
-@app.callback(
+@callback(
     Output("scatter-plot", "figure", allow_duplicate=True),
     Output("current-mode", "data", allow_duplicate=True),  # Add this output
+    Output("view-range", "data", allow_duplicate=True),
     Input("reset-zoom-btn", "n_clicks"),
-    State("scatter-plot", "figure"),
-    State("dataframe", "data"),
+    State("dataset-key", "data"),
     prevent_initial_call=True
 )
-def reset_zoom(n_clicks, current_figure, dataframe):
-    if dataframe is None or n_clicks == 0:
-        return dash.no_update, dash.no_update
-
-    df = pd.DataFrame(dataframe)
-    mz_min = df["MZ"].min()
-    mz_max = df["MZ"].max()
-    rt_min = df["RT"].min()
-    rt_max = df["RT"].max()
-
-    # Add padding to y-axis
-    y_range = rt_max - rt_min
-    padding = 0.1 * y_range
-    rt_min_padded = rt_min - padding
-    rt_max_padded = rt_max + padding
+@metrics.instrument
+def reset_zoom(n_clicks, dataset_key):
+    dataset = datasets.get(dataset_key)
+    if dataset is None or n_clicks == 0:
+        return dash.no_update, dash.no_update, dash.no_update
 
-    # Create a new figure based on the current one to ensure update
-    new_figure = dict(current_figure)
+    rt_min_padded, rt_max_padded = padded_rt_range(dataset)
 
-    # Ensure layout exists
-    if 'layout' not in new_figure:
-        new_figure['layout'] = {}
+    # Only the layout changes, whatever the size of the dataset
+    patched = Patch()
 
     # Reset xaxis with optimized settings
-    new_figure['layout']['xaxis'] = {
+    patched['layout']['xaxis'] = {
         'title': "MZ",
-        'range': [mz_min, mz_max],  # Full range
+        'range': [dataset.mz_min, dataset.mz_max],  # Full range
         'tick0': 0,
         'dtick': 5,  # Wider ticks for better performance
         'showgrid': True,
@@ -176,7 +938,7 @@ def reset_zoom(n_clicks, current_figure, dataframe):
     }
 
     # Reset yaxis
-    new_figure['layout']['yaxis'] = {
+    patched['layout']['yaxis'] = {
         'title': "RT",
         'range': [rt_min_padded, rt_max_padded],
         'showgrid': True,
@@ -184,182 +946,307 @@ def reset_zoom(n_clicks, current_figure, dataframe):
     }
 
     # Reset title
-    new_figure['layout']['title'] = "Drag and add the isolation boundary"
+    patched['layout']['title'] = "Drag and add the isolation boundary"
 
     # Reset drag mode
-    new_figure['layout']['dragmode'] = "zoom"
+    patched['layout']['dragmode'] = "zoom"
 
     # Force refresh
-    new_figure['layout']['uirevision'] = f'normal-mode-{n_clicks}'
+    patched['layout']['uirevision'] = f'normal-mode-{n_clicks}'
+
+    return patched, "normal", None
+
+
+@callback(
+    Output("mz-overview", "figure"),
+    Input("dataset-key", "data"),
+    Input("view-range", "data"),
+)
+@metrics.instrument
+def update_overview(dataset_key, view_range):
+    dataset = datasets.get(dataset_key)
+    if dataset is None:
+        return {"data": [], "layout": {"height": 120, "xaxis": {"visible": False}, "yaxis": {"visible": False}}}
 
-    return new_figure, "normal"
+    # Zooming only moves the shaded window; the bars come from the pyramid once per dataset
+    if ctx.triggered_prop_ids and "dataset-key.data" not in ctx.triggered_prop_ids:
+        patched = Patch()
+        patched["layout"]["shapes"][0] = overview_window(view_range)
+        return patched
+    return build_overview(dataset, view_range)
 
 
-@app.callback(
+@callback(
+    Output("scatter-plot", "figure", allow_duplicate=True),
+    Output("view-range", "data", allow_duplicate=True),
+    Input("mz-overview", "clickData"),
+    State("view-range", "data"),
+    State("dataset-key", "data"),
+    prevent_initial_call=True
+)
+@metrics.instrument
+def jump_to_overview_click(click_data, view_range, dataset_key):
+    """Centre the main plot on the m/z clicked in the overview strip, keeping the zoom width."""
+    dataset = datasets.get(dataset_key)
+    if dataset is None or not click_data:
+        return dash.no_update, dash.no_update
+
+    center = float(click_data["points"][0]["x"])
+    half_width = (view_range["x"][1] - view_range["x"][0]) / 2 if view_range else PRECISION_SPAN
+    x_range = [center - half_width, center + half_width]
+    patched = Patch()
+    patched["layout"]["xaxis"]["range"] = x_range
+    new_view = dict(view_range or {}, x=x_range)
+    return patched, new_view
+
+
+@background_callback(
     Output("lines", "data", allow_duplicate=True),
     Output("line-positions", "children", allow_duplicate=True),
     Output("last-altered-line", "data", allow_duplicate=True),
     Input("auto-fill-btn", "n_clicks"),
     State("lines", "data"),
-    State("dataframe", "data"),
+    State("dataset-key", "data"),
     State("max-region-width", "value"),
+    progress=[Output("auto-fill-status", "children")],
+    running=[(Output("auto-fill-btn", "disabled"), True, False),
+             (Output("auto-fill-status", "style"), JOB_STATUS_SHOWN, JOB_STATUS_HIDDEN)],
     prevent_initial_call=True
 )
-def auto_fill_empty_regions(n_clicks, lines, dataframe, max_width):
-    if n_clicks == 0 or not lines or dataframe is None:
+@metrics.instrument
+def auto_fill_empty_regions(set_progress, n_clicks, lines, dataset_key, max_width):
+    set_progress(("Auto-fill: loading dataset...",))
+    dataset = datasets.get(dataset_key)
+    if n_clicks == 0 or not lines or dataset is None:
         return dash.no_update, dash.no_update, dash.no_update
 
-    # Default max_width if none provided
-    if max_width is None or max_width <= 0:
-        max_width = 10  # Default to 10 if invalid value
-
-    # Convert to float and sort lines
-    sorted_lines = sorted([float(line) for line in lines])
+    set_progress(("Auto-fill: filling empty regions...",))
 
-    # Get dataframe
-    df = pd.DataFrame(dataframe)
+    # An empty or invalid max_width falls back to the engine default
+    updated_lines, new_lines = auto_fill_lines(lines, dataset.mz_index, max_width)
 
-    # Get all m/z values from the dataframe
-    all_mz_values = set()
-
-    # Collect all m/z values across columns
-    mz_columns = [col for col in df.columns if col.startswith("MZ") or col.lower().startswith("mz")]
-    if not mz_columns:  # If no MZ columns found, use default names
-        mz_columns = ["MZ", "MZp1", "MZp2"]
+    # If we didn't add any lines, no update is needed
+    if not len(new_lines):
+        return dash.no_update, dash.no_update, dash.no_update
 
-    for col in mz_columns:
-        if col in df.columns:
-            all_mz_values.update(df[col].dropna().tolist())
+    last_added = float(new_lines[-1])
 
-    print(f"Found {len(all_mz_values)} MZ values in columns: {mz_columns}")
+    # Create the updated text display
+    line_text = format_line_positions(updated_lines)
 
-    # Initialize new lines to add
-    new_lines = []
-    last_added = None
+    return updated_lines, line_text, last_added
 
-    # Process each pair of adjacent lines
-    for i in range(len(sorted_lines) - 1):
-        start = sorted_lines[i]
-        end = sorted_lines[i + 1]
-        region_width = end - start
 
-        # Debug information
-        print(f"Checking region {start} to {end}, width: {region_width}")
+@callback(
+    Output("lines", "data", allow_duplicate=True),
+    Output("line-positions", "children", allow_duplicate=True),
+    Output("last-altered-line", "data", allow_duplicate=True),
+    Input("optimize-btn", "n_clicks"),
+    State("dataset-key", "data"),
+    State("max-region-width", "value"),
+    State("margin-start", "value"),
+    State("margin-end", "value"),
+    State("rt-segments", "data"),
+    State("active-segment", "data"),
+    prevent_initial_call=True
+)
+@metrics.instrument
+def optimize_boundaries(n_clicks, dataset_key, max_width, margin_start, margin_end, segments, active):
+    dataset = datasets.get(dataset_key)
+    if n_clicks == 0 or dataset is None:
+        return dash.no_update, dash.no_update, dash.no_update
 
-        # If the region is wider than the maximum width
-        if region_width > max_width:
-            # Check if there are any targets in this region
-            targets_in_region = [mz for mz in all_mz_values if start < mz < end]
-            target_count = len(targets_in_region)
+    # With RT segments, only the targets eluting in the active one matter
+    mask = segment_mask(dataset.df, segments, active) if segments else None
+    df = dataset.df[mask] if segments else dataset.df
+    try:
+        solution = solve_boundaries(
+            df,
+            max_width=max_width,
+            margin_start=DEFAULT_MARGIN_START if margin_start is None else margin_start,
+            margin_end=DEFAULT_MARGIN_END if margin_end is None else margin_end,
+            envelope=dataset.envelope.take(mask),
+        )
+    except ValueError as exc:  # Max width below the rounding step
+        return dash.no_update, f"Optimize: {exc}.", dash.no_update
+    lines = solution.lines
+
+    line_text = format_line_positions(lines)
+    if solution.cut:
+        line_text = (f"{solution.cut} target envelope(s) overlap others over more than the max width "
+                     f"and had to be cut. " + line_text)
+
+    return lines, line_text, None
+
+
+@background_callback(
+    Output("sweep-table", "data"),
+    Output("sweep-summary", "children"),
+    Input("sweep-btn", "n_clicks"),
+    State("dataset-key", "data"),
+    State("sweep-max-widths", "value"),
+    State("sweep-steps", "value"),
+    State("sweep-margins-start", "value"),
+    State("sweep-margins-end", "value"),
+    State("sweep-methods", "value"),
+    State("lines", "data"),
+    State("rt-segments", "data"),
+    State("active-segment", "data"),
+    progress=[Output("sweep-status", "children")],
+    running=[(Output("sweep-btn", "disabled"), True, False),
+             (Output("sweep-status", "style"), JOB_STATUS_SHOWN, JOB_STATUS_HIDDEN)],
+    prevent_initial_call=True
+)
+@metrics.instrument
+def run_parameter_sweep(set_progress, n_clicks, dataset_key, max_widths, steps, margins_start, margins_end,
+                        methods, lines, segments, active):
+    set_progress(("Sweep: loading dataset...",))
+    dataset = datasets.get(dataset_key)
+    if n_clicks == 0 or dataset is None:
+        return dash.no_update, dash.no_update
 
-            print(f"  Found {target_count} targets in region")
+    try:
+        grid = parameter_grid(parse_values(max_widths), parse_values(steps), parse_values(margins_start),
+                              parse_values(margins_end), methods or [])
+    except ValueError as exc:  # Not numbers, or a max width below a rounding step
+        return dash.no_update, f"Sweep: {exc}."
+    if not grid:
+        return [], "Nothing to sweep: enter at least one value for every parameter."
 
-            # If no or very few targets, divide the region
-            if target_count < 2:  # Allow for more lenient check
-                # Calculate divisions - ensure at least one new line
-                num_divisions = max(2, int(region_width / max_width) + 1)
-                step = region_width / num_divisions
+    # Like Optimize Windows, only the targets eluting in the active RT segment count
+    mask = segment_mask(dataset.df, segments, active) if segments else None
+    df = dataset.df[mask] if segments else dataset.df
 
-                print(f"  Adding {num_divisions - 1} dividing lines with step {step}")
+    def report(done, total):
+        set_progress((f"Sweep: {done} of {total} schemes scored...",))
 
-                # Add lines at equal intervals
-                for j in range(1, num_divisions):
-                    new_line_pos = start + (j * step)
-                    new_lines.append(new_line_pos)
-                    last_added = new_line_pos
-                    print(f"  Added line at {new_line_pos}")
+    results = run_sweep(df, grid, workers=SWEEP_WORKERS, seeds=lines or [], progress=report,
+                        envelope=dataset.envelope.take(mask))
+    where = f" in {segment_label(segments[active])}" if segments else ""
+    return results, f"{len(results)} schemes scored on {len(df)} targets{where}. Click a column header to sort."
 
-    # If we didn't add any lines, no update is needed
-    if not new_lines:
-        print("No new lines were added")
-        return dash.no_update, dash.no_update, dash.no_update
 
-    # Add the new lines to the existing ones and sort
-    updated_lines = sorted_lines + new_lines
-    updated_lines.sort()
+@callback(
+    Output("rt-segments", "data"),
+    Output("active-segment", "data"),
+    Output("lines", "data", allow_duplicate=True),
+    Output("segment-select", "options"),
+    Output("segment-select", "value"),
+    Input("split-segment-btn", "n_clicks"),
+    Input("merge-segment-btn", "n_clicks"),
+    Input("segment-select", "value"),
+    Input("dataset-key", "data"),
+    State("segment-rt", "value"),
+    State("rt-segments", "data"),
+    State("active-segment", "data"),
+    State("lines", "data"),
+    prevent_initial_call=True
+)
+@metrics.instrument
+def edit_rt_segments(split_clicks, merge_clicks, selected, dataset_key, split_rt, segments, active, lines):
+    triggered = ctx.triggered_id
+    dataset = datasets.get(dataset_key)
+    if triggered == "dataset-key" or dataset is None:
+        # A new dataset starts unscheduled, a saved project with the segments it was saved with
+        saved = dataset.session if dataset is not None else None
+        if saved and len(saved.get("rt_segments", [])) >= 2:
+            segments, active = saved["rt_segments"], saved.get("active_segment", 0)
+            options = [{"label": segment_label(s), "value": i} for i, s in enumerate(segments)]
+            return segments, active, dash.no_update, options, active
+        return [], 0, dash.no_update, [], None
+    if triggered == "segment-select" and (selected is None or selected == active):
+        return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
+
+    lines = lines or []
+    # The active segment's boundaries live in "lines" while it is being edited
+    if segments:
+        segments = with_segment_lines(segments, active, lines)
+    else:
+        segments = whole_gradient(lines, dataset.rt_min, dataset.rt_max)
+        active = 0
+
+    if triggered == "split-segment-btn":
+        if split_rt is None:
+            return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
+        segments = split_segment(segments, split_rt)
+        # Keep editing the half that starts at the split
+        active = int(SegmentIndex(segments).segment_of([split_rt])[0])
+    elif triggered == "merge-segment-btn":
+        segments = merge_segment(segments, active)
+        active = max(0, active - 1)
+    else:
+        active = selected
 
-    print(f"Added {len(new_lines)} new lines, total lines: {len(updated_lines)}")
+    if len(segments) < 2:
+        # Back to one boundary set for the whole gradient
+        return [], 0, segments[0]["lines"], [], None
 
-    # Create the updated text display
-    line_text = f"Lines: {', '.join(f'{x:.2f}' for x in updated_lines)}" if updated_lines else "No lines added yet."
+    options = [{"label": segment_label(s), "value": i} for i, s in enumerate(segments)]
+    return segments, active, segments[active]["lines"], options, active
 
-    return updated_lines, line_text, last_added
 
-@app.callback(
+@callback(
     Output("scatter-plot", "figure"),
+    Output("plotted-lines", "data"),
+    Output("violation-status", "children"),
+    Output("violation-lines", "data"),
     Input("lines", "data"),
-    Input("dataframe", "data"),
+    Input("dataset-key", "data"),
+    Input("view-range", "data"),
+    Input("rt-segments", "data"),
+    State("plotted-lines", "data"),
+    State("violation-lines", "data"),
     State("current-mode", "data"),
-    State("scatter-plot", "figure"),  # Remove the allow_duplicate parameter here
+    State("active-segment", "data"),
 )
-def update_plot(lines, dataframe, current_mode, current_figure):
+@metrics.instrument
+def update_plot(lines, dataset_key, view_range, segments, plotted_lines, violation_lines, current_mode, active):
     fig = go.Figure()
 
-    if dataframe is None:
+    dataset = datasets.get(dataset_key)
+    if dataset is None:
         fig.update_layout(title="Upload a CSV to get started")
-        return fig
-
-    df = pd.DataFrame(dataframe)
-
-    # Create color palette
-    if "Name" in df.columns:
-        unique_names = df["Name"].unique()
-        color_palette = {name: color for name, color in zip(unique_names, px.colors.qualitative.Set2)}
-    else:
-        color_palette = {}
-
-    def get_opacity(type_value):
-        return 0.5 if type_value == "Light" else 1.0
-
-    # Add scatter traces
-    scatter_traces = []
-    for col in ["MZ", "MZp1", "MZp2"]:
-        if col in df.columns:
-            scatter_traces.append(
-                go.Scatter(
-                    x=df[col],
-                    y=df["RT"],
-                    mode="markers",
-                    marker=dict(
-                        size=8,
-                        color=[color_palette.get(name, "gray") for name in
-                               df["Name"]] if "Name" in df.columns else "gray",
-                        opacity=[get_opacity(t) for t in df["Types"]] if "Types" in df.columns else 1.0,
-                        showscale=False
-                    ),
-                    text=df["Name"] if "Name" in df.columns else None,
-                    name=f"Scatter ({col})"
-                )
-            )
-
-    fig.add_traces(scatter_traces)
+        return fig, None, "", None
+
+    lines = lines or []
+    triggered = ctx.triggered_prop_ids
+
+    # Boundary edits only move shapes, so patch those instead of redrawing every point
+    if ("dataset-key.data" not in triggered and "rt-segments.data" not in triggered
+            and "lines.data" in triggered and plotted_lines is not None):
+        y_min_padded, y_max_padded = padded_rt_range(dataset)
+        patched = Patch()
+        patch_line_shapes(patched, plotted_lines, lines, y_min_padded, y_max_padded)
+        tracker = dataset.violation_tracker(segments, active)
+        report = tracker.update(lines)
+        changed = tracker.status_changes(violation_lines, lines) if violation_lines is not None else None
+        patch_violations(patched, dataset, report, violation_mz_range(dataset, view_range),
+                         y_min_padded, y_max_padded, changed)
+        return patched, lines, violation_status(report), lines
+
+    # Zooming only changes what is drawn for large datasets in density mode
+    if triggered and all(prop_id == "view-range.data" for prop_id in triggered):
+        if dataset.render_mode != "density":
+            return dash.no_update, dash.no_update, dash.no_update, dash.no_update
+        y_min_padded, y_max_padded = padded_rt_range(dataset)
+        patched = Patch()
+        patch_viewport(patched, dataset, view_range, segments)
+        # The rings follow the zoom like the points
+        report = dataset.violation_tracker(segments, active).update(lines)
+        patch_violations(patched, dataset, report, violation_mz_range(dataset, view_range),
+                         y_min_padded, y_max_padded)
+        return patched, dash.no_update, dash.no_update, lines
+
+    # A new dataset starts zoomed out; other rebuilds keep the current view's points
+    mz_range = view_range["x"] if view_range and "dataset-key.data" not in triggered else None
 
     # Calculate y-axis range with padding
-    y_min = df["RT"].min()
-    y_max = df["RT"].max()
-    y_range = y_max - y_min
-    padding = 0.1 * y_range  # 10% padding
-    y_min_padded = y_min - padding
-    y_max_padded = y_max + padding
+    y_min_padded, y_max_padded = padded_rt_range(dataset)
 
-    # Add vertical lines with extended length
-    if lines:
-        shapes = []
-        for i, line_pos in enumerate(lines):
-            shapes.append({
-                'type': 'line',
-                'x0': line_pos,
-                'x1': line_pos,
-                'y0': y_min_padded,  # Extended below
-                'y1': y_max_padded,  # Extended above
-                'xref': 'x',
-                'yref': 'y',
-                'line': {
-                    'color': 'grey',
-                    'width': 1.2,
-                },
-            })
-        fig.update_layout(shapes=shapes)
+    report = dataset.violation_tracker(segments, active).update(lines)
+    if segments:
+        fig.add_trace(segment_band_trace(dataset, segments[active]))
+    fig.add_traces(build_scatter_traces(dataset, mz_range))
 
     # Base layout
     fig.update_layout(
@@ -379,42 +1266,78 @@ def update_plot(lines, dataframe, current_mode, current_figure):
         },
         dragmode="zoom",
         showlegend=True,
-        hovermode='closest'
+        hovermode='closest',
+        # Zoom and pan survive later patches and rebuilds until the dataset changes
+        uirevision=dataset.key,
     )
 
-    if current_mode == "precision" and current_figure and 'layout' in current_figure:
-        # If we're in precision mode, preserve the current x-axis range
-        if 'xaxis' in current_figure['layout'] and 'range' in current_figure['layout']['xaxis']:
-            fig.update_xaxes(range=current_figure['layout']['xaxis']['range'],
-                             tick0=current_figure['layout']['xaxis'].get('tick0', 0),
-                             dtick=current_figure['layout']['xaxis'].get('dtick', 0.5))
+    if mz_range is not None:
+        # Keep the current zoom while redrawing
+        fig.update_xaxes(range=mz_range)
+        if "y" in view_range:
+            fig.update_yaxes(range=view_range["y"])
+        if current_mode == "precision":
+            fig.update_xaxes(tick0=round(mz_range[0] * 2) / 2, dtick=0.5)
             fig.update_layout(
                 dragmode='pan',
                 title="PRECISION MODE: Zoomed In for Enhanced Line Positioning"
             )
 
-    return fig
+    # The violation traces and the boundary lines go into the figure dict
+    # unvalidated: plotly building one Shape object per boundary took seconds
+    # for a few thousand boundaries
+    figure = fig.to_plotly_json()
+    figure["data"] = violation_traces(dataset, report, mz_range if dataset.render_mode == "density" else None,
+                                      y_min_padded, y_max_padded) + figure["data"]
+    # Add vertical lines with extended length
+    figure["layout"]["shapes"] = [line_shape(line_pos, y_min_padded, y_max_padded) for line_pos in lines]
+    return figure, lines, violation_status(report), lines
+
+
+@callback(
+    Output("scatter-plot", "figure", allow_duplicate=True),
+    Output("violation-status", "children", allow_duplicate=True),
+    Output("violation-lines", "data", allow_duplicate=True),
+    Input("draft-lines", "data"),
+    State("dataset-key", "data"),
+    State("rt-segments", "data"),
+    State("active-segment", "data"),
+    State("violation-lines", "data"),
+    State("view-range", "data"),
+    prevent_initial_call=True
+)
+@metrics.instrument
+def check_violations(draft_lines, dataset_key, segments, active, violation_lines, view_range):
+    """Flag cut envelopes as soon as a drag lands, before the boundaries are committed."""
+    dataset = datasets.get(dataset_key)
+    if draft_lines is None or dataset is None:
+        return dash.no_update, dash.no_update, dash.no_update
+
+    y_min_padded, y_max_padded = padded_rt_range(dataset)
+    tracker = dataset.violation_tracker(segments, active)
+    report = tracker.update(draft_lines)
+    changed = tracker.status_changes(violation_lines, draft_lines) if violation_lines is not None else None
+    patched = Patch()
+    patch_violations(patched, dataset, report, violation_mz_range(dataset, view_range),
+                     y_min_padded, y_max_padded, changed)
+    return patched, violation_status(report), draft_lines
 
 
-@app.callback(
+@callback(
     Output("lines", "data", allow_duplicate=True),
     Output("line-positions", "children"),
-    Output("scatter-plot", "figure", allow_duplicate=True),
     Output("last-altered-line", "data"),
     Input("add-line-btn", "n_clicks"),
     Input("remove-line-btn", "n_clicks"),
-    Input("scatter-plot", "relayoutData"),
     State("line-position", "value"),
     State("lines", "data"),
-    State("dataframe", "data"),
-    State("scatter-plot", "figure"),
-    State("current-mode", "data"),
+    State("dataset-key", "data"),
     State("last-altered-line", "data"),  # Add this state to access last altered line
     prevent_initial_call=True
 )
-def modify_and_update_lines(add_clicks, remove_clicks, relayout_data, line_position, lines, dataframe, current_figure,
-                            current_mode, last_altered_line):
-    # Original line handling logic
+@metrics.instrument
+def modify_and_update_lines(add_clicks, remove_clicks, line_position, lines, dataset_key, last_altered_line):
+    # Shape drags are handled clientside, see assets/isops_clientside.js
     if lines is None:
         lines = []
 
@@ -425,11 +1348,11 @@ def modify_and_update_lines(add_clicks, remove_clicks, relayout_data, line_posit
     min_mz = 100
     max_mz = 2000
 
-    # If dataframe exists, get its actual range, but still enforce minimum of 100-2000
-    if dataframe is not None:
-        df = pd.DataFrame(dataframe)
-        data_min = df["MZ"].min()
-        data_max = df["MZ"].max()
+    # If a dataset is loaded, get its actual range, but still enforce minimum of 100-2000
+    dataset = datasets.get(dataset_key)
+    if dataset is not None:
+        data_min = dataset.mz_min
+        data_max = dataset.mz_max
         # Only use dataset bounds if they're wider than our default bounds
         min_mz = min(min_mz, data_min)
         max_mz = max(max_mz, data_max)
@@ -441,9 +1364,9 @@ def modify_and_update_lines(add_clicks, remove_clicks, relayout_data, line_posit
                 lines.append(line_position)
                 new_last_altered = line_position  # Set last altered to the new line
             else:
-                return lines, f"Invalid line position. Please enter a value between {min_mz:.2f} and {max_mz:.2f}.", dash.no_update, new_last_altered
+                return lines, f"Invalid line position. Please enter a value between {min_mz:.2f} and {max_mz:.2f}.", new_last_altered
         except ValueError:
-            return lines, "Invalid line position. Please enter a number.", dash.no_update, new_last_altered
+            return lines, "Invalid line position. Please enter a number.", new_last_altered
 
     elif ctx.triggered_id == "remove-line-btn" and lines:
         if last_altered_line is not None and last_altered_line in lines:
@@ -455,155 +1378,236 @@ def modify_and_update_lines(add_clicks, remove_clicks, relayout_data, line_posit
             # Fallback to removing the last line if last_altered is not in the list
             lines.pop()
 
-    elif relayout_data:
-        updated_lines = list(lines)
-        for key, value in relayout_data.items():
-            if key.startswith("shapes[") and key.endswith("].x0"):
-                try:
-                    index = int(key[7:key.find("]")])
-                    line_pos = float(value)
-                    if index < len(updated_lines):
-                        updated_lines[index] = line_pos
-                        new_last_altered = line_pos  # Set last altered to the dragged line
-                except (ValueError, IndexError):
-                    continue
-        if updated_lines:
-            lines = updated_lines
-
     lines.sort()
-    line_text = f"Lines: {', '.join(f'{x:.2f}' for x in lines)}" if lines else "No lines added yet."
-
-    # If we're in precision mode and have relayout data that's changing shape positions
-    # we need to preserve the current zoom level
-    if current_mode == "precision" and ctx.triggered_id == "scatter-plot" and relayout_data:
-        # Check if this is a shape drag operation
-        shape_keys = [k for k in relayout_data.keys() if k.startswith("shapes[") and (".x0" in k or ".x1" in k)]
-        if shape_keys and current_figure and 'layout' in current_figure and 'xaxis' in current_figure['layout']:
-            # This is a shape drag, so preserve the current zoom
-            new_figure = dict(current_figure)
-            # Ensure we keep the precision mode appearance
-            new_figure['layout']['title'] = "PRECISION MODE: Zoomed In for Enhanced Line Positioning"
-            new_figure['layout']['dragmode'] = 'pan'
-            return lines, line_text, new_figure, new_last_altered
-
-    # If it's not a shape drag or we're not in precision mode, don't update the figure
-    return lines, line_text, dash.no_update, new_last_altered
-
-
-@app.callback(
-    Output("download-lines", "data"),
-    Input("download-lines-btn", "n_clicks"),
-    State("lines", "data"),
-    State("dataframe", "data"),
+    line_text = format_line_positions(lines)
+
+    return lines, line_text, new_last_altered
+
+
+@callback(
+    Output("window-table", "data"),
+    Output("window-table", "page_count"),
+    Input("lines", "data"),
+    Input("window-table", "page_current"),
+    Input("window-table", "page_size"),
+    Input("dataset-key", "data"),
+    Input("rt-segments", "data"),
+    State("active-segment", "data"),
+)
+@metrics.instrument
+def update_window_table(lines, page_current, page_size, dataset_key, segments, active):
+    dataset = datasets.get(dataset_key)
+    if dataset is None or not lines:
+        return [], 0
+
+    # Unchanged windows come from the cache, only the edited ones are recomputed
+    rows = dataset.window_stats(segments, active).table(lines)
+    page_size = page_size or WINDOW_TABLE_PAGE_SIZE
+    page_count = max(1, -(-len(rows) // page_size))
+    page_current = min(page_current or 0, page_count - 1)
+    return rows[page_current * page_size:(page_current + 1) * page_size], page_count
+
+
+# Dragging a boundary is parsed, sorted and displayed in the browser; the server
+# only receives the final boundary set once the drag has settled
+clientside_callback(
+    ClientsideFunction(namespace="isops", function_name="dragLines"),
+    Output("draft-lines", "data"),
+    Output("line-positions", "children", allow_duplicate=True),
+    Output("last-altered-line", "data", allow_duplicate=True),
+    Output("scatter-plot", "figure", allow_duplicate=True),
+    Input("scatter-plot", "relayoutData"),
+    State("scatter-plot", "figure"),
+    prevent_initial_call=True
+)
+
+clientside_callback(
+    ClientsideFunction(namespace="isops", function_name="commitLines"),
+    Output("lines", "data", allow_duplicate=True),
+    Input("draft-lines", "data"),
+    prevent_initial_call=True
+)
+
+# Undo/redo history of the lines store, kept as deltas in the browser. Undoing
+# writes the restored lines back to "lines", so the server sees it as any other edit.
+clientside_callback(
+    ClientsideFunction(namespace="isops", function_name="recordLines"),
+    Output("line-history", "data"),
+    Input("lines", "data"),
+    Input("dataset-key", "data"),
+    Input("active-segment", "data"),
+    State("line-history", "data"),
+)
+
+clientside_callback(
+    ClientsideFunction(namespace="isops", function_name="undoRedo"),
+    Output("lines", "data", allow_duplicate=True),
+    Output("line-positions", "children", allow_duplicate=True),
+    Output("last-altered-line", "data", allow_duplicate=True),
+    Output("line-history", "data", allow_duplicate=True),
+    Input("undo-btn", "n_clicks"),
+    Input("redo-btn", "n_clicks"),
+    State("line-history", "data"),
     prevent_initial_call=True
 )
-@app.callback(
-    Output("download-lines", "data", allow_duplicate=True),
+
+clientside_callback(
+    ClientsideFunction(namespace="isops", function_name="historyButtons"),
+    Output("undo-btn", "disabled"),
+    Output("redo-btn", "disabled"),
+    Input("line-history", "data"),
+)
+
+clientside_callback(
+    ClientsideFunction(namespace="isops", function_name="viewRange"),
+    Output("view-range", "data"),
+    Input("scatter-plot", "relayoutData"),
+    prevent_initial_call=True
+)
+
+
+# Download Lines posts the session's export request to EXPORT_ROUTE from the browser,
+# so the file streams straight into the download as it is written, a chunk at a time
+clientside_callback(
+    ClientsideFunction(namespace="isops", function_name="requestExport"),
+    Output("export-request", "data"),
     Input("download-lines-btn", "n_clicks"),
     State("lines", "data"),
-    State("dataframe", "data"),
+    State("dataset-key", "data"),
+    State("rt-segments", "data"),
+    State("active-segment", "data"),
+    State("interference-rt-tolerance", "value"),
+    State("export-format", "value"),
+    State("export-content", "value"),
     prevent_initial_call=True
 )
-def download_lines(n_clicks, lines, dataframe):
-    if not lines or dataframe is None:
-        return dash.no_update
 
-    # Sort the lines
-    sorted_lines = sorted([float(l) for l in lines])
 
-    # Create output dataframe with the required columns
-    output_columns = [
-        "Start", "End", "Name", "Types", "Charge", "RT", "MZ", "MZp1", "MZp2",
-        "Round_start", "Round_end", "MZ-Round_start", "Round_end-MZp2"
-    ]
-
-    output_rows = []
-
-    # Process each pair of adjacent lines to form windows
-    if len(sorted_lines) >= 2:
-        df = pd.DataFrame(dataframe)
-
-        for i in range(len(sorted_lines) - 1):
-            start = sorted_lines[i]
-            end = sorted_lines[i + 1]
-
-            # Round start and end to specific precision
-            round_start = round(start * 2) / 2  # Rounds to nearest 0.5
-            round_end = round(end * 2) / 2  # Rounds to nearest 0.5
-
-            # Filter targets that fall within this window
-            targets_in_window = df[(df["MZ"] >= start) & (df["MZ"] < end)]
-
-            # If no targets, create an empty row for the window
-            if len(targets_in_window) == 0:
-                row = {
-                    "Start": start,
-                    "End": end,
-                    "Name": "NA",
-                    "Types": "NA",
-                    "Charge": "NA",
-                    "RT": "NA",
-                    "MZ": "NA",
-                    "MZp1": "NA",
-                    "MZp2": "NA",
-                    "Round_start": round_start,
-                    "Round_end": round_end,
-                    "MZ-Round_start": "NA",
-                    "Round_end-MZp2": "NA"
-                }
-                output_rows.append(row)
-            else:
-                # For each target in the window, create a row
-                for _, target in targets_in_window.iterrows():
-                    # Extract target information
-                    name = target.get("Name", "NA")
-                    types = target.get("Types", "NA")
-                    charge = target.get("Charge", "NA")
-                    rt = target.get("RT", "NA")
-                    mz = target.get("MZ", "NA")
-                    mzp1 = target.get("MZp1", "NA")
-                    mzp2 = target.get("MZp2", "NA")
-
-                    # Calculate distances
-                    mz_minus_round_start = "NA"
-                    round_end_minus_mzp2 = "NA"
-
-                    if mz != "NA" and round_start != "NA":
-                        mz_minus_round_start = float(mz) - round_start
-
-                    if mzp2 != "NA" and round_end != "NA":
-                        round_end_minus_mzp2 = round_end - float(mzp2)
-
-                    # Create row
-                    row = {
-                        "Start": start,
-                        "End": end,
-                        "Name": name,
-                        "Types": types,
-                        "Charge": charge,
-                        "RT": rt,
-                        "MZ": mz,
-                        "MZp1": mzp1,
-                        "MZp2": mzp2,
-                        "Round_start": round_start,
-                        "Round_end": round_end,
-                        "MZ-Round_start": mz_minus_round_start,
-                        "Round_end-MZp2": round_end_minus_mzp2
-                    }
-                    output_rows.append(row)
-
-    # Create the final dataframe
-    if output_rows:
-        result_df = pd.DataFrame(output_rows)
-        # Ensure columns are in the correct order
-        result_df = result_df[output_columns]
+def export_stream(request):
+    """(file name, media type, byte chunks) of the export an export request asks for; None if there is nothing to export.
+
+    The window table is built and encoded CHUNK_ROWS rows at a time as the
+    chunks are consumed, so memory stays bounded whatever the export size.
+    Raises ValueError for a request the export cannot be built from.
+    """
+    dataset = datasets.get(request.get("dataset_key"))
+    lines = request.get("lines") or []
+    segments = request.get("rt_segments") or []
+    if dataset is None or not (lines or segments):
+        return None
+
+    if segments:
+        # RT-scheduled windows gain RT_start/RT_end columns
+        active = request.get("active_segment") or 0
+        if not isinstance(active, int) or isinstance(active, bool) or not 0 <= active < len(segments):
+            raise ValueError(f"active_segment {active!r} is not one of the {len(segments)} RT segments")
+        assignment = WindowAssignment.from_segments(dataset.df, with_segment_lines(segments, active, lines),
+                                                    dataset.envelope)
     else:
-        # If no windows, create an empty dataframe with the required columns
-        result_df = pd.DataFrame(columns=output_columns)
+        assignment = WindowAssignment.from_lines(dataset.df, lines, dataset.envelope)
+
+    content = request.get("content") or "windows"
+    fmt = request.get("format") or "csv"
+    transform = None
+    if background_library is not None:
+        rt_tolerance = request.get("rt_tolerance")
+        transform = functools.partial(add_interference, library=background_library,
+                                      rt_tolerance=DEFAULT_RT_TOLERANCE if rt_tolerance is None else rt_tolerance)
+    chunks = assignment.export(fmt, content, transform)
+    return export_filename(content, fmt), MEDIA_TYPES[fmt], chunks
+
+
+def register_export_route(server, path):
+    """Serve exports from path: a POST with the JSON export request in its "request" form field."""
+    import flask
+
+    @server.route(path, methods=["POST"])
+    def export_windows():
+        start = time.perf_counter()
+        try:
+            export = export_stream(json.loads(flask.request.form.get("request") or "{}"))
+        except ValueError as exc:  # Unknown format, content or segment, or Parquet without pyarrow
+            return flask.Response(str(exc), status=400, content_type="text/plain")
+        if export is None:
+            return flask.Response(status=204)
+        filename, media_type, chunks = export
+
+        def generate():
+            written = 0
+            for data in chunks:
+                written += len(data)
+                yield data
+            metrics.observe("duration_seconds", "export", time.perf_counter() - start)
+            metrics.observe("response_bytes", "export", written)
+
+        return flask.Response(generate(), mimetype=media_type,
+                              headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+    return server
+
+
+@background_callback(
+    Output("download-project", "data"),
+    Input("save-project-btn", "n_clicks"),
+    State("lines", "data"),
+    State("dataset-key", "data"),
+    State("rt-segments", "data"),
+    State("active-segment", "data"),
+    *[State(component, "value") for component in PROJECT_PARAMETERS],
+    progress=[Output("project-status", "children")],
+    running=[(Output("save-project-btn", "disabled"), True, False),
+             (Output("project-status", "style"), JOB_STATUS_SHOWN, JOB_STATUS_HIDDEN)],
+    prevent_initial_call=True
+)
+@metrics.instrument
+def save_project(set_progress, n_clicks, lines, dataset_key, segments, active, *parameters):
+    set_progress(("Save: loading dataset...",))
+    dataset = datasets.get(dataset_key)
+    if dataset is None:
+        return dash.no_update
 
-    # Create CSV in memory and prepare for download
-    return dcc.send_data_frame(result_df.to_csv, filename="isolation_windows.csv", index=False)
+    lines = lines or []
+    session = {
+        "lines": lines,
+        "rt_segments": with_segment_lines(segments, active, lines) if segments else [],
+        "active_segment": active if segments else 0,
+        "parameters": dict(zip(PROJECT_PARAMETERS, parameters)),
+        "envelope": dataset.envelope_settings,
+    }
+    set_progress(("Save: indexing targets...",))
+    project = Project(dataset.df, session, dataset.project_indexes())
+    set_progress((f"Save: writing {len(dataset.df):,} targets...",))
+    return dcc.send_bytes(functools.partial(write_project, project=project), filename="isops_project.isops")
+
+
+_app = None
+
+
+def create_app(state_dir=None):
+    """Build the Dash app and return it; later calls return the same app.
+
+    Importing this module only defines the callbacks. The Flask server,
+    layout, background job manager and shared upload store are set up here,
+    so tooling that just calls the callback functions never pays for them.
+    state_dir defaults to $ISOPS_STATE_DIR.
+    """
+    global _app
+    if _app is None:
+        state_dir = state_dir or STATE_DIR
+        if state_dir:
+            datasets.shared = SharedUploadStore(state_dir)
+        manager = make_background_manager(state_dir) if HAVE_BACKGROUND_JOBS else None
+        app = dash.Dash(__name__, background_callback_manager=manager)
+        if manager is not None:
+            # Jobs report their metrics through the job cache
+            metrics.spool = manager.handle
+        app.layout = build_layout()
+        metrics.install(app.server)
+        register_export_route(app.server, app.config.routes_pathname_prefix + EXPORT_ROUTE)
+        _app = app
+    return _app
 
 
 if __name__ == "__main__":
-    app.run_server(debug=True)
\ No newline at end of file
+    # Development server; see wsgi.py for running under gunicorn
+    create_app().run(debug=True)
\ No newline at end of file
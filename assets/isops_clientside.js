@@ -0,0 +1,257 @@
+// Clientside callbacks for boundary-line dragging and undo/redo.
+//
+// Dragging a shape only needs the figure that already lives in the browser,
+// so parsing relayoutData, sorting the boundaries and refreshing the
+// line-positions text all happen here. The server is only sent the final
+// boundary set once dragging has paused for DRAG_DEBOUNCE_MS.
+//
+// The undo history also stays in the browser. Every committed change to the
+// lines store is kept as a delta: the boundary values it removed and added
+// (one added value for an insert, one removed for a delete, one of each for
+// a move). Undoing applies the delta in reverse to the current lines.
+//
+// Exports are not a callback output: Download Lines posts the export request
+// to the server's export route through a hidden form, and the browser saves
+// the response as it streams in.
+
+const DRAG_DEBOUNCE_MS = 400;
+const LINE_LIST_LIMIT = 20;  // Same as LINE_LIST_LIMIT in the app
+const SHAPE_X0_KEY = /^shapes\[(\d+)\]\.x0$/;
+const HISTORY_STEPS = 500;  // Undo steps kept, oldest dropped first
+const HISTORY_VALUES = 100000;  // Boundary values kept across all steps, so a few huge auto-fills cannot pile up
+const EXPORT_ROUTE = "export";  // Same as EXPORT_ROUTE in the app
+const EXPORT_FRAME = "isops-export-frame";  // Hidden iframe the export form targets, so the page stays put
+
+let dragToken = 0;
+
+function formatLinePositions(lines) {
+    if (!lines.length) {
+        return "No lines added yet.";
+    }
+    const shown = lines.slice(0, LINE_LIST_LIMIT).map(x => x.toFixed(2)).join(", ");
+    if (lines.length > LINE_LIST_LIMIT) {
+        return "Lines (" + lines.length + "): " + shown + ", ... (see the window table)";
+    }
+    return "Lines: " + shown;
+}
+
+function sortedLines(lines) {
+    return lines.slice().sort((a, b) => a - b);
+}
+
+// Multiset difference of two boundary lists: {removed, added}, both sorted
+function lineDelta(before, after) {
+    const a = sortedLines(before);
+    const b = sortedLines(after);
+    const removed = [];
+    const added = [];
+    let i = 0;
+    let j = 0;
+    while (i < a.length || j < b.length) {
+        if (j >= b.length || (i < a.length && a[i] < b[j])) {
+            removed.push(a[i++]);
+        } else if (i >= a.length || b[j] < a[i]) {
+            added.push(b[j++]);
+        } else {
+            i++;
+            j++;
+        }
+    }
+    return {removed: removed, added: added};
+}
+
+// Sorted lines with the (sorted) values in remove taken out and those in add merged in
+function applyDelta(lines, remove, add) {
+    const current = sortedLines(lines);
+    const result = [];
+    let r = 0;
+    let a = 0;
+    for (const line of current) {
+        while (r < remove.length && remove[r] < line) {
+            r++;
+        }
+        if (r < remove.length && remove[r] === line) {
+            r++;
+            continue;
+        }
+        while (a < add.length && add[a] < line) {
+            result.push(add[a++]);
+        }
+        result.push(line);
+    }
+    return result.concat(add.slice(a));
+}
+
+function deltaSize(delta) {
+    return delta.removed.length + delta.added.length;
+}
+
+function sameLines(a, b) {
+    return a.length === b.length && a.every((line, i) => line === b[i]);
+}
+
+// Hidden form posting to the export route, created on first use
+function exportForm() {
+    let form = document.getElementById(EXPORT_FRAME + "-form");
+    if (form) {
+        return form;
+    }
+    const frame = document.createElement("iframe");
+    frame.name = EXPORT_FRAME;
+    frame.style.display = "none";
+    const config = JSON.parse(document.getElementById("_dash-config").textContent);
+    form = document.createElement("form");
+    form.id = EXPORT_FRAME + "-form";
+    form.method = "POST";
+    form.action = config.requests_pathname_prefix + EXPORT_ROUTE;
+    form.target = EXPORT_FRAME;
+    form.style.display = "none";
+    const field = document.createElement("input");
+    field.type = "hidden";
+    field.name = "request";
+    form.appendChild(field);
+    document.body.appendChild(frame);
+    document.body.appendChild(form);
+    return form;
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    isops: {
+        // relayoutData -> [draft lines, line-positions text, last altered line, figure]
+        dragLines: function (relayoutData, figure) {
+            const noUpdate = window.dash_clientside.no_update;
+            if (!relayoutData || !figure || !figure.layout || !figure.layout.shapes) {
+                return [noUpdate, noUpdate, noUpdate, noUpdate];
+            }
+
+            const shapes = figure.layout.shapes.slice();
+            let lastAltered = noUpdate;
+            for (const [key, value] of Object.entries(relayoutData)) {
+                const match = SHAPE_X0_KEY.exec(key);
+                if (!match) {
+                    continue;
+                }
+                const index = Number(match[1]);
+                const linePos = parseFloat(value);
+                if (index >= shapes.length || isNaN(linePos)) {
+                    continue;
+                }
+                shapes[index] = Object.assign({}, shapes[index], {x0: linePos, x1: linePos});
+                lastAltered = linePos;
+            }
+            if (lastAltered === noUpdate) {
+                return [noUpdate, noUpdate, noUpdate, noUpdate];
+            }
+
+            // Keep the shapes in boundary order so shape indices keep matching the lines store
+            const order = shapes.map((shape, i) => i).sort((a, b) => shapes[a].x0 - shapes[b].x0);
+            const sortedShapes = order.map(i => shapes[i]);
+            const lines = sortedShapes.map(shape => shape.x0);
+            let newFigure = noUpdate;
+            if (order.some((shapeIndex, i) => shapeIndex !== i)) {
+                newFigure = Object.assign({}, figure, {
+                    layout: Object.assign({}, figure.layout, {shapes: sortedShapes})
+                });
+            }
+            return [lines, formatLinePositions(lines), lastAltered, newFigure];
+        },
+
+        // draft lines -> lines, once no further drag arrived within the debounce delay
+        commitLines: function (draftLines) {
+            const token = ++dragToken;
+            return new Promise(resolve => setTimeout(() => {
+                resolve(token === dragToken ? draftLines : window.dash_clientside.no_update);
+            }, DRAG_DEBOUNCE_MS));
+        },
+
+        // lines -> undo history; a new dataset or RT segment starts an empty one
+        recordLines: function (lines, datasetKey, activeSegment, history) {
+            lines = lines || [];
+            const triggered = window.dash_clientside.callback_context.triggered.map(t => t.prop_id);
+            if (!history || !triggered.includes("lines.data")
+                    || triggered.includes("dataset-key.data") || triggered.includes("active-segment.data")) {
+                return {current: lines.slice(), undo: [], redo: [], values: 0};
+            }
+            // Undo and redo write the lines they produce into the history first
+            if (sameLines(lines, history.current)) {
+                return window.dash_clientside.no_update;
+            }
+            const delta = lineDelta(history.current, lines);
+            const undo = history.undo.concat([delta]);
+            let values = history.values + deltaSize(delta);
+            while (undo.length > HISTORY_STEPS || (undo.length > 1 && values > HISTORY_VALUES)) {
+                values -= deltaSize(undo.shift());
+            }
+            // A new edit drops whatever could have been redone
+            return {current: lines.slice(), undo: undo, redo: [], values: values};
+        },
+
+        // undo/redo clicks -> [lines, line-positions text, last altered line, history]
+        undoRedo: function (undoClicks, redoClicks, history) {
+            const noUpdate = window.dash_clientside.no_update;
+            const triggered = window.dash_clientside.callback_context.triggered.map(t => t.prop_id);
+            const isUndo = triggered.includes("undo-btn.n_clicks");
+            const from = history && (isUndo ? history.undo : history.redo);
+            if (!from || !from.length) {
+                return [noUpdate, noUpdate, noUpdate, noUpdate];
+            }
+            const delta = from[from.length - 1];
+            const lines = isUndo ? applyDelta(history.current, delta.added, delta.removed)
+                : applyDelta(history.current, delta.removed, delta.added);
+            const restored = isUndo ? delta.removed : delta.added;
+            const undo = isUndo ? history.undo.slice(0, -1) : history.undo.concat([delta]);
+            const redo = isUndo ? history.redo.concat([delta]) : history.redo.slice(0, -1);
+            const values = history.values + (isUndo ? -deltaSize(delta) : deltaSize(delta));
+            return [
+                lines,
+                formatLinePositions(lines),
+                restored.length ? restored[restored.length - 1] : null,
+                {current: lines, undo: undo, redo: redo, values: values},
+            ];
+        },
+
+        // history -> [undo disabled, redo disabled]
+        historyButtons: function (history) {
+            return [!history || !history.undo.length, !history || !history.redo.length];
+        },
+
+        // Download Lines click -> export request, posted to the export route
+        requestExport: function (nClicks, lines, datasetKey, segments, activeSegment, rtTolerance, format, content) {
+            if (!nClicks || !datasetKey) {
+                return window.dash_clientside.no_update;
+            }
+            const request = {
+                dataset_key: datasetKey,
+                lines: lines || [],
+                rt_segments: segments || [],
+                active_segment: activeSegment || 0,
+                rt_tolerance: rtTolerance,
+                format: format,
+                content: content,
+            };
+            const form = exportForm();
+            form.elements.request.value = JSON.stringify(request);
+            form.submit();
+            return request;
+        },
+
+        // relayoutData -> visible axis ranges, only for zoom and pan events
+        viewRange: function (relayoutData) {
+            const noUpdate = window.dash_clientside.no_update;
+            if (!relayoutData) {
+                return noUpdate;
+            }
+            if (relayoutData["xaxis.autorange"]) {
+                return null;
+            }
+            if (!("xaxis.range[0]" in relayoutData) || !("xaxis.range[1]" in relayoutData)) {
+                return noUpdate;
+            }
+            const view = {x: [relayoutData["xaxis.range[0]"], relayoutData["xaxis.range[1]"]]};
+            if ("yaxis.range[0]" in relayoutData && "yaxis.range[1]" in relayoutData) {
+                view.y = [relayoutData["yaxis.range[0]"], relayoutData["yaxis.range[1]"]];
+            }
+            return view;
+        }
+    }
+});
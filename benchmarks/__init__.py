@@ -0,0 +1,6 @@
+"""Scaling benchmarks for the IsoPS window designer.
+
+    python -m benchmarks.run --sizes 1000,10000,100000 -o results.json
+    python -m benchmarks.compare baseline.json results.json
+    python -m benchmarks.startup -o startup.json
+"""
@@ -0,0 +1,54 @@
+"""Compare two benchmark JSON files and flag regressions.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 1.25
+
+Exits non-zero if any case got slower (or used more peak memory) than the
+threshold ratio allows.
+"""
+import argparse
+import json
+
+
+def case_key(result):
+    return result["callback"], result["scenario"], result["rows"]
+
+
+def compare(baseline, candidate, threshold, min_seconds=0.005):
+    """Rows of (key, time ratio, memory ratio, regressed) for cases present in both runs."""
+    old = {case_key(result): result for result in baseline["results"]}
+    rows = []
+    for result in candidate["results"]:
+        before = old.get(case_key(result))
+        if before is None:
+            continue
+        time_ratio = result["seconds"] / max(before["seconds"], 1e-9)
+        memory_ratio = result["peak_bytes"] / max(before["peak_bytes"], 1)
+        # Ignore noise on cases that are too fast to time reliably
+        slower = time_ratio > threshold and result["seconds"] > min_seconds
+        rows.append((case_key(result), time_ratio, memory_ratio, slower or memory_ratio > threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="largest acceptable candidate/baseline ratio (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as handle:
+        baseline = json.load(handle)
+    with open(args.candidate) as handle:
+        candidate = json.load(handle)
+
+    rows = compare(baseline, candidate, args.threshold)
+    for (callback, scenario, n_rows), time_ratio, memory_ratio, regressed in rows:
+        flag = "REGRESSION" if regressed else ""
+        print(f"{callback:<26} {scenario:<11} {n_rows:>9} rows  time x{time_ratio:5.2f}  "
+              f"memory x{memory_ratio:5.2f}  {flag}")
+    return 1 if any(regressed for *_, regressed in rows) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,207 @@
+"""Time the app callbacks directly on synthetic datasets of increasing size.
+
+Each callback is called as a plain function, so the numbers cover the
+server-side work only (no HTTP or browser rendering). Peak memory is the
+tracemalloc peak during the call, which includes numpy and pandas buffers.
+"""
+import argparse
+import base64
+import contextlib
+import importlib.util
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+
+from benchmarks.synthetic import generate_precursors
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+APP_PATH = REPO_ROOT / "IsoPS_code_v1.16.py"
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+SEGMENT_COUNT = 100
+
+
+def load_app():
+    # The app module's file name is not a valid module name, so load it by path
+    spec = importlib.util.spec_from_file_location("isops_app", APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@contextlib.contextmanager
+def triggered_by(*prop_ids):
+    """Callback context as Dash would set it when prop_ids fired the callback."""
+    token = context_value.set(AttributeDict(
+        triggered_inputs=[{"prop_id": prop_id, "value": None} for prop_id in prop_ids],
+    ))
+    try:
+        yield
+    finally:
+        context_value.reset(token)
+
+
+def measure(func, repeat):
+    """Best wall time over repeat calls and the tracemalloc peak of one call."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def benchmark_size(app, n_rows, repeat, seed=0):
+    df = generate_precursors(n_rows, seed=seed)
+    contents = "data:text/csv;base64," + base64.b64encode(df.to_csv(index=False).encode()).decode()
+
+    def upload():
+        # Start cold each time, identical uploads are otherwise served from the registry
+        app.datasets.clear()
+        return app.upload_file(contents, "synthetic.csv")
+
+    dataset_key, lines = upload()[:2]
+    lines = sorted(lines)
+    moved = list(lines)
+    moved[len(moved) // 2] += 0.1
+    dataset = app.datasets.get(dataset_key)
+
+    def full_plot():
+        with triggered_by("dataset-key.data"):
+            app.update_plot(lines, dataset_key, None, [], None, None, "normal", 0)
+
+    def redraw_plot():
+        # Segment changes redraw everything but keep the current zoom
+        view_range = {"x": [lines[0], lines[0] + 50], "y": [dataset.rt_min, dataset.rt_max]}
+        with triggered_by("rt-segments.data"):
+            app.update_plot(lines, dataset_key, view_range, [], lines, lines, "normal", 0)
+
+    def patch_plot():
+        with triggered_by("lines.data"):
+            app.update_plot(moved, dataset_key, None, [], lines, lines, "normal", 0)
+
+    # RT-scheduled method: each segment gets its own, coarser boundary set
+    rt_edges = np.linspace(dataset.rt_min, dataset.rt_max, SEGMENT_COUNT + 1)
+    segments = [{"rt_start": float(start), "rt_end": float(end), "lines": lines[i % 10::10]}
+                for i, (start, end) in enumerate(zip(rt_edges[:-1], rt_edges[1:]))]
+
+    drag_states = [moved, lines]
+
+    def drag_check():
+        # Alternate so every call sees one boundary move
+        drag_states.reverse()
+        with triggered_by("draft-lines.data"):
+            app.check_violations(drag_states[0], dataset_key, [], 0, None, None)
+
+    def window_table():
+        # Alternate so every call has the windows next to one boundary dirty
+        drag_states.reverse()
+        with triggered_by("lines.data"):
+            app.update_window_table(drag_states[0], 0, 25, dataset_key, [], 0)
+
+    def add_line():
+        with triggered_by("add-line-btn.n_clicks"):
+            app.modify_and_update_lines(1, 0, lines[0] + 0.05, list(lines), dataset_key, None)
+
+    def sweep():
+        with triggered_by("sweep-btn.n_clicks"):
+            app.run_parameter_sweep(app.ignore_progress, 1, dataset_key, "5, 10", "0.5", "0.25, 0.5", "0.5",
+                                    ["optimize", "auto_fill"], lines, [], 0)
+
+    def export(**request):
+        # Served by the /export route, which streams these chunks as the response
+        _, _, chunks = app.export_stream(dict(dataset_key=dataset_key, lines=lines, **request))
+        for _ in chunks:
+            pass
+
+    def save_project():
+        return app.save_project(app.ignore_progress, 1, lines, dataset_key, [], 0, 10, 0.25, 0.25, 1.0)
+
+    project_contents = "data:application/octet-stream;base64," + save_project()["content"]
+
+    def open_project():
+        app.datasets.clear()
+        return app.upload_file(project_contents, "synthetic.isops")
+
+    cases = [
+        ("upload_file", "parse", upload),
+        ("update_plot", "full", full_plot),
+        ("update_plot", "redraw", redraw_plot),
+        ("update_plot", "line_patch", patch_plot),
+        ("check_violations", "drag", drag_check),
+        ("update_window_table", "drag", window_table),
+        ("auto_fill_empty_regions", "seeded", lambda: app.auto_fill_empty_regions(app.ignore_progress, 1, lines, dataset_key, 2)),
+        ("modify_and_update_lines", "add_line", add_line),
+        ("export", "csv", lambda: export(format="csv")),
+        ("export", "rt_segments", lambda: export(format="csv", rt_segments=segments)),
+        ("export", "csv_gz", lambda: export(format="csv.gz")),
+        ("export", "isolation_list", lambda: export(format="csv", content="isolation_list")),
+        ("run_parameter_sweep", "grid_6", sweep),
+        ("save_project", "save", save_project),
+        # Last: it leaves only the project's dataset in the registry
+        ("upload_file", "project", open_project),
+    ]
+    results = []
+    for callback, scenario, func in cases:
+        seconds, peak = measure(func, repeat)
+        results.append({
+            "callback": callback,
+            "scenario": scenario,
+            "rows": n_rows,
+            "boundaries": len(lines),
+            "seconds": seconds,
+            "peak_bytes": peak,
+        })
+        print(f"{callback:<26} {scenario:<11} {n_rows:>9} rows  {seconds * 1000:10.1f} ms  "
+              f"{peak / 2 ** 20:9.1f} MiB")
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="comma-separated row counts (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed calls per case, best is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write results as JSON")
+    args = parser.parse_args(argv)
+
+    app = load_app()
+    results = []
+    for n_rows in (int(size) for size in args.sizes.split(",")):
+        results.extend(benchmark_size(app, n_rows, args.repeat, seed=args.seed))
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
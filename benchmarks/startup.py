@@ -0,0 +1,94 @@
+"""Time cold starts: package imports and the app's time to first request.
+
+Every case runs in a fresh interpreter, timed from the first line of the
+child script (interpreter start-up itself is left out), so nothing is
+cached in sys.modules. The JSON matches benchmarks.run, so runs compare
+with benchmarks.compare:
+
+    python -m benchmarks.startup -o startup.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+# Not imported from benchmarks.run: that loads Dash, and on Linux a child reports the
+# peak RSS of the process that started it if that is higher than its own
+REPO_ROOT = Path(__file__).resolve().parent.parent
+APP_PATH = REPO_ROOT / "IsoPS_code_v1.16.py"
+
+CHILD_TEMPLATE = """
+import json, time
+start = time.perf_counter()
+{body}
+seconds = time.perf_counter() - start
+from isops.metrics import peak_rss_bytes
+print(json.dumps({{"seconds": seconds, "peak_bytes": peak_rss_bytes() or 0}}))
+"""
+
+LOAD_APP_MODULE = f"""
+import importlib.util
+spec = importlib.util.spec_from_file_location("isops_app", {str(APP_PATH)!r})
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+"""
+
+FIRST_REQUEST = """
+from wsgi import create_app
+client = create_app().test_client()
+for path in ("/", "/_dash-layout", "/_dash-dependencies"):
+    assert client.get(path).status_code == 200, path
+"""
+
+CASES = [
+    ("import", "isops", "import isops"),
+    ("import", "isops.engine", "import isops.engine"),
+    ("import", "isops.cli", "import isops.cli"),
+    ("import", "app_module", LOAD_APP_MODULE),
+    ("startup", "first_request", FIRST_REQUEST),
+]
+
+
+def run_child(body, state_dir):
+    env = dict(os.environ, ISOPS_STATE_DIR=state_dir)
+    completed = subprocess.run([sys.executable, "-c", CHILD_TEMPLATE.format(body=body)], cwd=REPO_ROOT, env=env,
+                               capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per case, best is kept")
+    parser.add_argument("-o", "--output", help="write results as JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="isops-startup-") as state_dir:
+        for callback, scenario, body in CASES:
+            runs = [run_child(body, state_dir) for _ in range(args.repeat)]
+            seconds = min(run["seconds"] for run in runs)
+            peak = max(run["peak_bytes"] for run in runs)
+            results.append({"callback": callback, "scenario": scenario, "rows": 0, "boundaries": 0,
+                            "seconds": seconds, "peak_bytes": peak})
+            print(f"{callback:<10} {scenario:<15} {seconds * 1000:10.1f} ms  {peak / 2 ** 20:9.1f} MiB RSS")
+
+    from benchmarks.run import git_revision
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
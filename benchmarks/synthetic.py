@@ -0,0 +1,63 @@
+"""Synthetic precursor tables in the win_df_1.csv schema."""
+import numpy as np
+import pandas as pd
+
+# Heavy labels: +8.0142 Da on C-terminal K, +10.0083 Da on C-terminal R
+HEAVY_SHIFTS = np.array([8.014199, 10.008269])
+CHARGES = np.array([2, 3, 4])
+CHARGE_WEIGHTS = np.array([0.65, 0.3, 0.05])
+PROTON = 1.007276
+GRADIENT_MINUTES = 60.0
+MZ_RANGE = (350.0, 1250.0)  # Typical DIA precursor range
+
+
+def _light_precursors(rng, n):
+    """m/z and charge of n light precursors, redrawing those outside MZ_RANGE."""
+    mz = np.empty(0)
+    charge = np.empty(0, dtype=int)
+    while len(mz) < n:
+        draw = max(n - len(mz), 16) * 2
+        mass = rng.lognormal(np.log(1500), 0.3, draw)
+        new_charge = rng.choice(CHARGES, draw, p=CHARGE_WEIGHTS)
+        new_mz = mass / new_charge + PROTON
+        keep = (new_mz >= MZ_RANGE[0]) & (new_mz <= MZ_RANGE[1])
+        mz = np.concatenate([mz, new_mz[keep]])
+        charge = np.concatenate([charge, new_charge[keep]])
+    return mz[:n], charge[:n]
+
+
+def generate_precursors(n_rows, seed=0, pair_fraction=0.9):
+    """A precursor table with about n_rows rows, most of them light/heavy pairs.
+
+    Neutral masses follow a log-normal around 1.5 kDa and charges 2-4,
+    kept within the usual 350-1250 m/z precursor range. Retention
+    times cluster in the middle of a 60 minute gradient. Pair partners
+    share name, charge and RT.
+    """
+    rng = np.random.default_rng(seed)
+    n_pairs = int(n_rows * pair_fraction) // 2
+    n_single = n_rows - 2 * n_pairs
+    n_peptides = n_pairs + n_single
+
+    light_mz, charge = _light_precursors(rng, n_peptides)
+    rt = np.clip(rng.beta(2.2, 2.2, n_peptides) * GRADIENT_MINUTES, 0.5, GRADIENT_MINUTES).round(2)
+    names = np.char.add("PEP", np.arange(n_peptides).astype(str))
+
+    heavy_mz = light_mz[:n_pairs] + rng.choice(HEAVY_SHIFTS, n_pairs) / charge[:n_pairs]
+    pair_idx = np.arange(n_pairs)
+
+    df = pd.DataFrame({
+        "Name": np.concatenate([names[:n_pairs], names[:n_pairs], names[n_pairs:]]),
+        "MZ": np.concatenate([light_mz[:n_pairs], heavy_mz, light_mz[n_pairs:]]).round(4),
+        "Types": np.repeat(["Light", "Heavy", "Light"], [n_pairs, n_pairs, n_single]),
+        "Charge": np.concatenate([charge[:n_pairs], charge[:n_pairs], charge[n_pairs:]]),
+        "RT": np.concatenate([rt[:n_pairs], rt[:n_pairs], rt[n_pairs:]]),
+        "order": np.concatenate([2 * pair_idx, 2 * pair_idx + 1, 2 * n_pairs + np.arange(n_single)]),
+    }).sort_values("order", kind="stable").drop(columns="order").reset_index(drop=True)
+
+    df["MZp1"] = df["MZ"] + 1 / df["Charge"]
+    df["MZp2"] = df["MZ"] + (1 / df["Charge"]) * 2
+    df["has_pair"] = df.groupby("Name")["MZ"].transform("size") == 2
+    df["pair_number"] = ("pair_" + (df.index // 2 + 1).astype(str)).where(df["has_pair"])
+    df["Win_start"] = np.round(df["MZ"] - 0.5, 1)
+    return df
@@ -0,0 +1,52 @@
+"""Headless building blocks of the IsoPS window designer.
+
+Names are imported from their submodules on first use, so importing the
+package (or one submodule) does not load all the others.
+"""
+import importlib
+
+_EXPORTS = {
+    "BackgroundLibrary": "isops.background",
+    "add_interference": "isops.background",
+    "build_library": "isops.background",
+    "EXPORT_COLUMNS": "isops.engine",
+    "assign_windows": "isops.engine",
+    "auto_fill_lines": "isops.engine",
+    "build_mz_index": "isops.engine",
+    "build_window_table": "isops.engine",
+    "design_windows": "isops.engine",
+    "export_columns": "isops.engine",
+    "read_precursors": "isops.engine",
+    "round_half": "isops.engine",
+    "seed_lines": "isops.engine",
+    "IsotopeEnvelope": "isops.envelope",
+    "WindowAssignment": "isops.export",
+    "write_export": "isops.export",
+    "Project": "isops.project",
+    "read_project": "isops.project",
+    "write_project": "isops.project",
+    "MzPyramid": "isops.pyramid",
+    "SegmentIndex": "isops.segments",
+    "build_segmented_window_table": "isops.segments",
+    "solve_boundaries": "isops.solver",
+    "parameter_grid": "isops.sweep",
+    "run_sweep": "isops.sweep",
+    "EnvelopeIndex": "isops.violations",
+    "ViolationTracker": "isops.violations",
+    "WindowStats": "isops.window_stats",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value  # Later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,5 @@
+import sys
+
+from isops.cli import main
+
+sys.exit(main())
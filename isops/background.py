@@ -0,0 +1,128 @@
+"""Co-isolation interference from a background precursor library.
+
+A background library holds the m/z and RT of every precursor expected in
+the sample (millions, typically a spectral library or a prior DDA run),
+not just the uploaded targets. It is stored as a directory of .npy
+columns sorted by (0.5 Th m/z bin, RT) and opened memory-mapped, so
+loading takes the same time whatever its size and worker processes share
+the pages through the OS cache.
+
+Rounded windows start and end on the 0.5 Th grid and therefore cover
+whole bins, and within a bin the entries are in RT order. The entries a
+window co-isolates within an RT tolerance of a target are then one pair
+of binary searches per bin over a single sorted key, bin * span + RT, with
+span wide enough that bins never overlap.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+BIN_WIDTH = 0.5  # Th, the export rounding grid
+META_FILENAME = "library.json"
+FORMAT_VERSION = 1
+DEFAULT_RT_TOLERANCE = 1.0  # Minutes either side of a target's RT
+QUERY_CHUNK_PAIRS = 1 << 22  # (query, bin) pairs searched at a time, bounds the temporary arrays
+
+
+class BackgroundLibrary:
+    """Memory-mapped background precursors, sorted for window x RT range counts."""
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, META_FILENAME)) as handle:
+            meta = json.load(handle)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{directory}: unsupported background library version {meta.get('version')!r}")
+        self.directory = directory
+        self.rt_key_span = meta["rt_key_span"]
+        self.rt_offset = meta["rt_offset"]
+        self.mz = np.load(os.path.join(directory, "mz.npy"), mmap_mode="r")
+        self.rt = np.load(os.path.join(directory, "rt.npy"), mmap_mode="r")
+        self.key = np.load(os.path.join(directory, "key.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.key)
+
+    def _keys(self, bins, rt):
+        # Library RTs sit in [0, span / 4) after the offset; clipping a query RT to
+        # [-span / 4, span / 2] keeps its key inside its own bin without changing the count
+        span = self.rt_key_span
+        return bins * span + np.clip(rt - self.rt_offset, -span / 4, span / 2)
+
+    def count(self, round_start, round_end, rt, rt_tolerance=DEFAULT_RT_TOLERANCE):
+        """Entries with round_start <= m/z < round_end and |RT - rt| <= rt_tolerance, per query.
+
+        All arguments are arrays of the same length (or scalars); bounds are
+        on the 0.5 Th grid, as in the Round_start/Round_end export columns.
+        Queries with a missing bound or RT count as NaN.
+        """
+        round_start, round_end, rt = np.broadcast_arrays(*(np.asarray(values, dtype=float)
+                                                           for values in (round_start, round_end, rt)))
+        counts = np.full(round_start.shape, np.nan)
+        valid = ~(np.isnan(round_start) | np.isnan(round_end) | np.isnan(rt))
+        if not valid.any():
+            return counts
+        first_bin = np.round(round_start[valid] / BIN_WIDTH).astype(np.int64)
+        n_bins = np.maximum(np.round(round_end[valid] / BIN_WIDTH).astype(np.int64) - first_bin, 0)
+        query_rt = rt[valid]
+
+        # One (query, bin) pair per bin a window covers, searched a chunk of queries at a time
+        totals = np.zeros(len(first_bin))
+        pair_ends = np.cumsum(n_bins)
+        start = 0
+        while start < len(first_bin):
+            stop = max(int(np.searchsorted(pair_ends, pair_ends[start] - n_bins[start] + QUERY_CHUNK_PAIRS,
+                                           side="right")), start + 1)
+            chunk_bins = n_bins[start:stop]
+            query = np.repeat(np.arange(start, stop), chunk_bins)
+            offsets = np.arange(len(query)) - np.repeat(np.cumsum(chunk_bins) - chunk_bins, chunk_bins)
+            bins = first_bin[query] + offsets
+            hits = (np.searchsorted(self.key, self._keys(bins, query_rt[query] + rt_tolerance), side="right")
+                    - np.searchsorted(self.key, self._keys(bins, query_rt[query] - rt_tolerance), side="left"))
+            totals[start:stop] = np.bincount(query - start, weights=hits, minlength=stop - start)
+            start = stop
+        counts[valid] = totals
+        return counts
+
+
+def build_library(df, directory):
+    """Sort the MZ and RT columns of df into a background library in directory; returns it opened."""
+    mz = pd.to_numeric(df["MZ"], errors="coerce").to_numpy(dtype=np.float64)
+    rt = pd.to_numeric(df["RT"], errors="coerce").to_numpy(dtype=np.float64)
+    keep = ~(np.isnan(mz) | np.isnan(rt))
+    mz, rt = mz[keep], rt[keep]
+
+    # Keys must keep bins apart for any query RT, tolerance included: pad the RT span generously
+    rt_offset = float(rt.min()) if len(rt) else 0.0
+    rt_key_span = float(2 ** np.ceil(np.log2(max(float(rt.max()) - rt_offset, 1.0) * 4))) if len(rt) else 1.0
+    bins = np.floor(mz / BIN_WIDTH).astype(np.int64)
+    key = bins * rt_key_span + (rt - rt_offset)
+    order = np.argsort(key, kind="stable")
+
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, "mz.npy"), mz[order])
+    np.save(os.path.join(directory, "rt.npy"), rt[order].astype(np.float32))
+    np.save(os.path.join(directory, "key.npy"), key[order])
+    with open(os.path.join(directory, META_FILENAME), "w") as handle:
+        json.dump({"version": FORMAT_VERSION, "entries": int(len(key)), "bin_width": BIN_WIDTH,
+                   "rt_offset": rt_offset, "rt_key_span": rt_key_span}, handle)
+    return BackgroundLibrary(directory)
+
+
+def add_interference(window_df, library, rt_tolerance=DEFAULT_RT_TOLERANCE):
+    """Append an Interference column to an export table: background entries co-isolated with each target."""
+    # Empty windows carry "NA" placeholders, which count as missing
+    round_start, round_end, rt = (pd.to_numeric(window_df[col], errors="coerce")
+                                  for col in ("Round_start", "Round_end", "RT"))
+    counts = library.count(round_start, round_end, rt, rt_tolerance)
+    missing = np.isnan(counts)
+    if missing.any():
+        # Same "NA" placeholder as the other columns of an empty window
+        column = np.empty(len(counts), dtype=object)
+        column[~missing] = counts[~missing].astype(np.int64)
+        column[missing] = "NA"
+        window_df["Interference"] = column
+    else:
+        window_df["Interference"] = counts.astype(np.int64)
+    return window_df
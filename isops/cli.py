@@ -0,0 +1,225 @@
+"""Batch window design from the command line.
+
+Runs seeding, auto-fill and export for every precursor CSV in a directory,
+one file per worker process:
+
+    python -m isops batch precursors/ -o windows/ --max-width 10 --workers 8
+
+converts raw Skyline exports into the prepared precursor format:
+
+    python -m isops prepare Skyline_export.csv -o win_df_1.csv
+
+scores a grid of design parameters on one precursor table, as JSON:
+
+    python -m isops sweep win_df_1.csv --max-width 5,7.5,10 --margin-start 0.25,0.5 -o sweep.json
+
+and sorts a background precursor table into a memory-mapped library for
+interference counts (batch --background, or ISOPS_BACKGROUND_LIBRARY for the app):
+
+    python -m isops library background.csv -o background_lib
+"""
+import argparse
+import functools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from isops.background import DEFAULT_RT_TOLERANCE, BackgroundLibrary, add_interference, build_library
+from isops.engine import DEFAULT_MAX_WIDTH, SEED_COLUMN, auto_fill_lines, build_mz_index, read_precursors, seed_lines
+from isops.envelope import C13_SPACING, DEFAULT_ISOTOPES, NOMINAL_SPACING, IsotopeEnvelope
+from isops.export import FORMATS, WindowAssignment, export_filename, write_export
+from isops.skyline import DEFAULT_CHUNKSIZE, read_skyline_export
+from isops.solver import DEFAULT_MARGIN_END, DEFAULT_MARGIN_START, ROUNDING_STEP, check_grid, solve_boundaries
+from isops.sweep import METHODS, parameter_grid, parse_values, run_sweep
+
+
+def design_file(path, output_dir, max_width=DEFAULT_MAX_WIDTH, seed_column=SEED_COLUMN, auto_fill=True,
+                optimize=False, margin_start=DEFAULT_MARGIN_START, margin_end=DEFAULT_MARGIN_END, background=None,
+                rt_tolerance=DEFAULT_RT_TOLERANCE, isotopes=DEFAULT_ISOTOPES, isotope_spacing=NOMINAL_SPACING,
+                fmt="csv", isolation_list=False):
+    """Design windows for one precursor CSV and write them next to the others in output_dir.
+
+    background is a library directory; its interference counts are added as a column.
+    Target envelopes span isotopes peaks, isotope_spacing / Charge apart. The
+    window table is written in fmt (a key of isops.export.FORMATS) a chunk
+    at a time; isolation_list also writes the per-window isolation list.
+    """
+    df = read_precursors(path)
+    envelope = IsotopeEnvelope.from_frame(df, isotopes, isotope_spacing)
+    if optimize:
+        seeds = []
+        lines = solve_boundaries(df, max_width, margin_start, margin_end, envelope=envelope).lines
+    else:
+        seeds = seed_lines(df, seed_column)
+        if not seeds:
+            raise ValueError(f"no boundary seeds found in column {seed_column!r}")
+        lines = sorted(float(line) for line in seeds)
+        if auto_fill:
+            lines, _ = auto_fill_lines(lines, build_mz_index(df, envelope), max_width)
+    assignment = WindowAssignment.from_lines(df, lines, envelope)
+    transform = None
+    if background:
+        # Memory-mapped, so every worker opening it costs next to nothing
+        transform = functools.partial(add_interference, library=BackgroundLibrary(background),
+                                      rt_tolerance=rt_tolerance)
+    output_path = Path(output_dir) / f"{Path(path).stem}_{export_filename('windows', fmt)}"
+    write_export(output_path, assignment.export(fmt, transform=transform))
+    result = {
+        "input": str(path),
+        "output": str(output_path),
+        "targets": len(df),
+        "seeds": len(seeds),
+        "boundaries": len(lines),
+    }
+    if isolation_list:
+        list_path = Path(output_dir) / f"{Path(path).stem}_{export_filename('isolation_list', fmt)}"
+        write_export(list_path, assignment.export(fmt, "isolation_list"))
+        result["isolation_list"] = str(list_path)
+    return result
+
+
+def run_batch(input_dir, output_dir, pattern="*.csv", workers=None, **options):
+    """Design every file matching pattern in parallel; returns (results, failures)."""
+    paths = sorted(Path(input_dir).glob(pattern))
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    results, failures = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(design_file, path, output_dir, **options): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as exc:
+                failures.append((str(futures[future]), exc))
+    results.sort(key=lambda result: result["input"])
+    return results, failures
+
+
+def add_envelope_arguments(parser):
+    parser.add_argument("--isotopes", type=int, default=DEFAULT_ISOTOPES,
+                        help="isotope peaks per target envelope, from MZ up; with a non-default count or "
+                             "spacing the export's last column is the margin to the highest one (default: %(default)s)")
+    parser.add_argument("--isotope-spacing", type=float, default=NOMINAL_SPACING,
+                        help=f"isotope spacing times charge, e.g. {C13_SPACING} for 13C (default: %(default)s)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="isops", description="IsoPS window designer tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch = subparsers.add_parser("batch", help="design windows for a directory of precursor CSVs")
+    batch.add_argument("input_dir", help="directory holding precursor CSVs (win_df_1.csv format)")
+    batch.add_argument("-o", "--output-dir", required=True, help="where to write the isolation window CSVs")
+    batch.add_argument("--pattern", default="*.csv", help="glob for input files (default: %(default)s)")
+    batch.add_argument("--seed-column", default=SEED_COLUMN,
+                       help="column holding the initial boundaries (default: %(default)s)")
+    batch.add_argument("--max-width", type=float, default=DEFAULT_MAX_WIDTH,
+                       help="auto-fill splits empty regions wider than this (default: %(default)s)")
+    batch.add_argument("--no-auto-fill", dest="auto_fill", action="store_false",
+                       help="export the seed boundaries as they are")
+    batch.add_argument("--optimize", action="store_true",
+                       help="place boundaries with the solver instead of seeding and auto-filling")
+    batch.add_argument("--margin-start", type=float, default=DEFAULT_MARGIN_START,
+                       help="solver: minimum MZ - Round_start (default: %(default)s)")
+    batch.add_argument("--margin-end", type=float, default=DEFAULT_MARGIN_END,
+                       help="solver: minimum Round_end - highest isotope (default: %(default)s)")
+    batch.add_argument("--background", help="background library directory (from 'isops library'): add an "
+                                            "Interference column counting co-isolated background precursors")
+    batch.add_argument("--rt-tolerance", type=float, default=DEFAULT_RT_TOLERANCE,
+                       help="background precursors count within this many minutes of a target (default: %(default)s)")
+    add_envelope_arguments(batch)
+    batch.add_argument("--format", dest="fmt", choices=list(FORMATS), default="csv",
+                       help="output file format; parquet needs pyarrow (default: %(default)s)")
+    batch.add_argument("--isolation-list", action="store_true",
+                       help="also write a per-window isolation list (centre, width, target count) for the instrument")
+    batch.add_argument("-j", "--workers", type=int, default=os.cpu_count(),
+                       help="worker processes (default: number of CPUs)")
+
+    prepare = subparsers.add_parser("prepare", help="convert a raw Skyline export into a precursor CSV")
+    prepare.add_argument("export", help="Skyline export (Replicate, Peptide, Precursor, ...)")
+    prepare.add_argument("-o", "--output", required=True, help="precursor CSV to write")
+    prepare.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                         help="export rows parsed at a time (default: %(default)s)")
+
+    library = subparsers.add_parser("library", help="build a background precursor library for interference counts")
+    library.add_argument("input", help="background precursors with MZ and RT columns (CSV, .csv.gz or Parquet)")
+    library.add_argument("-o", "--output-dir", required=True, help="library directory to write")
+
+    sweep = subparsers.add_parser("sweep", help="score a grid of design parameters on one precursor CSV")
+    sweep.add_argument("input", help="precursor CSV (win_df_1.csv format), .csv.gz or Parquet")
+    sweep.add_argument("-o", "--output", help="JSON file to write (default: standard output)")
+    sweep.add_argument("--max-width", type=parse_values, default=[DEFAULT_MAX_WIDTH],
+                       help="comma-separated max window widths (default: %(default)s)")
+    sweep.add_argument("--step", type=parse_values, default=[ROUNDING_STEP],
+                       help="comma-separated solver grid steps (default: %(default)s)")
+    sweep.add_argument("--margin-start", type=parse_values, default=[DEFAULT_MARGIN_START],
+                       help="comma-separated solver margins MZ - Round_start (default: %(default)s)")
+    sweep.add_argument("--margin-end", type=parse_values, default=[DEFAULT_MARGIN_END],
+                       help="comma-separated solver margins Round_end - highest isotope (default: %(default)s)")
+    sweep.add_argument("--methods", type=lambda text: parse_values(text, str.strip), default=list(METHODS),
+                       help="comma-separated schemes to build: optimize (solver), auto_fill (seeds plus "
+                            "auto-fill) (default: %(default)s)")
+    sweep.add_argument("--seed-column", default=SEED_COLUMN,
+                       help="auto_fill: column holding the initial boundaries (default: %(default)s)")
+    sweep.add_argument("--sort", default="windows",
+                       help="result column to sort by, prefix with - for descending (default: %(default)s)")
+    add_envelope_arguments(sweep)
+    sweep.add_argument("-j", "--workers", type=int, default=os.cpu_count(),
+                       help="worker processes (default: number of CPUs)")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.command == "batch":
+        if args.optimize:
+            try:
+                check_grid(args.max_width, ROUNDING_STEP)
+            except ValueError as exc:
+                parser.error(str(exc))
+        results, failures = run_batch(
+            args.input_dir, args.output_dir, pattern=args.pattern, workers=args.workers,
+            max_width=args.max_width, seed_column=args.seed_column, auto_fill=args.auto_fill,
+            optimize=args.optimize, margin_start=args.margin_start, margin_end=args.margin_end,
+            background=args.background, rt_tolerance=args.rt_tolerance,
+            isotopes=args.isotopes, isotope_spacing=args.isotope_spacing,
+            fmt=args.fmt, isolation_list=args.isolation_list,
+        )
+        for result in results:
+            print(f"{result['input']}: {result['targets']} targets, "
+                  f"{result['boundaries']} boundaries -> {result['output']}")
+        for path, exc in failures:
+            print(f"{path}: failed: {exc}", file=sys.stderr)
+        return 1 if failures else 0
+
+    if args.command == "prepare":
+        df = read_skyline_export(args.export, chunksize=args.chunksize)
+        df.to_csv(args.output, index=False)
+        print(f"{args.export}: {len(df)} precursors -> {args.output}")
+
+    if args.command == "library":
+        library = build_library(read_precursors(args.input), args.output_dir)
+        print(f"{args.input}: {len(library)} background precursors -> {args.output_dir}")
+
+    if args.command == "sweep":
+        try:
+            grid = parameter_grid(args.max_width, args.step, args.margin_start, args.margin_end, args.methods)
+        except ValueError as exc:
+            parser.error(str(exc))
+        df = read_precursors(args.input)
+        results = run_sweep(df, grid, workers=args.workers, seeds=seed_lines(df, args.seed_column),
+                            envelope=IsotopeEnvelope.from_frame(df, args.isotopes, args.isotope_spacing))
+        column = args.sort.lstrip("-")
+        # Missing values (auto-fill has no step or margins) sort last either way
+        results.sort(key=lambda row: (row.get(column) is None, row.get(column) or 0),
+                     reverse=args.sort.startswith("-"))
+        text = json.dumps({"input": args.input, "results": results}, indent=2)
+        if args.output:
+            Path(args.output).write_text(text + "\n")
+            print(f"{args.input}: {len(results)} schemes -> {args.output}")
+        else:
+            print(text)
+    return 0
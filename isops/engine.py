@@ -0,0 +1,303 @@
+"""Window-design logic shared by the Dash app and the batch command line.
+
+Nothing in here depends on Dash or plotly, so it can run headless.
+"""
+import gzip
+import importlib.util
+import io
+import logging
+
+import numpy as np
+import pandas as pd
+
+from isops.envelope import DEFAULT_ISOTOPES, NOMINAL_SPACING, IsotopeEnvelope, isotope_column
+from isops.project import PROJECT_MAGIC, read_project
+from isops.skyline import detect_separator, header_columns, is_skyline_export, read_header, read_skyline_export
+
+# Debug output is silent unless logging is configured at DEBUG level
+logger = logging.getLogger(__name__)
+
+# m/z stays float64: float32 loses the 4th decimal above ~1000 m/z. So does RT,
+# which is exported as uploaded and only saves 4 bytes a row as float32.
+PRECURSOR_DTYPES = {
+    "MZ": "float64", "MZp1": "float64", "MZp2": "float64", "RT": "float64",
+    "Name": "category", "Types": "category",
+}
+PARQUET_MAGIC = b"PAR1"
+# Parquet support, checked without importing pyarrow; pandas loads it when a Parquet file is read
+HAVE_PYARROW = importlib.util.find_spec("pyarrow") is not None
+GZIP_MAGIC = b"\x1f\x8b"
+
+SEED_COLUMN = "Win_start"
+DEFAULT_MAX_WIDTH = 10
+
+LABEL_COLUMNS = ["Name", "Types", "Charge", "RT"]
+
+
+def export_columns(isotopes=DEFAULT_ISOTOPES):
+    """Export columns for envelopes of the given isotope count; MZp1 and MZp2 are always there."""
+    mz_columns = [isotope_column(k) for k in range(max(isotopes, DEFAULT_ISOTOPES))]
+    return (["Start", "End"] + LABEL_COLUMNS + mz_columns
+            + ["Round_start", "Round_end", "MZ-Round_start", f"Round_end-{mz_columns[-1]}"])
+
+
+EXPORT_COLUMNS = export_columns()
+
+
+def round_half(values):
+    """Round m/z values to the nearest 0.5 Th (ties to even, like the built-in round)."""
+    return np.round(np.asarray(values, dtype=float) * 2) / 2
+
+
+def as_parsed(values):
+    """Widen float32 values via their shortest decimal repr, so 6.53 stays 6.53 rather than 6.53000020980835."""
+    values = np.asarray(values)
+    if values.dtype == np.float32:
+        return values.astype(str).astype(np.float64)
+    return values
+
+
+def assign_windows(mz, sorted_lines):
+    """Index of the window [line i, line i+1) holding each m/z, or -1 if outside all windows."""
+    mz = np.asarray(mz, dtype=float)
+    window = np.searchsorted(sorted_lines, mz, side="right") - 1
+    outside = (window >= len(sorted_lines) - 1) | np.isnan(mz)
+    window[outside] = -1
+    return window
+
+
+def build_window_table(df, lines, envelope=None):
+    """One row per (window, target) pair, plus an NA row for every empty window.
+
+    Targets are assigned to windows in a single searchsorted pass and the
+    distance columns are computed on whole arrays. The result matches the
+    row order and CSV formatting of the isolation_windows.csv export.
+    envelope is the IsotopeEnvelope of df, computed with the defaults if omitted.
+    """
+    sorted_lines = np.sort(np.asarray(lines, dtype=float))
+    if len(sorted_lines) < 2:
+        return pd.DataFrame(columns=export_columns(envelope.isotopes) if envelope is not None else EXPORT_COLUMNS)
+    window = assign_windows(df["MZ"], sorted_lines)
+    return window_table(df, window, sorted_lines[:-1], sorted_lines[1:], envelope=envelope)
+
+
+def window_table(df, window, starts, ends, window_columns=None, envelope=None, na_value="NA"):
+    """Export table for targets already assigned to windows.
+
+    window holds each row's index into starts/ends (-1 for none).
+    window_columns maps extra column names to one value per window; they
+    are placed before the export columns. envelope is the IsotopeEnvelope
+    of df (computed with the defaults if omitted); the m/z columns the table
+    has are exported as they are, and it only supplies isotopes past MZp2.
+    With other than the default isotope count or spacing, the last column
+    is the margin to the envelope's highest isotope rather than to MZp2.
+    Empty windows and missing columns are filled with na_value.
+    """
+    if envelope is None:
+        envelope = IsotopeEnvelope.from_frame(df)
+    columns = export_columns(envelope.isotopes)
+    window_columns = window_columns or {}
+    rows = np.flatnonzero(window >= 0)
+    rows = rows[np.argsort(window[rows], kind="stable")]
+    target_windows = window[rows]
+
+    # Anti-join: windows without targets still get one NA row
+    empty_windows = np.setdiff1d(np.arange(len(starts)), target_windows)
+    all_windows = np.concatenate([target_windows, empty_windows])
+    order = np.argsort(all_windows, kind="stable")
+    all_windows = all_windows[order]
+    is_target = order < len(rows)
+    target_pos = np.flatnonzero(is_target)
+    na_pos = np.flatnonzero(~is_target)
+
+    round_start = round_half(starts)[all_windows]
+    round_end = round_half(ends)[all_windows]
+
+    def with_na(target_values):
+        if not len(na_pos):
+            return target_values
+        column = np.empty(len(all_windows), dtype=object)
+        column[target_pos] = target_values
+        column[na_pos] = na_value
+        return column
+
+    # Rows used to come from iterrows, which upcasts every value to the
+    # frame's common dtype when all columns are numeric
+    row_dtype = df.iloc[:0].to_numpy().dtype
+
+    result = {name: np.asarray(values)[all_windows] for name, values in window_columns.items()}
+    result["Start"] = starts[all_windows]
+    result["End"] = ends[all_windows]
+    for col in LABEL_COLUMNS:
+        if col in df.columns:
+            values = df[col].to_numpy()[rows]
+            if row_dtype != object:
+                values = values.astype(row_dtype)
+            result[col] = with_na(values)
+        else:
+            result[col] = np.full(len(all_windows), na_value, dtype=object)
+    # The table's own m/z columns are written as uploaded; the envelope only
+    # adds the isotopes past MZp2 when more are configured
+    mz_columns = columns[len(LABEL_COLUMNS) + 2:-4]
+    last_values = None
+    for k, col in enumerate(mz_columns):
+        if col in df.columns:
+            last_values = df[col].to_numpy(dtype=float)[rows]
+        elif DEFAULT_ISOTOPES <= k < envelope.isotopes:
+            last_values = envelope.values[k, rows]
+        else:
+            last_values = None
+            result[col] = np.full(len(all_windows), na_value, dtype=object)
+            continue
+        result[col] = with_na(last_values.astype(row_dtype) if row_dtype != object else last_values)
+    result["Round_start"] = round_start
+    result["Round_end"] = round_end
+
+    result["MZ-Round_start"] = with_na(envelope.mz[rows] - round_start[target_pos])
+    if envelope.isotopes != DEFAULT_ISOTOPES or envelope.spacing != NOMINAL_SPACING:
+        # Other settings move the highest isotope; the margin is the one the
+        # violation check and the solver use, not the uploaded MZp2's
+        last_values = envelope.top[rows]
+    if last_values is not None:
+        result[columns[-1]] = with_na(round_end[target_pos] - last_values)
+    else:
+        result[columns[-1]] = np.full(len(all_windows), na_value, dtype=object)
+
+    return pd.DataFrame(result, columns=list(window_columns) + columns)
+
+
+def count_between(sorted_values, starts, ends):
+    """Number of sorted values strictly inside each (start, end) interval."""
+    return (np.searchsorted(sorted_values, ends, side="left")
+            - np.searchsorted(sorted_values, starts, side="right"))
+
+
+def fill_empty_regions(sorted_lines, mz_index, max_width):
+    """Equally spaced lines splitting every too-wide region holding fewer than two m/z values.
+
+    All gaps are handled at once; the new lines come back in region order.
+    """
+    starts = sorted_lines[:-1]
+    ends = sorted_lines[1:]
+    widths = ends - starts
+    wide = widths > max_width
+    target_counts = count_between(mz_index, starts[wide], ends[wide])
+    logger.debug("Found %d wide regions among %d, using %d m/z values",
+                 wide.sum(), len(widths), len(mz_index))
+
+    # If no or very few targets, divide the region
+    fill = np.flatnonzero(wide)[target_counts < 2]
+    if not len(fill):
+        return np.empty(0)
+    # Calculate divisions - ensure at least one new line per region
+    num_divisions = np.maximum(2, (widths[fill] / max_width).astype(int) + 1)
+    steps = widths[fill] / num_divisions
+    if logger.isEnabledFor(logging.DEBUG):
+        for start, end, count in zip(starts[fill], ends[fill], num_divisions - 1):
+            logger.debug("Region %s to %s: adding %d dividing lines", start, end, count)
+
+    # Lines at j * step from the region start, j = 1 .. num_divisions - 1
+    per_region = num_divisions - 1
+    region = np.repeat(np.arange(len(fill)), per_region)
+    offsets = np.arange(len(region)) - np.repeat(np.cumsum(per_region) - per_region, per_region) + 1
+    return starts[fill][region] + offsets * steps[region]
+
+
+def apply_precursor_dtypes(df):
+    """Coerce the known columns to PRECURSOR_DTYPES in place and return the frame."""
+    for col, dtype in PRECURSOR_DTYPES.items():
+        if col not in df.columns:
+            continue
+        if dtype == "category":
+            df[col] = df[col].astype("category")
+        else:
+            # float32 input (Parquet, or projects saved when RT was float32) keeps its printed values
+            df[col] = as_parsed(pd.to_numeric(df[col], errors="coerce")).astype(dtype)
+    return df
+
+
+def _read_open_precursors(handle):
+    head = handle.read(len(PROJECT_MAGIC))
+    handle.seek(0)
+    if head == PROJECT_MAGIC:
+        # A saved project: the table is already typed; the design state and indexes are not needed here.
+        # An in-memory upload is wrapped in place rather than copied out.
+        return read_project(handle.getbuffer() if hasattr(handle, "getbuffer") else handle.read()).df
+    if head[:2] == GZIP_MAGIC:
+        # Decompress as we parse rather than inflating the whole file up front
+        with gzip.GzipFile(fileobj=handle) as inflated:
+            return _read_open_precursors(inflated)
+    if head[:4] == PARQUET_MAGIC:
+        if not HAVE_PYARROW:
+            raise ValueError("Reading Parquet files requires pyarrow (pip install pyarrow)")
+        return pd.read_parquet(handle)
+    header = read_header(handle)
+    if is_skyline_export(header):
+        return read_skyline_export(handle)
+    # Labels go straight into categoricals instead of one Python string per row.
+    # The C parser stays: pyarrow's float parsing is off by an ulp on some m/z.
+    categorical = {col: "category" for col in header_columns(header) if PRECURSOR_DTYPES.get(col) == "category"}
+    return pd.read_csv(handle, sep=detect_separator(header), dtype=categorical)
+
+
+def read_precursors(source):
+    """Read a precursor table with typed m/z, RT and label columns.
+
+    source can be a path, raw bytes or a binary file-like object holding CSV (or tab-separated),
+    gzip-compressed CSV, Parquet or an IsoPS project file; the format is sniffed from the first bytes.
+    Raw Skyline exports are recognised by their header and converted on the fly.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        # BytesIO shares the buffer of an immutable bytes object, so no copy here
+        source = io.BytesIO(source)
+    if isinstance(source, str) or hasattr(source, "__fspath__"):
+        with open(source, "rb") as handle:
+            df = _read_open_precursors(handle)
+    else:
+        df = _read_open_precursors(source)
+    return apply_precursor_dtypes(df)
+
+
+def seed_lines(df, column=SEED_COLUMN):
+    """Initial boundaries taken from a seed column such as Win_start, in order of appearance."""
+    if column not in df.columns:
+        return []
+    return df[column].unique().tolist()
+
+
+def build_mz_index(df, envelope=None):
+    """Sorted unique m/z values over every isotope of every target, for binary-search region counts.
+
+    envelope is the IsotopeEnvelope of df, computed with the defaults if omitted.
+    """
+    if envelope is None:
+        envelope = IsotopeEnvelope.from_frame(df)
+    values = envelope.values.ravel()
+    return np.unique(values[~np.isnan(values)])
+
+
+def auto_fill_lines(lines, mz_index, max_width=DEFAULT_MAX_WIDTH):
+    """Sorted boundaries after auto-fill, together with the added lines in region order."""
+    if max_width is None or max_width <= 0:
+        max_width = DEFAULT_MAX_WIDTH
+    sorted_lines = np.sort(np.asarray(lines, dtype=float))
+    new_lines = fill_empty_regions(sorted_lines, mz_index, max_width)
+    if not len(new_lines):
+        logger.debug("No new lines were added")
+        return sorted_lines.tolist(), new_lines
+
+    updated_lines = np.sort(np.concatenate([sorted_lines, new_lines])).tolist()
+    logger.debug("Added %d new lines, total lines: %d", len(new_lines), len(updated_lines))
+    return updated_lines, new_lines
+
+
+def design_windows(df, lines=None, max_width=DEFAULT_MAX_WIDTH, auto_fill=True, envelope=None):
+    """Seed, auto-fill and export in one go; returns (boundaries, window table)."""
+    if lines is None:
+        lines = seed_lines(df)
+    if envelope is None:
+        envelope = IsotopeEnvelope.from_frame(df)
+    lines = sorted(float(line) for line in lines)
+    if auto_fill and lines:
+        lines, _ = auto_fill_lines(lines, build_mz_index(df, envelope), max_width)
+    return lines, build_window_table(df, lines, envelope)
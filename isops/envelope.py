@@ -0,0 +1,95 @@
+"""Isotope envelopes of the targets, computed from MZ and Charge.
+
+Isotope k of a target sits at MZ + k * spacing / Charge, with a spacing of
+1 (as the MZp1 and MZp2 columns of prepared tables) or the 13C - 12C mass
+difference, 1.00336, for the exact peak positions. Any number of isotopes
+can be computed in one vectorized pass over the table.
+
+The result is one C-contiguous float64 array of shape (isotopes, targets)
+rather than a DataFrame column per isotope: isotope k of every target is
+the contiguous row k, and the whole array flattens without a copy into the
+isotope-by-isotope order that plotting and the m/z indexes use. Plotting,
+auto-fill, violations and the solver all read this one array; the export
+keeps the table's own m/z columns and only takes the isotopes past MZp2,
+and, with other than the default settings, its margin to the highest one.
+"""
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+NOMINAL_SPACING = 1.0  # Th at charge 1, as MZp1 = MZ + 1/Charge in prepared tables
+C13_SPACING = 1.00336  # Th at charge 1, 13C - 12C mass difference
+DEFAULT_ISOTOPES = 3  # Monoisotopic plus two: MZ, MZp1, MZp2
+
+
+def isotope_column(k):
+    """Column name of isotope k: MZ, MZp1, MZp2, ..."""
+    return "MZ" if k == 0 else f"MZp{k}"
+
+
+class IsotopeEnvelope:
+    """m/z of every isotope of every target, as one (isotopes, targets) array."""
+
+    def __init__(self, values, spacing=NOMINAL_SPACING):
+        self.values = np.ascontiguousarray(values, dtype=np.float64)
+        self.spacing = spacing
+
+    @classmethod
+    def from_frame(cls, df, isotopes=DEFAULT_ISOTOPES, spacing=NOMINAL_SPACING):
+        """Envelope of every row of a precursor table.
+
+        Rows without a positive Charge keep the table's own MZp columns, if
+        it has them; without a Charge column the stored columns are all
+        there is to go on, so they set the isotope count.
+        """
+        mz = pd.to_numeric(df["MZ"], errors="coerce").to_numpy(dtype=np.float64)
+        if "Charge" not in df.columns:
+            stored = [mz]
+            while isotope_column(len(stored)) in df.columns:
+                stored.append(pd.to_numeric(df[isotope_column(len(stored))], errors="coerce").to_numpy(dtype=float))
+            return cls(np.vstack(stored), spacing)
+
+        charge = pd.to_numeric(df["Charge"], errors="coerce").to_numpy(dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = np.where(charge > 0, spacing / charge, np.nan)
+        values = np.empty((max(int(isotopes), 1), len(mz)))
+        values[0] = mz
+        np.multiply.outer(np.arange(1, len(values), dtype=np.float64), step, out=values[1:])
+        values[1:] += mz
+
+        missing = np.isnan(step)
+        if missing.any():
+            for k in range(1, len(values)):
+                if isotope_column(k) in df.columns:
+                    stored = pd.to_numeric(df[isotope_column(k)], errors="coerce").to_numpy(dtype=float)
+                    values[k, missing] = stored[missing]
+        return cls(values, spacing)
+
+    def __len__(self):
+        return self.values.shape[1]
+
+    @property
+    def isotopes(self):
+        return self.values.shape[0]
+
+    @property
+    def columns(self):
+        return [isotope_column(k) for k in range(self.isotopes)]
+
+    def __getitem__(self, column):
+        """Isotope row by column name, e.g. envelope["MZp2"]."""
+        return self.values[self.columns.index(column)]
+
+    @property
+    def mz(self):
+        return self.values[0]
+
+    @cached_property
+    def top(self):
+        """Highest known isotope of each target; MZ where the others are missing."""
+        return np.fmax.reduce(self.values, axis=0)
+
+    def take(self, rows=None):
+        """Envelope of a subset of the targets (all of them for None)."""
+        return self if rows is None else IsotopeEnvelope(self.values[:, rows], self.spacing)
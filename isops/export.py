@@ -0,0 +1,354 @@
+"""Streaming export of a window design, in chunks of whole windows.
+
+The window table has one row per (window, target) pair and, as text, is
+many times the size of the precursor table. Instead of building it in one
+go, WindowAssignment assigns the targets to windows once, orders them by
+window, and builds the table a run of whole windows at a time: at most
+about chunk_rows rows are held and formatted at once, however large the
+export. Written one after the other, the CSV chunks are byte for byte the
+table build_window_table gives.
+
+The same assignment gives the instrument isolation list, one row per
+window with the rounded centre and width an instrument method takes.
+
+encode turns a sequence of frames into the bytes of one CSV, gzip-compressed
+CSV or Parquet file (Parquet needs pyarrow), yielded as each frame is
+done; write_export writes them to a path or file object, and the app
+streams them as the HTTP response.
+"""
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from isops.engine import HAVE_PYARROW, LABEL_COLUMNS, assign_windows, export_columns, round_half, window_table
+from isops.envelope import IsotopeEnvelope
+from isops.segments import SEGMENT_COLUMNS, segment_windows
+
+CHUNK_ROWS = 100_000  # Window table rows built and written at a time
+FORMATS = {"csv": ".csv", "csv.gz": ".csv.gz", "parquet": ".parquet"}  # Export format -> file extension
+MEDIA_TYPES = {"csv": "text/csv", "csv.gz": "application/gzip", "parquet": "application/vnd.apache.parquet"}
+CONTENTS = {"windows": "isolation_windows", "isolation_list": "isolation_list"}  # Export content -> file stem
+ISOLATION_LIST_COLUMNS = ["Window", "Start", "End", "Round_start", "Round_end", "Center", "Width", "Targets"]
+
+
+class WindowAssignment:
+    """Targets of a precursor table assigned to windows, exported chunk by chunk.
+
+    window holds each row's index into starts/ends (-1 for none), as for
+    window_table; window_columns are extra per-window columns such as the
+    RT range of scheduled windows.
+    """
+
+    def __init__(self, df, window, starts, ends, window_columns=None, envelope=None):
+        self.df = df
+        self.starts = np.asarray(starts, dtype=float)
+        self.ends = np.asarray(ends, dtype=float)
+        self.window_columns = {name: np.asarray(values) for name, values in (window_columns or {}).items()}
+        self.envelope = envelope if envelope is not None else IsotopeEnvelope.from_frame(df)
+        self.window = np.asarray(window)
+        # Assigned rows in window order, and how many targets each window holds
+        rows = np.flatnonzero(self.window >= 0)
+        self.rows = rows[np.argsort(self.window[rows], kind="stable")]
+        self.counts = np.bincount(self.window[self.rows], minlength=len(self.starts))
+
+    @classmethod
+    def from_lines(cls, df, lines, envelope=None):
+        """Windows between consecutive boundaries, as build_window_table."""
+        sorted_lines = np.sort(np.asarray(lines, dtype=float))
+        if len(sorted_lines) < 2:
+            return cls(df, np.full(len(df), -1), [], [], envelope=envelope)
+        return cls(df, assign_windows(df["MZ"], sorted_lines), sorted_lines[:-1], sorted_lines[1:],
+                   envelope=envelope)
+
+    @classmethod
+    def from_segments(cls, df, segments, envelope=None):
+        """Windows of RT-scheduled boundaries, as build_segmented_window_table."""
+        assignment = segment_windows(df, segments)
+        if assignment is None:
+            return cls(df, np.full(len(df), -1), [], [], dict.fromkeys(SEGMENT_COLUMNS, []), envelope)
+        return cls(df, *assignment, envelope=envelope)
+
+    @property
+    def columns(self):
+        return list(self.window_columns) + export_columns(self.envelope.isotopes)
+
+    def column_types(self):
+        """Column name -> "string", "int64" or "float64", for a typed (Parquet) export."""
+        types = dict.fromkeys(self.columns, "float64")
+        for col in LABEL_COLUMNS:
+            if col in self.df.columns:
+                types[col] = _column_kind(self.df[col].dtype)
+        types["Interference"] = "int64"  # Added by add_interference when a background library is set
+        return types
+
+    def chunks(self, chunk_rows=CHUNK_ROWS, na_value="NA"):
+        """The window table as consecutive frames of whole windows, each of about chunk_rows rows.
+
+        A window with more targets than chunk_rows is still one frame.
+        """
+        if not len(self.starts):
+            yield pd.DataFrame(columns=self.columns)
+            return
+        table_ends = np.cumsum(np.maximum(self.counts, 1))
+        if table_ends[-1] <= chunk_rows:
+            # One chunk: no need to copy out the rows it holds
+            yield window_table(self.df, self.window, self.starts, self.ends, self.window_columns, self.envelope,
+                               na_value)
+            return
+        row_ends = np.cumsum(self.counts)
+        first = 0
+        while first < len(self.starts):
+            table_start = table_ends[first - 1] if first else 0
+            last = max(int(np.searchsorted(table_ends, table_start + chunk_rows, side="right")), first + 1)
+            rows = self.rows[(row_ends[first - 1] if first else 0):row_ends[last - 1]]
+            yield window_table(
+                self.df.iloc[rows], self.window[rows] - first, self.starts[first:last], self.ends[first:last],
+                {name: values[first:last] for name, values in self.window_columns.items()},
+                self.envelope.take(rows), na_value)
+            first = last
+
+    def isolation_list(self):
+        """One row per window: its boundaries, the rounded isolation centre and width, and its target count."""
+        round_start = round_half(self.starts)
+        round_end = round_half(self.ends)
+        result = dict(self.window_columns)
+        result.update({
+            "Window": np.arange(1, len(self.starts) + 1),
+            "Start": self.starts,
+            "End": self.ends,
+            "Round_start": round_start,
+            "Round_end": round_end,
+            "Center": (round_start + round_end) / 2,
+            "Width": round_end - round_start,
+            "Targets": self.counts,
+        })
+        return pd.DataFrame(result, columns=list(self.window_columns) + ISOLATION_LIST_COLUMNS)
+
+    def export(self, fmt="csv", content="windows", transform=None, chunk_rows=CHUNK_ROWS):
+        """Bytes of the window table (or the isolation list) as one file in fmt, yielded chunk by chunk.
+
+        transform is applied to every window table frame before it is
+        encoded, e.g. to add interference counts.
+        """
+        if content == "isolation_list":
+            return encode([self.isolation_list()], fmt)
+        if content != "windows":
+            raise ValueError(f"unknown export content {content!r}, expected one of {', '.join(CONTENTS)}")
+        # Parquet has real nulls for empty windows; CSV has the "NA" placeholders of the export
+        frames = self.chunks(chunk_rows, na_value=None if fmt == "parquet" else "NA")
+        if transform is not None:
+            frames = map(transform, frames)
+        return encode(frames, fmt, self.column_types())
+
+
+def export_filename(content, fmt):
+    """File name of an export, e.g. isolation_windows.csv.gz."""
+    return CONTENTS[content] + FORMATS[fmt]
+
+
+def _column_kind(dtype):
+    if isinstance(dtype, pd.CategoricalDtype):
+        dtype = dtype.categories.dtype
+    return {"i": "int64", "u": "int64", "f": "float64"}.get(dtype.kind, "string")
+
+
+def _large(text):
+    """A pyarrow large_string scalar, to combine with the large_string field arrays."""
+    import pyarrow as pa
+    return pa.scalar(text, pa.large_string())
+
+
+def _float_fields(values):
+    """repr of each float as to_csv writes it ("" for NaN), formatted by pyarrow in bulk."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    values = np.asarray(values, dtype=float)
+    fields = pc.cast(pa.array(values), pa.large_string())
+    # pyarrow gives the same shortest digits as repr, but writes 15.0 as "15"
+    # and switches to exponents at other magnitudes; those few go through repr
+    magnitude = np.abs(values)
+    finite = np.isfinite(values)
+    whole = finite & (values == np.trunc(values)) & (magnitude < 1e16)
+    fields = pc.if_else(whole, pc.binary_join_element_wise(fields, _large(".0"), _large("")), fields)
+    odd = (pc.match_substring(fields, "e").to_numpy(zero_copy_only=False) | ~finite
+           | (magnitude >= 1e16) | ((magnitude < 1e-4) & (values != 0)))
+    if odd.any():
+        reprs = ["" if np.isnan(value) else repr(value) for value in values[odd].tolist()]
+        fields = pc.replace_with_mask(fields, odd, pa.array(reprs, type=pa.large_string()))
+    return fields
+
+
+def _text_fields(text):
+    """Strings (None for missing) as to_csv writes them: quoted when they hold a comma, quote or line break."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    text = pa.array(text, type=pa.large_string(), from_pandas=True)
+    quote = pc.match_substring_regex(text, r'[,"\r\n]')
+    quoted = pc.binary_join_element_wise(_large('"'), pc.replace_substring(text, '"', '""'), _large('"'),
+                                         _large(""))
+    return pc.fill_null(pc.if_else(quote, quoted, text), _large(""))
+
+
+def _csv_fields(column):
+    """pyarrow strings of a column's CSV fields, or None for value types left to to_csv."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    values = column.to_numpy()
+    if values.dtype == np.float64:
+        return _float_fields(values)
+    if values.dtype.kind in "iu":
+        return pc.cast(pa.array(values), pa.large_string())
+    if isinstance(column.dtype, pd.StringDtype):
+        return _text_fields(column)
+    if values.dtype != object:
+        return None
+    # The object columns window_table makes of numbers with "NA" for empty windows
+    is_text = np.fromiter((isinstance(value, str) for value in values), dtype=bool, count=len(values))
+    is_number = ~is_text & pd.notna(values)
+    numbers = values[is_number]
+    kind = pd.api.types.infer_dtype(numbers, skipna=False) if len(numbers) else "empty"
+    if kind == "floating":
+        number_fields = _float_fields(numbers.astype(float))
+    elif kind == "integer":
+        number_fields = pc.cast(pa.array(numbers.astype(np.int64)), pa.large_string())
+    elif kind == "empty":
+        number_fields = pa.array([], type=pa.large_string())
+    else:
+        return None
+    fields = pc.replace_with_mask(pa.nulls(len(values), pa.large_string()), is_number, number_fields)
+    if is_text.any():
+        fields = pc.replace_with_mask(fields, is_text, _text_fields(values[is_text]))
+    return pc.fill_null(fields, _large(""))
+
+
+def _csv_text(frame, header):
+    """Bytes of frame.to_csv(index=False, header=header), with the fields formatted a column at a time.
+
+    to_csv formats and quotes every value on its own, which made it most of
+    the export time. Without pyarrow, or for value types not handled here,
+    it is still used.
+    """
+    if HAVE_PYARROW and len(frame):
+        import pyarrow.compute as pc
+
+        columns = [_csv_fields(frame.iloc[:, i]) for i in range(frame.shape[1])]
+        if all(fields is not None for fields in columns):
+            rows = pc.binary_join_element_wise(*columns, _large(","))
+            # Each row followed by its line end, as to_csv writes them
+            rows = pc.binary_join_element_wise(rows, _large(""), _large(os.linesep))
+            # The rows are back to back in the string data; slice them out in one go
+            offsets = np.frombuffer(rows.buffers()[1], dtype=np.int64)[rows.offset:rows.offset + len(rows) + 1]
+            body = rows.buffers()[2].to_pybytes()[offsets[0]:offsets[-1]]
+            return (frame.iloc[:0].to_csv(index=False).encode() if header else b"") + body
+    return frame.to_csv(index=False, header=header).encode()
+
+
+def _csv_bytes(frames):
+    for position, frame in enumerate(frames):
+        yield _csv_text(frame, header=position == 0)
+
+
+def _gzip_bytes(frames):
+    compressor = zlib.compressobj(wbits=31)  # 31: gzip header and trailer
+    for data in _csv_bytes(frames):
+        compressed = compressor.compress(data)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class _ByteSink:
+    """Write-only file object that hands what was written since the last take() to the caller."""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def _parquet_bytes(frames, types):
+    # Only imported once a Parquet file is written
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    def column(values, kind):
+        if kind == "string":
+            return pa.array(values, type=pa.string(), from_pandas=True)
+        # The "NA" placeholders of empty windows (and missing numbers) become nulls
+        return pa.array(pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=float),
+                        type=getattr(pa, kind)(), from_pandas=True)
+
+    sink = _ByteSink()
+    writer = None
+    for frame in frames:
+        if writer is None:
+            # The first frame fixes the schema; every later one is written as one more row group
+            kinds = {col: types.get(col) or _column_kind(frame[col].dtype) for col in frame.columns}
+            schema = pa.schema([(col, getattr(pa, kind)()) for col, kind in kinds.items()])
+            writer = pq.ParquetWriter(sink, schema)
+        table = pa.Table.from_arrays([column(frame[col].to_numpy(), kinds[col]) for col in schema.names],
+                                     schema=schema)
+        writer.write_table(table)
+        yield sink.take()
+    if writer is not None:
+        writer.close()
+    yield sink.take()
+
+
+def encode(frames, fmt="csv", types=None):
+    """Bytes of one file holding frames one after the other, yielded as each frame is encoded.
+
+    fmt is a key of FORMATS. For Parquet, types maps column names to
+    "string", "int64" or "float64" (see WindowAssignment.column_types);
+    other columns are typed after their dtype in the first frame.
+    """
+    if fmt == "csv":
+        return _csv_bytes(frames)
+    if fmt == "csv.gz":
+        return _gzip_bytes(frames)
+    if fmt == "parquet":
+        if not HAVE_PYARROW:
+            raise ValueError("Writing Parquet files requires pyarrow (pip install pyarrow)")
+        return _parquet_bytes(frames, types or {})
+    raise ValueError(f"unknown export format {fmt!r}, expected one of {', '.join(FORMATS)}")
+
+
+def write_export(target, chunks):
+    """Write the byte chunks of an export to a path or a binary file object; returns the bytes written."""
+    handle = open(target, "wb") if isinstance(target, str) or hasattr(target, "__fspath__") else target
+    written = 0
+    try:
+        for data in chunks:
+            handle.write(data)
+            written += len(data)
+    finally:
+        if handle is not target:
+            handle.close()
+    return written
@@ -0,0 +1,244 @@
+"""Per-callback instrumentation for the Dash app.
+
+Wrap a callback with CallbackMetrics.instrument (below its @callback
+decorator) to record, for every call:
+
+* wall time
+* request and response payload bytes
+* time spent fetching or building DataFrames
+* the triggering component ID
+
+Rolling quantiles over the most recent calls are served in the Prometheus
+text format from /metrics. Background jobs run in their own process, so
+callbacks wrapped with CallbackMetrics.job push their records to a shared
+queue (the job cache) that the server drains before rendering. If a profile directory is set, each callback
+also accumulates a cProfile that is dumped to <profile_dir>/<callback>.prof
+after every call.
+"""
+import contextlib
+import contextvars
+import cProfile
+import functools
+import os
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_WINDOW = 1024
+SPOOL_PREFIX = "isops-metrics"  # Queue of records pushed by background jobs
+QUANTILES = (0.5, 0.9, 0.99)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Per-call scratch space, so helpers deep in a callback can report into its record
+_current_call = contextvars.ContextVar("isops_current_call", default=None)
+# Set while a background job runs, whose records must leave the job process
+_in_job = contextvars.ContextVar("isops_in_job", default=False)
+
+
+@contextlib.contextmanager
+def dataframe_timer():
+    """Count the time spent in the block as DataFrame reconstruction for the running callback."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record = _current_call.get()
+        if record is not None:
+            record["dataframe_seconds"] += time.perf_counter() - start
+
+
+def peak_rss_bytes():
+    """High-water mark of this process's resident memory, or None where unsupported."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RollingSummary:
+    """Quantiles over the last `window` observations, plus all-time count and sum."""
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.recent = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.recent.append(value)
+        self.count += 1
+        self.total += value
+
+    def quantiles(self, quantiles=QUANTILES):
+        if not self.recent:
+            return {q: float("nan") for q in quantiles}
+        ordered = sorted(self.recent)
+        last = len(ordered) - 1
+        return {q: ordered[min(last, int(round(q * last)))] for q in quantiles}
+
+
+def _triggered_id():
+    try:
+        from dash import ctx
+        trigger = ctx.triggered_id
+    except Exception:
+        return "none"
+    return "none" if trigger is None else str(trigger)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class CallbackMetrics:
+    SUMMARIES = {
+        "duration_seconds": "Wall time of the callback",
+        "dataframe_seconds": "Time spent fetching or building DataFrames inside the callback",
+        "request_bytes": "Serialized callback request payload size",
+        "response_bytes": "Serialized callback response payload size",
+    }
+
+    def __init__(self, window=DEFAULT_WINDOW, profile_dir=None):
+        self.window = window
+        self.profile_dir = profile_dir
+        self._summaries = defaultdict(lambda: RollingSummary(self.window))
+        self._calls = defaultdict(int)
+        self._profiles = {}
+        self._lock = threading.Lock()
+        self._profile_lock = threading.Lock()
+        self.spool = None  # diskcache.Cache shared with background jobs, set by the app
+
+    def observe(self, metric, callback, value):
+        if self._spooling():
+            self.spool.push(("observe", metric, callback, value), prefix=SPOOL_PREFIX)
+            return
+        with self._lock:
+            self._summaries[metric, callback].observe(value)
+
+    def count_call(self, callback, trigger):
+        if self._spooling():
+            self.spool.push(("call", callback, trigger), prefix=SPOOL_PREFIX)
+            return
+        with self._lock:
+            self._calls[callback, trigger] += 1
+
+    def _spooling(self):
+        return self.spool is not None and _in_job.get()
+
+    def _drain_spool(self):
+        # Fold in what background jobs recorded since the last render
+        if self.spool is None:
+            return
+        while True:
+            _, record = self.spool.pull(prefix=SPOOL_PREFIX)
+            if record is None:
+                return
+            kind, *values = record
+            if kind == "observe":
+                self.observe(*values)
+            else:
+                self.count_call(*values)
+
+    def job(self, func):
+        """Mark func as run in a background job process: its records go through the spool."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = _in_job.set(True)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _in_job.reset(token)
+
+        return wrapper
+
+    def instrument(self, func):
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            record = {"dataframe_seconds": 0.0}
+            token = _current_call.set(record)
+            start = time.perf_counter()
+            try:
+                if self.profile_dir:
+                    return self._call_profiled(name, func, args, kwargs)
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                _current_call.reset(token)
+                self._finish_call(name, elapsed, record)
+
+        return wrapper
+
+    def _finish_call(self, name, elapsed, record):
+        self.observe("duration_seconds", name, elapsed)
+        self.observe("dataframe_seconds", name, record["dataframe_seconds"])
+        self.count_call(name, _triggered_id())
+
+        import flask
+        if flask.has_request_context():
+            self.observe("request_bytes", name, flask.request.content_length or 0)
+            # The response size is only known once Dash has serialized the output
+            flask.g.isops_callback = name
+
+    def _call_profiled(self, name, func, args, kwargs):
+        # cProfile cannot profile overlapping calls, so profiled callbacks run one at a time
+        with self._profile_lock:
+            profile = self._profiles.setdefault(name, cProfile.Profile())
+            profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                os.makedirs(self.profile_dir, exist_ok=True)
+                profile.dump_stats(os.path.join(self.profile_dir, f"{name}.prof"))
+
+    def _record_response(self, response):
+        import flask
+        name = flask.g.pop("isops_callback", None)
+        if name is not None and not response.direct_passthrough:
+            self.observe("response_bytes", name, response.calculate_content_length() or 0)
+        return response
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        self._drain_spool()
+        lines = []
+        with self._lock:
+            for metric, help_text in self.SUMMARIES.items():
+                full_name = f"isops_callback_{metric}"
+                lines.append(f"# HELP {full_name} {help_text} (quantiles over the last {self.window} calls)")
+                lines.append(f"# TYPE {full_name} summary")
+                for (summary_metric, callback), summary in sorted(self._summaries.items()):
+                    if summary_metric != metric:
+                        continue
+                    label = f'callback="{_escape(callback)}"'
+                    for q, value in summary.quantiles().items():
+                        lines.append(f'{full_name}{{{label},quantile="{q}"}} {value}')
+                    lines.append(f"{full_name}_sum{{{label}}} {summary.total}")
+                    lines.append(f"{full_name}_count{{{label}}} {summary.count}")
+
+            lines.append("# HELP isops_callback_calls_total Callback calls by triggering component")
+            lines.append("# TYPE isops_callback_calls_total counter")
+            for (callback, trigger), count in sorted(self._calls.items()):
+                lines.append(f'isops_callback_calls_total{{callback="{_escape(callback)}",'
+                             f'trigger="{_escape(trigger)}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def install(self, server, path="/metrics"):
+        """Serve the metrics from the Flask server behind the Dash app."""
+        import flask
+
+        server.after_request(self._record_response)
+
+        @server.route(path)
+        def metrics_endpoint():
+            return flask.Response(self.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+        return server
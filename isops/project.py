@@ -0,0 +1,205 @@
+"""Project files: a whole design session in one memory-mappable file.
+
+A project holds the typed precursor table, the design state (boundaries,
+RT segments, parameters) and cached indexes over the table, such as the
+sorted m/z values, so reopening one neither parses text nor sorts:
+
+    magic | header length (uint64) | JSON header | buffers
+
+The JSON header lists every column and array with its dtype, length and
+offset. The buffers follow as raw little-endian values, each aligned to 64
+bytes. Categorical and string columns are stored as integer codes into a
+table of their distinct strings, itself two buffers (UTF-8 bytes and
+offsets, the layout of an Arrow string array). Reading wraps the buffers
+with np.frombuffer over the file's memory map (or the uploaded bytes);
+with pyarrow the string tables become pandas arrays without a Python
+string per value. Opening costs about one copy of the table whatever its
+size, and cached arrays none at all.
+"""
+import io
+import json
+import mmap
+
+import numpy as np
+import pandas as pd
+
+PROJECT_MAGIC = b"ISOPSPRJ"
+FORMAT_VERSION = 2
+READABLE_VERSIONS = (1, 2)  # Version 1 kept categories and strings as JSON lists
+ALIGNMENT = 64  # Bytes; every buffer starts on a cache line
+_LENGTH = np.dtype("<u8")
+_HEADER_START = len(PROJECT_MAGIC) + _LENGTH.itemsize
+
+
+class Project:
+    """A precursor table with the saved design state and cached index arrays."""
+
+    def __init__(self, df, state=None, arrays=None):
+        self.df = df
+        self.state = state or {}  # JSON values: boundaries, RT segments, parameters
+        self.arrays = arrays or {}  # Name -> 1-D array, e.g. sorted m/z values
+
+
+def is_project(head):
+    """Whether a file's first bytes are a project header."""
+    return bytes(head[:len(PROJECT_MAGIC)]) == PROJECT_MAGIC
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _little_endian(values):
+    values = np.ascontiguousarray(values)
+    return values.astype(values.dtype.newbyteorder("<"), copy=False)
+
+
+def _is_strings(values):
+    return pd.api.types.infer_dtype(values, skipna=False) == "string"
+
+
+def _string_table(values):
+    """(UTF-8 bytes, int64 offsets) of distinct strings, as in an Arrow large_string array."""
+    # Iterating an Arrow-backed array value by value is slow; an object array is not
+    encoded = [value.encode() for value in np.asarray(values, dtype=object).tolist()]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(list(map(len, encoded)), out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _string_dtype_entry(dtype):
+    """JSON description of the dtype of a string column or categories."""
+    if isinstance(dtype, pd.StringDtype):
+        return {"storage": dtype.storage, "na": "NA" if dtype.na_value is pd.NA else "NaN"}
+    return "object"
+
+
+def _string_dtype(entry):
+    if entry == "object":
+        return np.dtype(object)
+    na_value = pd.NA if entry["na"] == "NA" else np.nan
+    try:
+        return pd.StringDtype(entry["storage"], na_value=na_value)
+    except ImportError:  # Saved with pyarrow, opened without it
+        return pd.StringDtype("python", na_value=na_value)
+
+
+def _strings(data, offsets, dtype, codes=None):
+    """Array of dtype holding a string table, or its entries at codes (-1 for missing)."""
+    if isinstance(dtype, pd.StringDtype) and dtype.storage == "pyarrow":
+        # Arrow wraps the buffers as they are and takes in C
+        import pyarrow as pa
+        table = pa.LargeStringArray.from_buffers(len(offsets) - 1, pa.py_buffer(offsets), pa.py_buffer(data))
+        if codes is not None:
+            table = table.take(pa.array(codes, mask=codes < 0))
+        return table.cast(pa.string()).to_pandas(types_mapper={pa.string(): dtype}.get).array
+    text = bytes(data)
+    table = np.array([text[start:end].decode() for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+                     + [np.nan], dtype=object)
+    # Code -1 picks the NaN appended at the end
+    return pd.array(table[codes] if codes is not None else table[:-1], dtype=dtype)
+
+
+def _column_entry(name, series):
+    """(header entry, buffers) for one column of the table: its values, then any string table."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories
+        entry = {"name": name, "kind": "category", "ordered": bool(series.cat.ordered)}
+        if not _is_strings(categories):
+            entry["categories"] = categories.tolist()
+            return entry, [series.cat.codes.to_numpy()]
+        entry["strings"] = _string_dtype_entry(categories.dtype)
+        return entry, [series.cat.codes.to_numpy(), *_string_table(categories)]
+    values = series.to_numpy()
+    if values.dtype.kind in "biuf":
+        return {"name": name, "kind": "numeric"}, [values]
+    # Strings: codes into the distinct values, read back with the column's dtype
+    codes, uniques = pd.factorize(series)
+    if _is_strings(uniques):
+        return ({"name": name, "kind": "string", "strings": _string_dtype_entry(series.dtype)},
+                [codes, *_string_table(uniques)])
+    # Other objects keep a JSON list of their distinct values and are read back as an object column
+    return {"name": name, "kind": "object", "categories": list(uniques)}, [codes]
+
+
+def write_project(target, project):
+    """Write a Project to a path or a binary file object."""
+    entries, buffers = [], []
+    offset = 0
+
+    def place(entry, values):
+        nonlocal offset
+        values = _little_endian(values)
+        entry.update(dtype=values.dtype.str, length=len(values), offset=offset)
+        buffers.append((offset, values))
+        offset = _aligned(offset + values.nbytes)
+        return entry
+
+    for name, series in project.df.items():
+        entry, values = _column_entry(str(name), series)
+        if len(values) > 1:
+            entry["table"] = [place({}, table) for table in values[1:]]
+        entries.append(place(entry, values[0]))
+    arrays = {name: place({}, np.asarray(values)) for name, values in project.arrays.items()}
+    # Values JSON has no type for (dates in object columns, say) are saved as their text
+    header = json.dumps({"version": FORMAT_VERSION, "rows": len(project.df), "columns": entries,
+                         "arrays": arrays, "state": project.state}, default=str).encode()
+    data_start = _aligned(_HEADER_START + len(header))
+
+    handle = open(target, "wb") if isinstance(target, str) or hasattr(target, "__fspath__") else target
+    try:
+        handle.write(PROJECT_MAGIC)
+        handle.write(np.array(len(header), dtype=_LENGTH).tobytes())
+        handle.write(header)
+        position = _HEADER_START + len(header)
+        for start, values in buffers:
+            handle.write(bytes(data_start + start - position))
+            handle.write(memoryview(values).cast("B"))
+            position = data_start + start + values.nbytes
+    finally:
+        if handle is not target:
+            handle.close()
+
+
+def project_bytes(project):
+    """A Project serialised into bytes, e.g. for a download."""
+    buffer = io.BytesIO()
+    write_project(buffer, project)
+    return buffer.getvalue()
+
+
+def read_project(source):
+    """Open a project from a path (memory-mapped) or a bytes-like object (wrapped in place)."""
+    if isinstance(source, str) or hasattr(source, "__fspath__"):
+        with open(source, "rb") as handle:
+            source = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(source)
+    if not is_project(view):
+        raise ValueError("not an IsoPS project file")
+    header_length = int(np.frombuffer(view, dtype=_LENGTH, count=1, offset=len(PROJECT_MAGIC))[0])
+    header = json.loads(bytes(view[_HEADER_START:_HEADER_START + header_length]))
+    if header.get("version") not in READABLE_VERSIONS:
+        raise ValueError(f"unsupported IsoPS project version {header.get('version')!r}")
+    data_start = _aligned(_HEADER_START + header_length)
+
+    def buffer(entry):
+        return np.frombuffer(view, dtype=entry["dtype"], count=entry["length"], offset=data_start + entry["offset"])
+
+    columns = {}
+    for entry in header["columns"]:
+        values = buffer(entry)
+        table = [buffer(part) for part in entry.get("table", [])]
+        if entry["kind"] == "category":
+            categories = _strings(*table, _string_dtype(entry["strings"])) if table else entry["categories"]
+            # The codes were written from a valid categorical, so they are not checked again
+            values = pd.Categorical.from_codes(
+                values, dtype=pd.CategoricalDtype(categories, ordered=entry["ordered"]), validate=False)
+        elif entry["kind"] == "string":
+            values = _strings(*table, _string_dtype(entry["strings"]), codes=values)
+        elif entry["kind"] == "object":
+            # Code -1 marks a missing value, which picks the NaN appended at the end
+            values = np.array(entry["categories"] + [np.nan], dtype=object)[values]
+        columns[entry["name"]] = values
+    df = pd.DataFrame(columns, index=pd.RangeIndex(header["rows"]))
+    arrays = {name: buffer(entry) for name, entry in header["arrays"].items()}
+    return Project(df, header["state"], arrays)
@@ -0,0 +1,88 @@
+"""Multi-resolution m/z index for drawing large datasets.
+
+All plotted m/z values are sorted once, so the points inside any m/z
+range are one pair of binary searches away. On top of that sit histogram
+levels with doubling bin widths. Each level is the pairwise sum of the one
+below, so the whole pyramid costs about twice the finest level. The finest
+level is capped at MAX_BINS: a wider m/z range (say one stray value at
+1e7) coarsens its bins instead of allocating one per 0.01 Th.
+
+Both queries cost O(log n) plus the size of what they return, which is
+capped by the caller: fetching the points for a zoomed view, or the
+density for the overview strip.
+"""
+import numpy as np
+
+DEFAULT_BASE_WIDTH = 0.01  # Th, finest histogram bin
+MAX_BINS = 2 ** 20  # Finest level cap, 8 MB of counts; 300-2000 Th at 0.01 Th needs 170k
+
+
+class MzPyramid:
+    """Sorted m/z values plus a histogram pyramid over them."""
+
+    def __init__(self, mz, base_width=DEFAULT_BASE_WIDTH):
+        mz = np.asarray(mz, dtype=float)
+        positions = np.flatnonzero(np.isfinite(mz))
+        order = np.argsort(mz[positions], kind="stable")
+        self._build(mz[positions][order], positions[order], base_width)
+
+    @classmethod
+    def from_sorted(cls, mz, positions, base_width=DEFAULT_BASE_WIDTH):
+        """Pyramid over values already sorted (with their input positions), e.g. from a saved project."""
+        pyramid = cls.__new__(cls)
+        pyramid._build(np.asarray(mz, dtype=float), np.asarray(positions), base_width)
+        return pyramid
+
+    def _build(self, mz, positions, base_width):
+        self.mz = mz
+        self.positions = positions  # Index of each sorted value in the input array
+        if len(self.mz):
+            while (self.mz[-1] - self.mz[0]) // base_width + 2 > MAX_BINS:
+                base_width *= 2
+        self.base_width = base_width
+        self.origin = np.floor(self.mz[0] / base_width) * base_width if len(self.mz) else 0.0
+
+        finest = np.bincount(((self.mz - self.origin) // base_width).astype(np.int64)) \
+            if len(self.mz) else np.zeros(1, dtype=np.int64)
+        self.levels = [finest]
+        while len(self.levels[-1]) > 1:
+            counts = self.levels[-1]
+            if len(counts) % 2:
+                counts = np.append(counts, 0)
+            self.levels.append(counts[0::2] + counts[1::2])
+
+    def __len__(self):
+        return len(self.mz)
+
+    @property
+    def nbytes(self):
+        return self.mz.nbytes + self.positions.nbytes + sum(level.nbytes for level in self.levels)
+
+    def count(self, mz_lo, mz_hi):
+        """Number of values in [mz_lo, mz_hi]."""
+        return int(np.searchsorted(self.mz, mz_hi, side="right") - np.searchsorted(self.mz, mz_lo, side="left"))
+
+    def viewport(self, mz_lo, mz_hi, limit):
+        """Input positions of the values in [mz_lo, mz_hi], thinned to at most limit.
+
+        Thinning keeps every 2**k-th value in m/z order, so a crowded view
+        shows an even sample at the coarsest detail that fits. Returns the
+        positions and the stride used.
+        """
+        first = np.searchsorted(self.mz, mz_lo, side="left")
+        last = np.searchsorted(self.mz, mz_hi, side="right")
+        stride = 1
+        while (last - first) > limit * stride:
+            stride *= 2
+        return self.positions[first:last:stride], stride
+
+    def histogram(self, mz_lo, mz_hi, max_bins):
+        """(bin centers, counts, bin width) over [mz_lo, mz_hi] at the finest level with at most max_bins bins."""
+        span = max(mz_hi - mz_lo, self.base_width)
+        level = int(np.clip(np.ceil(np.log2(span / (self.base_width * max_bins))), 0, len(self.levels) - 1))
+        width = self.base_width * 2 ** level
+        counts = self.levels[level]
+        first = int(np.clip((mz_lo - self.origin) // width, 0, len(counts)))
+        last = int(np.clip((mz_hi - self.origin) // width + 1, first, len(counts)))
+        centers = self.origin + (np.arange(first, last) + 0.5) * width
+        return centers, counts[first:last], width
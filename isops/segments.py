@@ -0,0 +1,138 @@
+"""RT-scheduled isolation windows.
+
+A scheduled method splits the gradient into RT segments, each with its own
+boundary set. Segments are stored as a sorted, contiguous list of
+{"rt_start", "rt_end", "lines"} dicts (the shape kept in the app's
+rt-segments store). The first and last segment are open-ended, so every
+precursor with an RT lands in exactly one segment.
+
+Precursors are assigned on an RT x m/z grid: one searchsorted over the
+segment edges for RT, then one searchsorted per segment over its sorted
+boundaries for m/z, so the cost grows with the number of segments, not
+the number of segments times targets.
+"""
+import numpy as np
+import pandas as pd
+
+from isops.engine import EXPORT_COLUMNS, assign_windows, export_columns, window_table
+
+SEGMENT_COLUMNS = ["RT_start", "RT_end"]
+
+
+def whole_gradient(lines, rt_start, rt_end):
+    """A single segment holding lines over the full RT range."""
+    return [{"rt_start": float(rt_start), "rt_end": float(rt_end), "lines": list(lines)}]
+
+
+def split_segment(segments, rt):
+    """Copy of segments with the one containing rt split in two at rt.
+
+    Both halves start with the boundaries of the segment they came from.
+    Splitting at an existing edge, or outside every segment, changes nothing.
+    """
+    index = SegmentIndex(segments)
+    position = int(index.segment_of([rt])[0])
+    segment = segments[position]
+    if not segment["rt_start"] < rt < segment["rt_end"]:
+        return [dict(s) for s in segments]
+    before = dict(segment, rt_end=float(rt), lines=list(segment["lines"]))
+    after = dict(segment, rt_start=float(rt), lines=list(segment["lines"]))
+    return segments[:position] + [before, after] + segments[position + 1:]
+
+
+def merge_segment(segments, position):
+    """Copy of segments with segment `position` widened over its predecessor (or successor).
+
+    The merged segment keeps the boundaries of segment `position`.
+    """
+    if len(segments) < 2:
+        return [dict(s) for s in segments]
+    neighbour = position - 1 if position > 0 else 1
+    first, last = sorted((neighbour, position))
+    merged = dict(segments[position], rt_start=segments[first]["rt_start"], rt_end=segments[last]["rt_end"])
+    return segments[:first] + [merged] + segments[last + 1:]
+
+
+def with_segment_lines(segments, position, lines):
+    """Copy of segments with the boundaries of segment `position` replaced."""
+    segments = [dict(s) for s in segments]
+    segments[position]["lines"] = list(lines)
+    return segments
+
+
+def segment_mask(df, segments, position):
+    """Boolean mask of the targets whose RT falls in segment `position`."""
+    return SegmentIndex(segments).segment_of(df["RT"]) == position
+
+
+def segment_label(segment):
+    return f"RT {segment['rt_start']:.2f}-{segment['rt_end']:.2f} ({len(segment['lines'])} lines)"
+
+
+class SegmentIndex:
+    """RT x m/z lookup over a list of segments."""
+
+    def __init__(self, segments):
+        self.segments = segments
+        # Inner edges only: the first and last segments extend to +-inf
+        self.edges = np.array([s["rt_start"] for s in segments[1:]], dtype=float)
+        self.lines = [np.sort(np.asarray(s["lines"], dtype=float)) for s in segments]
+
+    def segment_of(self, rt):
+        """Segment position for each RT, or -1 for missing RT."""
+        rt = np.asarray(rt, dtype=float)
+        segment = np.searchsorted(self.edges, rt, side="right")
+        segment[np.isnan(rt)] = -1
+        return segment
+
+    def assign(self, rt, mz):
+        """(segment, window) arrays; window is -1 outside the segment's boundaries."""
+        mz = np.asarray(mz, dtype=float)
+        segment = self.segment_of(rt)
+        window = np.full(len(mz), -1, dtype=np.intp)
+        order = np.argsort(segment, kind="stable")
+        starts = np.searchsorted(segment[order], np.arange(len(self.segments) + 1))
+        for position, lines in enumerate(self.lines):
+            rows = order[starts[position]:starts[position + 1]]
+            if len(rows) and len(lines) >= 2:
+                window[rows] = assign_windows(mz[rows], lines)
+        return segment, window
+
+
+def segment_windows(df, segments):
+    """Targets of df assigned to the windows of every segment, numbered segment by segment.
+
+    Returns (window, starts, ends, window_columns) as window_table takes
+    them, or None if no segment has a window or df has no RT.
+    """
+    index = SegmentIndex(segments)
+    if "RT" not in df.columns or not any(len(lines) >= 2 for lines in index.lines):
+        return None
+
+    segment, window = index.assign(df["RT"], df["MZ"])
+    counts = np.array([max(len(lines) - 1, 0) for lines in index.lines])
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    assigned = window >= 0
+    window[assigned] += offsets[segment[assigned]]
+
+    starts = np.concatenate([lines[:-1] for lines in index.lines])
+    ends = np.concatenate([lines[1:] for lines in index.lines])
+    window_columns = {
+        "RT_start": np.repeat([s["rt_start"] for s in segments], counts),
+        "RT_end": np.repeat([s["rt_end"] for s in segments], counts),
+    }
+    return window, starts, ends, window_columns
+
+
+def build_segmented_window_table(df, segments, envelope=None):
+    """The window export for RT-scheduled boundaries, prefixed with RT_start and RT_end.
+
+    Windows are numbered segment by segment, so one window_table pass gives
+    rows ordered by segment, then m/z. Targets without an RT belong to no
+    segment and are left out. envelope is passed on to window_table.
+    """
+    assignment = segment_windows(df, segments)
+    if assignment is None:
+        columns = export_columns(envelope.isotopes) if envelope is not None else EXPORT_COLUMNS
+        return pd.DataFrame(columns=SEGMENT_COLUMNS + columns)
+    return window_table(df, *assignment, envelope=envelope)
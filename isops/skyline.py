@@ -0,0 +1,120 @@
+"""Direct ingestion of Skyline precursor exports.
+
+This is the Python replacement for Dataframe_preparation_1.01.R: it turns a
+raw export (Replicate, Peptide, Precursor, Precursor Charge, Peptide
+Retention Time) into the win_df_1.csv schema the designer works with.
+The export is read in chunks of the five needed columns, and replicates
+are folded into one row per precursor as they arrive. Memory therefore
+grows with the number of distinct precursors, not with the file size.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+
+SKYLINE_COLUMNS = {
+    "Peptide": "Name",
+    "Precursor": "Precursor",
+    "Precursor Charge": "Charge",
+    "Peptide Retention Time": "RT",
+}
+PRECURSOR_KEY = ["Name", "Precursor", "Charge"]
+OUTPUT_COLUMNS = ["Name", "MZ", "Types", "Charge", "RT", "MZp1", "MZp2", "has_pair", "pair_number", "Win_start"]
+
+# Leading m/z of a Skyline precursor label such as "677.8506++ (heavy)"
+PRECURSOR_MZ = r"^\s*(\d+(?:\.\d+)?)"
+DEFAULT_CHUNKSIZE = 500_000
+WIN_START_OFFSET = 0.5  # Seed boundaries this far below each precursor
+
+
+def read_header(source):
+    """First line of a CSV/TSV path or seekable file-like object, leaving the position untouched."""
+    if isinstance(source, (str, bytes)) or hasattr(source, "__fspath__"):
+        with open(source, "rb") as handle:
+            line = handle.readline()
+    else:
+        position = source.tell()
+        line = source.readline()
+        source.seek(position)
+    if isinstance(line, bytes):
+        line = line.decode("utf-8", errors="replace")
+    return line.strip()
+
+
+def detect_separator(header):
+    return "\t" if header.count("\t") > header.count(",") else ","
+
+
+def header_columns(header):
+    return [col.strip().strip('"') for col in header.split(detect_separator(header))]
+
+
+def is_skyline_export(header):
+    columns = set(header_columns(header))
+    return all(col in columns for col in SKYLINE_COLUMNS)
+
+
+def _fold_replicates(rows):
+    """Collapse rows of the same precursor into RT sum/count and first appearance."""
+    return rows.groupby(PRECURSOR_KEY, sort=False, dropna=False).agg(
+        RT_sum=("RT_sum", "sum"),
+        RT_count=("RT_count", "sum"),
+        first_row=("first_row", "min"),
+    ).reset_index()
+
+
+def read_skyline_export(source, chunksize=DEFAULT_CHUNKSIZE):
+    """Read a raw Skyline export into the win_df_1.csv schema.
+
+    Replicate measurements of a precursor are merged and their retention
+    times averaged. The rest follows the R preparation script: isotope m/z
+    from the charge, light/heavy pairs numbered in m/z order, and
+    Win_start seeds 0.5 Th below each precursor.
+    """
+    header = read_header(source)
+    reader = pd.read_csv(source, sep=detect_separator(header), usecols=list(SKYLINE_COLUMNS),
+                         chunksize=chunksize)
+    folded = None
+    for chunk in reader:
+        # Replicates repeat the same precursor labels, so fold before parsing anything
+        chunk = chunk.rename(columns=SKYLINE_COLUMNS)
+        rt = pd.to_numeric(chunk["RT"], errors="coerce")
+        rows = pd.DataFrame({
+            "Name": chunk["Name"],
+            "Precursor": chunk["Precursor"].astype(str),
+            "Charge": pd.to_numeric(chunk["Charge"], errors="coerce"),
+            "RT_sum": rt.fillna(0.0),
+            "RT_count": rt.notna().astype(np.int64),
+            "first_row": chunk.index,
+        })
+        folded = _fold_replicates(rows if folded is None else pd.concat([folded, rows], ignore_index=True))
+
+    if folded is None:
+        return pd.DataFrame(columns=OUTPUT_COLUMNS)
+    return _finish_precursors(folded)
+
+
+def _finish_precursors(folded):
+    """Parse the precursor labels of the folded rows and derive the remaining columns."""
+    df = folded
+    precursor = df["Precursor"]
+    df["MZ"] = pd.to_numeric(precursor.str.extract(PRECURSOR_MZ, expand=False), errors="coerce")
+    df["Types"] = np.where(precursor.str.contains("heavy", regex=False), "Heavy", "Light")
+    df["RT"] = df["RT_sum"] / df["RT_count"].where(df["RT_count"] > 0)
+    df["MZp1"] = df["MZ"] + 1 / df["Charge"]
+    df["MZp2"] = df["MZ"] + (1 / df["Charge"]) * 2
+
+    # Pairs are names with exactly two precursors; groups are ordered by their smallest m/z
+    by_name = df.groupby("Name", sort=False, dropna=False)["MZ"]
+    df["has_pair"] = by_name.transform("size") == 2
+    df["min_MZ"] = by_name.transform("min")
+    df = df.sort_values(["min_MZ", "first_row"], kind="stable")
+    pair_rank = df["min_MZ"].rank(method="dense").astype("Int64").astype(str)
+    df["pair_number"] = ("pair_" + pair_rank).where(df["has_pair"])
+    df["Win_start"] = np.round(df["MZ"] - WIN_START_OFFSET, 1)
+
+    return df[OUTPUT_COLUMNS].reset_index(drop=True)
+
+
+def read_skyline_bytes(raw_bytes, **kwargs):
+    return read_skyline_export(io.BytesIO(raw_bytes), **kwargs)
@@ -0,0 +1,109 @@
+"""Automatic boundary placement.
+
+Every target's isotope envelope, widened by the export margins, marks an
+open m/z interval that a boundary should not fall into. Boundaries live on
+the rounding grid (0.5 Th by default), so they are exported unchanged, and
+consecutive boundaries are never more than the maximum window width apart.
+
+When the envelopes leave room, the solution cuts none of them; when they
+overlap over more than a window's width, some must be cut. Among the
+boundary sets within the width limit, the solver picks the one with the
+fewest boundary-envelope crossings, then the one with the fewest windows (the longest dwell
+time per window for a fixed cycle time). It is a shortest path over the
+grid points: every point costs the envelopes it cuts, and each step may
+jump at most max_width. A sliding-window minimum makes that linear in the
+number of grid points, after sorting the envelopes once, so the whole
+solve is O(n log n + span / step).
+"""
+from collections import deque
+
+import numpy as np
+
+from isops.engine import DEFAULT_MAX_WIDTH
+from isops.envelope import IsotopeEnvelope
+
+ROUNDING_STEP = 0.5
+DEFAULT_MARGIN_START = 0.5  # Minimum MZ - Round_start
+DEFAULT_MARGIN_END = 0.5  # Minimum Round_end - highest isotope (MZp2 by default)
+
+
+def target_envelopes(df, margin_start=DEFAULT_MARGIN_START, margin_end=DEFAULT_MARGIN_END, envelope=None):
+    """(lo, hi) arrays of the m/z span each target needs inside a single window.
+
+    envelope is the IsotopeEnvelope of df, computed with the defaults if omitted.
+    """
+    if envelope is None:
+        envelope = IsotopeEnvelope.from_frame(df)
+    mz = envelope.mz
+    valid = ~np.isnan(mz)
+    return mz[valid] - margin_start, envelope.top[valid] + margin_end
+
+
+class BoundarySolution:
+    """Boundaries from solve_boundaries plus what had to give when constraints clashed."""
+
+    def __init__(self, lines, cut):
+        self.lines = lines
+        self.cut = cut  # Envelopes a boundary cuts because they overlap over more than max_width
+
+    @property
+    def window_count(self):
+        return max(0, len(self.lines) - 1)
+
+
+def check_grid(max_width, step):
+    """Raise ValueError unless max_width >= step > 0, i.e. every window can span at least one grid step."""
+    if not step > 0:
+        raise ValueError(f"rounding step must be positive, got {step!r}")
+    if not max_width >= step:
+        raise ValueError(f"max width {max_width!r} is smaller than the rounding step {step!r}")
+
+
+def grid_cut_counts(lo, hi, points):
+    """Number of open intervals (lo, hi) strictly containing each point."""
+    return (np.searchsorted(np.sort(lo), points, side="left")
+            - np.searchsorted(np.sort(hi), points, side="right"))
+
+
+def solve_boundaries(df, max_width=DEFAULT_MAX_WIDTH, margin_start=DEFAULT_MARGIN_START,
+                     margin_end=DEFAULT_MARGIN_END, step=ROUNDING_STEP, envelope=None):
+    """Boundaries on the rounding grid, at most max_width apart, cutting envelopes the fewest times in the fewest windows.
+
+    Raises ValueError unless max_width >= step > 0; max_width None means DEFAULT_MAX_WIDTH.
+    """
+    if max_width is None:
+        max_width = DEFAULT_MAX_WIDTH
+    check_grid(max_width, step)
+    lo, hi = target_envelopes(df, margin_start, margin_end, envelope)
+    if not len(lo):
+        return BoundarySolution([], 0)
+
+    first = int(np.floor(lo.min() / step))
+    last = max(int(np.ceil(hi.max() / step)), first + 1)
+    points = np.arange(first, last + 1) * step
+    cuts = grid_cut_counts(lo, hi, points)
+    # Widest jump in grid steps; the small tolerance keeps e.g. 10 / 0.5 from flooring to 19
+    reach = int(np.floor(max_width / step + 1e-9))
+
+    # Path cost as one integer: cut envelopes first, windows second
+    windows_scale = len(points)
+    cost = cuts.astype(np.int64) * windows_scale + 1
+    best = np.zeros(len(points), dtype=np.int64)
+    previous = np.zeros(len(points), dtype=np.int64)
+    window = deque([0])  # Points within reach, in increasing order of best
+    for j in range(1, len(points)):
+        while window[0] < j - reach:
+            window.popleft()
+        i = window[0]
+        best[j] = best[i] + cost[j]
+        previous[j] = i
+        while window and best[window[-1]] >= best[j]:
+            window.pop()
+        window.append(j)
+
+    path = [len(points) - 1]
+    while path[-1]:
+        path.append(previous[path[-1]])
+    lines = points[path[::-1]]
+    cut = np.searchsorted(lines, hi, side="left") > np.searchsorted(lines, lo, side="right")
+    return BoundarySolution([float(line) for line in lines], int(np.count_nonzero(cut)))
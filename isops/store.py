@@ -0,0 +1,72 @@
+"""Uploads shared between server worker processes.
+
+Under a multi-worker server every request may land on a different
+process, but each process keeps its own in-memory dataset cache. The raw
+upload bytes are therefore also written to a small SQLite database in a
+shared directory, keyed by the same content hash the browser holds, so a
+worker that has never seen an upload can parse it on first use.
+
+SQLite handles the locking between processes. Connections are opened per
+process and thread, so the store can be created before the server forks.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_MAX_BYTES = 4 * 1024 ** 3
+STORE_FILENAME = "uploads.sqlite"
+
+
+class SharedUploadStore:
+    """Content-addressed upload bytes in SQLite, least recently used evicted past max_bytes."""
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, STORE_FILENAME)
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                " key TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        # One connection per process and thread; a forked worker must not reuse its parent's
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        with conn:
+            row = conn.execute("SELECT data FROM uploads WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE uploads SET accessed = ? WHERE key = ?", (time.time(), key))
+        return bytes(row[0])
+
+    def put(self, key, data):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO uploads (key, data, size, accessed) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET accessed = excluded.accessed",
+                (key, sqlite3.Binary(data), len(data), time.time()),
+            )
+            self._evict(conn, keep=key)
+
+    def _evict(self, conn, keep):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM uploads").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM uploads ORDER BY accessed").fetchall():
+            if total <= self.max_bytes:
+                break
+            if key != keep:
+                conn.execute("DELETE FROM uploads WHERE key = ?", (key,))
+                total -= size
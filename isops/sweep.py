@@ -0,0 +1,214 @@
+"""Parameter sweeps for comparing window schemes.
+
+Every combination of a parameter grid (max width, rounding step and
+margins for the solver; max width alone for auto-fill from the seed
+boundaries) is turned into a boundary set and scored on the exported,
+0.5 Th rounded windows:
+
+    windows          number of windows
+    mean_width       mean rounded window width
+    violations       targets whose isotope envelope a boundary cuts
+    max_coisolated   most targets sharing one window (by MZ)
+    oversized        windows wider than the max width
+
+Large grids are spread over a process pool. The target arrays are copied
+once into a shared memory block that the workers map read-only, so no
+worker receives a pickled copy of the dataset.
+"""
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from isops.engine import DEFAULT_MAX_WIDTH, auto_fill_lines, build_mz_index, round_half, seed_lines
+from isops.envelope import IsotopeEnvelope
+from isops.solver import DEFAULT_MARGIN_END, DEFAULT_MARGIN_START, ROUNDING_STEP, check_grid, solve_boundaries
+from isops.violations import EnvelopeIndex
+
+METHODS = ("optimize", "auto_fill")
+PARAMETER_COLUMNS = ["method", "max_width", "step", "margin_start", "margin_end"]
+RESULT_COLUMNS = PARAMETER_COLUMNS + ["windows", "mean_width", "violations", "max_coisolated", "oversized"]
+# Below this many schemes, starting worker processes costs more than it saves
+MIN_PARALLEL_SCHEMES = 4
+
+
+def parameter_grid(max_widths=(DEFAULT_MAX_WIDTH,), steps=(ROUNDING_STEP,), margins_start=(DEFAULT_MARGIN_START,),
+                   margins_end=(DEFAULT_MARGIN_END,), methods=("optimize",)):
+    """One parameter dict per scheme. Auto-fill ignores step and margins, so it only varies max width.
+
+    Raises ValueError for an unknown method, or a solver max width below its rounding step.
+    """
+    grid = []
+    for method in methods:
+        if method == "optimize":
+            for max_width, step, margin_start, margin_end in itertools.product(
+                    max_widths, steps, margins_start, margins_end):
+                check_grid(max_width, step)
+                grid.append({"method": method, "max_width": max_width, "step": step,
+                             "margin_start": margin_start, "margin_end": margin_end})
+        elif method == "auto_fill":
+            for max_width in max_widths:
+                grid.append({"method": method, "max_width": max_width, "step": None,
+                             "margin_start": None, "margin_end": None})
+        else:
+            raise ValueError(f"unknown sweep method {method!r} (expected one of {', '.join(METHODS)})")
+    return grid
+
+
+class SweepData:
+    """The arrays a scheme is built and scored from, plus indexes over them."""
+
+    def __init__(self, mz, top, seeds, mz_index):
+        self.frame = pd.DataFrame({"MZ": mz}, copy=False)
+        # Scoring only needs each target's lowest and highest isotope
+        self.envelope = IsotopeEnvelope(np.vstack([mz, top]))
+        self.seeds = seeds
+        self.mz_index = mz_index
+        self.envelopes = EnvelopeIndex(mz, top)
+        self.sorted_mz = self.envelopes.lo
+
+    @classmethod
+    def arrays_from_frame(cls, df, seeds, envelope=None):
+        """The named arrays SweepData is built from, ready to be shared.
+
+        envelope is the IsotopeEnvelope of df, computed with the defaults if omitted.
+        """
+        if envelope is None:
+            envelope = IsotopeEnvelope.from_frame(df)
+        seeds = np.asarray(seeds, dtype=float)
+        return {
+            "mz": envelope.mz,
+            "top": envelope.top,
+            "seeds": np.unique(seeds[~np.isnan(seeds)]),
+            "mz_index": build_mz_index(df, envelope),
+        }
+
+
+def evaluate_scheme(data, params):
+    """Build the boundaries for one parameter dict and score them; returns a result row."""
+    max_width = params["max_width"]
+    if params["method"] == "optimize":
+        solution = solve_boundaries(data.frame, max_width, params["margin_start"], params["margin_end"],
+                                    params["step"], data.envelope)
+        lines = solution.lines
+    elif len(data.seeds):
+        lines, _ = auto_fill_lines(data.seeds, data.mz_index, max_width)
+    else:
+        lines = []
+
+    bounds = np.unique(round_half(lines))
+    widths = np.diff(bounds)
+    # Targets per window by MZ, with windows [start, end) as in the export
+    targets = (np.searchsorted(data.sorted_mz, bounds[1:], side="left")
+               - np.searchsorted(data.sorted_mz, bounds[:-1], side="left"))
+    return dict(
+        params,
+        windows=len(widths),
+        mean_width=round(float(widths.mean()), 4) if len(widths) else None,
+        violations=int(np.count_nonzero(data.envelopes.cut_counts(bounds))),
+        max_coisolated=int(targets.max()) if len(targets) else 0,
+        oversized=int(np.count_nonzero(widths > max_width)),
+    )
+
+
+class SharedArrays:
+    """Named float arrays packed into one shared memory block.
+
+    The creating process owns the block and unlinks it on close; other
+    processes attach with attach(spec) and get read-only views.
+    """
+
+    def __init__(self, arrays):
+        arrays = {name: np.ascontiguousarray(values, dtype=np.float64) for name, values in arrays.items()}
+        self.layout = {}
+        offset = 0
+        for name, values in arrays.items():
+            self.layout[name] = (offset, len(values))
+            offset += values.nbytes
+        self._shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for name, values in arrays.items():
+            start, length = self.layout[name]
+            np.ndarray(length, dtype=np.float64, buffer=self._shm.buf, offset=start)[:] = values
+
+    @property
+    def spec(self):
+        """Picklable description other processes attach with."""
+        return self._shm.name, self.layout
+
+    @staticmethod
+    def attach(spec):
+        """(shared memory handle, {name: read-only view}); keep the handle alive with the views."""
+        name, layout = spec
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+        views = {}
+        for key, (start, length) in layout.items():
+            view = np.ndarray(length, dtype=np.float64, buffer=shm.buf, offset=start)
+            view.flags.writeable = False
+            views[key] = view
+        return shm, views
+
+    def close(self):
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Per worker process: the attached block and the data built on it, set by _init_worker
+_worker_shm = None
+_worker_data = None
+
+
+def _init_worker(spec):
+    global _worker_shm, _worker_data
+    _worker_shm, views = SharedArrays.attach(spec)
+    _worker_data = SweepData(**views)
+
+
+def _evaluate_in_worker(params):
+    return evaluate_scheme(_worker_data, params)
+
+
+def run_sweep(df, grid, workers=None, seeds=None, progress=None, envelope=None):
+    """Score every scheme in grid against df; returns result rows in grid order.
+
+    Auto-fill schemes start from seeds, by default the Win_start boundaries.
+    progress, if given, is called with (done, total) as schemes finish.
+    envelope is the IsotopeEnvelope of df, computed with the defaults if omitted.
+    """
+    arrays = SweepData.arrays_from_frame(df, seed_lines(df) if seeds is None else seeds, envelope)
+    workers = workers or os.cpu_count() or 1
+    total = len(grid)
+    results = []
+    if workers == 1 or total < MIN_PARALLEL_SCHEMES:
+        data = SweepData(**arrays)
+        for params in grid:
+            results.append(evaluate_scheme(data, params))
+            if progress:
+                progress(len(results), total)
+        return results
+
+    with SharedArrays(arrays) as shared:
+        with ProcessPoolExecutor(max_workers=min(workers, total), initializer=_init_worker,
+                                 initargs=(shared.spec,)) as pool:
+            # Schemes are cheap, so hand them out in batches; map keeps grid order
+            for result in pool.map(_evaluate_in_worker, grid, chunksize=max(1, total // (4 * workers))):
+                results.append(result)
+                if progress:
+                    progress(len(results), total)
+    return results
+
+
+def parse_values(text, cast=float):
+    """Values from a comma-separated string such as "5, 7.5, 10"; empty items are skipped."""
+    return [cast(item) for item in str(text).split(",") if item.strip()]
@@ -0,0 +1,157 @@
+"""Live check for isotope envelopes cut by a window boundary.
+
+A target is in violation when an exported (0.5 Th rounded) boundary falls
+strictly inside its isotope envelope (MZ up to the highest isotope, MZp2
+by default), which is what shows up as a negative MZ-Round_start or
+Round_end-MZp2 in the export.
+
+EnvelopeIndex keeps the envelopes sorted by their low end. Envelopes are
+at most a few Th wide, so the ones a boundary cuts sit in a short run just
+below it and are found with two binary searches. ViolationTracker keeps a
+per-target count of cutting boundaries and, when the boundaries change,
+only touches the targets around the boundaries that were added or removed:
+a drag updates the two windows next to the moved line, not the table.
+"""
+import threading
+from collections import Counter
+
+import numpy as np
+
+from isops.engine import round_half
+from isops.envelope import IsotopeEnvelope
+
+# Past this many boundary changes at once, recounting everything is cheaper
+FULL_RECOUNT_CHANGES = 64
+
+
+class EnvelopeIndex:
+    """Target envelopes sorted by MZ, for stabbing queries with boundary positions."""
+
+    def __init__(self, mz, top, rows=None):
+        mz = np.asarray(mz, dtype=float)
+        top = np.asarray(top, dtype=float)
+        top = np.where(np.isnan(top), mz, top)
+        rows = np.arange(len(mz)) if rows is None else np.asarray(rows)
+        valid = ~np.isnan(mz)
+        order = np.argsort(mz[valid], kind="stable")
+        self._build(mz[valid][order], top[valid][order], rows[valid][order])
+
+    @classmethod
+    def from_sorted(cls, lo, hi, rows):
+        """Index over envelopes already sorted by lo, e.g. the arrays of a saved project."""
+        index = cls.__new__(cls)
+        index._build(np.asarray(lo, dtype=float), np.asarray(hi, dtype=float), np.asarray(rows))
+        return index
+
+    def _build(self, lo, hi, rows):
+        self.lo = lo
+        self.hi = hi
+        self.rows = rows  # Row position of each envelope in the source frame
+        self.max_width = float(np.max(self.hi - self.lo)) if len(self.lo) else 0.0
+        # Furthest reach of any envelope starting at or before each position
+        self.reach = np.maximum.accumulate(self.hi) if len(self.hi) else self.hi
+
+    @classmethod
+    def from_frame(cls, df, rows=None, envelope=None):
+        """Index over the envelopes of df (of the given rows only), from MZ to the highest isotope.
+
+        envelope is the IsotopeEnvelope of df, computed with the defaults if omitted.
+        """
+        if envelope is None:
+            envelope = IsotopeEnvelope.from_frame(df)
+        subset = envelope.take(rows)
+        return cls(subset.mz, subset.top, rows)
+
+    def __len__(self):
+        return len(self.lo)
+
+    @property
+    def nbytes(self):
+        return self.lo.nbytes + self.hi.nbytes + self.rows.nbytes + self.reach.nbytes
+
+    def stabbed_by(self, boundary):
+        """Positions (in sorted order) of the envelopes with lo < boundary < hi."""
+        start = np.searchsorted(self.lo, boundary - self.max_width, side="left")
+        end = np.searchsorted(self.lo, boundary, side="left")
+        candidates = np.arange(start, end)
+        return candidates[self.hi[candidates] > boundary]
+
+    def cut_counts(self, sorted_boundaries, positions=None):
+        """Number of boundaries strictly inside every envelope (or those at positions), in sorted order."""
+        sorted_boundaries = np.asarray(sorted_boundaries, dtype=float)
+        lo = self.lo if positions is None else self.lo[positions]
+        hi = self.hi if positions is None else self.hi[positions]
+        return (np.searchsorted(sorted_boundaries, hi, side="left")
+                - np.searchsorted(sorted_boundaries, lo, side="right"))
+
+    def cutting(self, sorted_boundaries):
+        """Mask of the boundaries that fall strictly inside at least one envelope."""
+        sorted_boundaries = np.asarray(sorted_boundaries, dtype=float)
+        below = np.searchsorted(self.lo, sorted_boundaries, side="left")
+        cuts = np.zeros(len(sorted_boundaries), dtype=bool)
+        has_below = below > 0
+        cuts[has_below] = self.reach[below[has_below] - 1] > sorted_boundaries[has_below]
+        return cuts
+
+
+class ViolationReport:
+    """Targets cut by a boundary, and the boundaries doing the cutting."""
+
+    def __init__(self, rows, boundaries):
+        self.rows = rows  # Row positions in the dataset frame
+        self.boundaries = boundaries  # Rounded boundary positions
+
+    @property
+    def count(self):
+        return len(self.rows)
+
+
+class ViolationTracker:
+    """Incrementally maintained envelope violations for one set of targets."""
+
+    def __init__(self, index):
+        self.index = index
+        self.boundaries = Counter()
+        self.counts = np.zeros(len(index), dtype=np.int32)
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        return self.index.nbytes + self.counts.nbytes
+
+    def update(self, lines):
+        """Move to a new boundary set and report the violations it causes."""
+        new = Counter(round_half(lines).tolist())
+        with self._lock:
+            added = new - self.boundaries
+            removed = self.boundaries - new
+            if sum(added.values()) + sum(removed.values()) > FULL_RECOUNT_CHANGES:
+                self.counts = self.index.cut_counts(sorted(new.elements())).astype(np.int32)
+            else:
+                for boundary, n in removed.items():
+                    self.counts[self.index.stabbed_by(boundary)] -= n
+                for boundary, n in added.items():
+                    self.counts[self.index.stabbed_by(boundary)] += n
+            self.boundaries = new
+            violating = self.counts > 0
+            rows = self.index.rows[violating]
+
+        boundaries = np.array(sorted(new), dtype=float)
+        return ViolationReport(np.sort(rows), boundaries[self.index.cutting(boundaries)])
+
+    def status_changes(self, old_lines, new_lines):
+        """Rows cut under one of two boundary sets but not under the other.
+
+        Only envelopes around the boundaries the sets differ in can change,
+        so moving one line costs two stabbing queries. The tracker's own
+        state is not used or changed.
+        """
+        old = Counter(round_half(old_lines).tolist())
+        new = Counter(round_half(new_lines).tolist())
+        changed = (old - new) + (new - old)
+        if not changed:
+            return np.empty(0, dtype=self.index.rows.dtype)
+        positions = np.unique(np.concatenate([self.index.stabbed_by(boundary) for boundary in changed]))
+        before = self.index.cut_counts(sorted(old.elements()), positions) > 0
+        after = self.index.cut_counts(sorted(new.elements()), positions) > 0
+        return np.sort(self.index.rows[positions[before != after]])
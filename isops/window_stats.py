@@ -0,0 +1,120 @@
+"""Per-window summary statistics for the window table.
+
+Each window row covers one [start, end) pair of neighbouring boundaries:
+its rounded bounds, width, target count, how many light/heavy pairs it
+holds completely, and the smallest margin any target has to the rounded
+bounds (the smaller of MZ - Round_start and Round_end minus the highest
+isotope, as in the export). Rows are cached by their (start, end) pair, so when the
+boundaries change only the windows next to the edit are recomputed.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from isops.engine import round_half
+from isops.envelope import IsotopeEnvelope
+
+STATS_COLUMNS = ["Start", "End", "Round_start", "Round_end", "Width", "Targets", "Complete_pairs",
+                 "Pairs", "Min_margin"]
+
+
+class WindowStats:
+    """Cached window rows for one set of targets (a dataset, or one RT segment of it)."""
+
+    def __init__(self, df, rows=None, envelope=None):
+        frame = df if rows is None else df.iloc[rows]
+        # Target envelopes from MZ to the highest isotope, computed with the defaults if not given
+        subset = (envelope if envelope is not None else IsotopeEnvelope.from_frame(df)).take(rows)
+        mz = subset.mz
+        valid = ~np.isnan(mz)
+        order = np.argsort(mz[valid], kind="stable")
+        self.mz = mz[valid][order]
+        self.top = subset.top[valid][order]
+        # Trailing sentinel so reduceat can take slices that end at the last target
+        self._top_padded = np.append(self.top, -np.inf)
+        # Light/heavy partners share a pair number; -1 marks targets without one
+        if "pair_number" in frame.columns and "Types" in frame.columns:
+            pair_codes, _ = pd.factorize(frame["pair_number"])
+            self.pair = pair_codes[valid][order]
+            self.light = (frame["Types"] == "Light").to_numpy()[valid][order]
+        else:
+            self.pair = None
+            self.light = None
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        """Size of the sorted target arrays; the cached rows are a few per window."""
+        arrays = [self.mz, self.top, self._top_padded, self.pair, self.light]
+        return sum(values.nbytes for values in arrays if values is not None)
+
+    def table(self, lines):
+        """One row dict per window of the given boundaries, in m/z order.
+
+        Windows already seen with the same start and end come from the
+        cache; only the others (the dirty rows) are computed.
+        """
+        sorted_lines = np.unique(np.asarray(lines, dtype=float))
+        windows = list(zip(sorted_lines[:-1].tolist(), sorted_lines[1:].tolist()))
+        with self._lock:
+            dirty = [window for window in windows if window not in self._rows]
+            if dirty:
+                starts, ends = (np.array(bounds) for bounds in zip(*dirty))
+                for window, row in zip(dirty, self._compute(starts, ends)):
+                    self._rows[window] = row
+            # Keep only the current windows, so the cache never outgrows the table
+            self._rows = {window: self._rows[window] for window in windows}
+            return [self._rows[window] for window in windows]
+
+    def _compute(self, starts, ends):
+        first = np.searchsorted(self.mz, starts, side="left")
+        last = np.searchsorted(self.mz, ends, side="left")
+        counts = last - first
+        round_start = round_half(starts)
+        round_end = round_half(ends)
+
+        # Targets are sorted by MZ, so a window's lowest MZ is its first target.
+        # Its highest MZp2 is a max over the slice: windows never overlap, so
+        # reduceat over interleaved (first, last) indices gives every slice at once.
+        filled = counts > 0
+        min_mz = np.full(len(starts), np.nan)
+        max_top = np.full(len(starts), np.nan)
+        if filled.any():
+            min_mz[filled] = self.mz[first[filled]]
+            bounds = np.column_stack([first[filled], last[filled]]).ravel()
+            max_top[filled] = np.maximum.reduceat(self._top_padded, bounds)[::2]
+        min_margin = np.minimum(min_mz - round_start, round_end - max_top)
+
+        complete, pairs = self._pair_counts(first, counts)
+        return [
+            {
+                "Start": start, "End": end, "Round_start": r_start, "Round_end": r_end,
+                "Width": round(end - start, 4), "Targets": count, "Complete_pairs": n_complete,
+                "Pairs": n_pairs, "Min_margin": None if np.isnan(margin) else round(margin, 4),
+            }
+            for start, end, r_start, r_end, count, n_complete, n_pairs, margin in zip(
+                starts.tolist(), ends.tolist(), round_start.tolist(), round_end.tolist(), counts.tolist(),
+                complete.tolist(), pairs.tolist(), min_margin.tolist())
+        ]
+
+    def _pair_counts(self, first, counts):
+        """(complete, total) light/heavy pairs per window, for all windows at once."""
+        n = len(first)
+        if self.pair is None or not counts.sum():
+            return np.zeros(n, dtype=int), np.zeros(n, dtype=int)
+        # Flatten the target slices of every window into one array of (window, target)
+        window_of = np.repeat(np.arange(n), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        targets = np.repeat(first, counts) + offsets
+        pair = self.pair[targets]
+        keep = pair >= 0
+        window_of, pair, light = window_of[keep], pair[keep], self.light[targets][keep]
+
+        stride = int(self.pair.max()) + 1
+        keys = window_of.astype(np.int64) * stride + pair
+        all_keys = np.unique(keys)
+        complete_keys = np.intersect1d(keys[light], keys[~light])
+        return (np.bincount(complete_keys // stride, minlength=n),
+                np.bincount(all_keys // stride, minlength=n))
@@ -0,0 +1,27 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+EXAMPLE_DATA = REPO_ROOT / "Example_data"
+
+# The app script and the benchmarks live next to the isops package, not inside it
+sys.path.insert(0, str(REPO_ROOT))
+
+
+@pytest.fixture(scope="session")
+def precursors():
+    """A 2,000-row synthetic precursor table, mostly light/heavy pairs."""
+    from benchmarks.synthetic import generate_precursors
+    return generate_precursors(2000, seed=1)
+
+
+@pytest.fixture(scope="session")
+def app():
+    """The Dash app module, loaded by path since its file name is not a module name."""
+    spec = importlib.util.spec_from_file_location("isops_app", REPO_ROOT / "IsoPS_code_v1.16.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
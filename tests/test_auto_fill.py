@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from isops.engine import auto_fill_lines, build_mz_index
+
+
+def baseline_auto_fill(lines, df, max_width):
+    """The original per-region linear scan over a set of every m/z value."""
+    if max_width is None or max_width <= 0:
+        max_width = 10
+    sorted_lines = sorted(float(line) for line in lines)
+    all_mz_values = set()
+    for col in ["MZ", "MZp1", "MZp2"]:
+        all_mz_values.update(df[col].dropna().tolist())
+    new_lines = []
+    for start, end in zip(sorted_lines, sorted_lines[1:]):
+        region_width = end - start
+        if region_width > max_width:
+            target_count = len([mz for mz in all_mz_values if start < mz < end])
+            if target_count < 2:
+                num_divisions = max(2, int(region_width / max_width) + 1)
+                step = region_width / num_divisions
+                new_lines += [start + j * step for j in range(1, num_divisions)]
+    return sorted(sorted_lines + new_lines), new_lines
+
+
+def targets(mz, charge):
+    mz = np.asarray(mz, dtype=float)
+    charge = np.broadcast_to(charge, mz.shape)
+    # The isotopes as the envelope computes them, so the m/z index holds the same values
+    return pd.DataFrame({"MZ": mz, "Charge": charge, "MZp1": mz + 1 * (1 / charge), "MZp2": mz + 2 * (1 / charge)})
+
+
+def compare(lines, df, max_width):
+    expected_lines, expected_new = baseline_auto_fill(lines, df, max_width)
+    updated, new_lines = auto_fill_lines(lines, build_mz_index(df), max_width)
+    assert updated == expected_lines
+    assert np.asarray(new_lines).tolist() == expected_new
+
+
+@pytest.mark.parametrize("max_width", [None, 0, 0.7, 2, 5, 10, 25])
+def test_random_tables_match_the_linear_scan(max_width):
+    rng = np.random.default_rng(4)
+    df = targets(np.round(rng.uniform(450, 900, 150), 4), rng.choice([1, 2, 3], 150))
+    # Empty stretches at both ends, and a few duplicated boundaries
+    lines = np.concatenate([[300.0, 330.0], np.round(rng.uniform(450, 900, 40), 1), [1000.0, 1130.5]])
+    lines = np.concatenate([lines, lines[5:8]]).tolist()
+    rng.shuffle(lines)
+    compare(lines, df, max_width)
+
+
+def test_ties_match_the_linear_scan():
+    df = targets([405.0, 430.0, 430.5], 2)
+    lines = [400.0, 410.0, 420.0, 430.0, 450.0, 450.0, 480.0]
+    # Widths exactly max_width are left alone; widths a multiple of it divide evenly;
+    # targets on a boundary are outside both regions
+    for max_width in [10, 20, 30, 5]:
+        compare(lines, df, max_width)
+
+
+def test_nothing_to_fill():
+    df = targets([405.0, 406.0], 1)
+    updated, new_lines = auto_fill_lines([410.0, 400.0], build_mz_index(df), 10)
+    assert updated == [400.0, 410.0] and len(new_lines) == 0
+    assert baseline_auto_fill([410.0, 400.0], df, 10) == (updated, [])
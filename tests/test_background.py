@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from isops.background import BIN_WIDTH, BackgroundLibrary, add_interference, build_library
+
+
+def brute_force_count(df, round_start, round_end, rt, rt_tolerance):
+    inside = (df["MZ"] >= round_start) & (df["MZ"] < round_end) & ((df["RT"] - rt).abs() <= rt_tolerance)
+    return int(inside.sum())
+
+
+@pytest.fixture(scope="module")
+def library_df():
+    rng = np.random.default_rng(7)
+    # m/z on a 0.05 grid puts plenty of entries exactly on bin edges, RT on a 0.25 grid
+    # makes |RT - rt| == tolerance exact for the boundary queries
+    n = 20000
+    mz = np.round(rng.uniform(400, 460, n) / 0.05) * 0.05
+    rt = rng.integers(40, 240, n) * 0.25
+    return pd.DataFrame({"MZ": mz, "RT": rt})
+
+
+@pytest.fixture(scope="module")
+def library(library_df, tmp_path_factory):
+    return build_library(library_df, str(tmp_path_factory.mktemp("background")))
+
+
+def test_reopened_library_matches(library, library_df):
+    reopened = BackgroundLibrary(library.directory)
+    assert len(reopened) == len(library_df)
+    assert np.array_equal(reopened.key, library.key)
+
+
+@pytest.mark.parametrize("rt_tolerance", [0.0, 0.25, 1.0, 2.5, 0.37])
+def test_counts_match_brute_force(library, library_df, rt_tolerance):
+    rng = np.random.default_rng(int(rt_tolerance * 100))
+    n = 300
+    # Windows on the 0.5 Th grid, from empty to many bins wide, some reaching past the library
+    round_start = rng.integers(790, 930, n) * BIN_WIDTH
+    round_end = round_start + rng.integers(0, 30, n) * BIN_WIDTH
+    # Half the query RTs sit on the library grid (entries exactly at the tolerance), half anywhere,
+    # a few far outside the library's RT range
+    rt = np.where(rng.random(n) < 0.5, rng.integers(30, 250, n) * 0.25, rng.uniform(5, 70, n))
+    rt[:5] = [-100.0, 0.0, 500.0, 10.0 - rt_tolerance, 59.75 + rt_tolerance]
+
+    counts = library.count(round_start, round_end, rt, rt_tolerance)
+    expected = [brute_force_count(library_df, *query, rt_tolerance) for query in zip(round_start, round_end, rt)]
+    assert counts.tolist() == expected
+
+
+def test_windows_crossing_bin_edges(library, library_df):
+    # Entries exactly on a bin edge belong to the window starting there, not the one ending there
+    edges = np.arange(800, 920) * BIN_WIDTH
+    on_edge = library_df[np.isin(library_df["MZ"], edges)]
+    assert len(on_edge)
+    for edge, rt in on_edge.head(50).itertuples(index=False):
+        below = float(library.count(edge - 1.0, edge, rt, 0.0))
+        above = float(library.count(edge, edge + 1.0, rt, 0.0))
+        assert below == brute_force_count(library_df, edge - 1.0, edge, rt, 0.0)
+        assert above == brute_force_count(library_df, edge, edge + 1.0, rt, 0.0) > 0
+        assert float(library.count(edge - 1.0, edge + 1.0, rt, 0.0)) == below + above
+
+
+def test_missing_bounds_count_as_na(library, library_df):
+    window_df = pd.DataFrame({"Round_start": [400.0, "NA", 410.5], "Round_end": [405.0, "NA", 412.0],
+                              "RT": [30.0, 20.0, np.nan]})
+    add_interference(window_df, library, rt_tolerance=1.0)
+    assert window_df["Interference"].tolist() == [brute_force_count(library_df, 400.0, 405.0, 30.0, 1.0), "NA", "NA"]
@@ -0,0 +1,43 @@
+import base64
+import shutil
+
+import dash
+
+from conftest import EXAMPLE_DATA
+from isops.cli import main
+
+
+def app_export(app, raw, filename):
+    """The window CSV the app downloads after uploading raw and pressing auto-fill."""
+    contents = "data:text/csv;base64," + base64.b64encode(raw).decode()
+    key, lines = app.upload_file(contents, filename)[:2]
+    filled = app.auto_fill_empty_regions(lambda *args: None, 1, lines, key, 10)[0]
+    if filled is not dash.no_update:
+        lines = filled
+    _, _, chunks = app.export_stream({"dataset_key": key, "lines": lines})
+    return b"".join(chunks)
+
+
+def test_batch_writes_the_app_export(app, tmp_path, capsys):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    input_dir.mkdir()
+    shutil.copy(EXAMPLE_DATA / "win_df_1.csv", input_dir)
+
+    assert main(["batch", str(input_dir), "-o", str(output_dir), "-j", "1"]) == 0
+    written = output_dir / "win_df_1_isolation_windows.csv"
+    assert written.read_bytes() == app_export(app, (input_dir / "win_df_1.csv").read_bytes(), "win_df_1.csv")
+    assert f"-> {written}" in capsys.readouterr().out
+
+
+def test_failing_file_returns_exit_code_1(app, tmp_path, capsys):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    input_dir.mkdir()
+    shutil.copy(EXAMPLE_DATA / "win_df_1.csv", input_dir)
+    # Precursors without the Win_start seed column
+    (input_dir / "no_seeds.csv").write_text("MZ,RT,Charge\n500.1,10.0,2\n")
+
+    assert main(["batch", str(input_dir), "-o", str(output_dir), "-j", "1"]) == 1
+    # The other file is still designed
+    assert (output_dir / "win_df_1_isolation_windows.csv").exists()
+    assert not (output_dir / "no_seeds_isolation_windows.csv").exists()
+    assert "no_seeds.csv: failed: no boundary seeds found in column 'Win_start'" in capsys.readouterr().err
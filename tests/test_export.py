@@ -0,0 +1,110 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from isops.engine import build_window_table, read_precursors, seed_lines
+from isops.envelope import C13_SPACING, IsotopeEnvelope
+from isops import export
+from isops.export import HAVE_PYARROW, WindowAssignment, encode
+from isops.segments import build_segmented_window_table
+
+from conftest import EXAMPLE_DATA
+
+
+@pytest.fixture(scope="module")
+def example():
+    return read_precursors((EXAMPLE_DATA / "win_df_1.csv").read_bytes())
+
+
+def csv_of(frames):
+    return b"".join(encode(frames, "csv"))
+
+
+def test_export_keeps_uploaded_isotope_columns(example):
+    df = example.copy()
+    df.loc[3, "MZp2"] = np.nan
+    lines = sorted(seed_lines(df))
+    # The 13C envelope moves the isotopes, but not the exported values; only the margin follows it
+    envelope = IsotopeEnvelope.from_frame(df, spacing=C13_SPACING)
+    table = build_window_table(df, lines, envelope)
+    uploaded = build_window_table(df, lines, IsotopeEnvelope(df[["MZ", "MZp1", "MZp2"]].to_numpy().T))
+    pd.testing.assert_frame_equal(table.iloc[:, :-1], uploaded.iloc[:, :-1])
+    # An empty MZp2 stays empty rather than being filled in from the charge
+    assert table["MZp2"].isna().sum() == 1
+
+
+def test_extra_isotopes_come_from_the_envelope(example):
+    envelope = IsotopeEnvelope.from_frame(example, isotopes=4)
+    table = build_window_table(example, sorted(seed_lines(example)), envelope)
+    targets = table[table["MZ"] != "NA"]
+    expected = targets["MZ"].astype(float) + 3 / targets["Charge"].astype(float)
+    np.testing.assert_allclose(targets["MZp3"].astype(float), expected)
+    assert table.columns[-1] == "Round_end-MZp3"
+
+
+@pytest.mark.parametrize("isotopes, spacing", [(3, C13_SPACING), (2, 1.0), (4, C13_SPACING)])
+def test_margin_follows_non_default_envelopes(example, isotopes, spacing):
+    envelope = IsotopeEnvelope.from_frame(example, isotopes=isotopes, spacing=spacing)
+    table = build_window_table(example, sorted(seed_lines(example)), envelope)
+    targets = table[table["MZ"] != "NA"]
+    rows = example.set_index(["Name", "Types"]).index.get_indexer(targets.set_index(["Name", "Types"]).index)
+    # Same margin as the violation check and the solver, still next to the uploaded MZp2
+    expected = targets["Round_end"].astype(float) - envelope.top[rows]
+    np.testing.assert_allclose(targets[table.columns[-1]].astype(float), expected)
+    np.testing.assert_array_equal(targets["MZp2"].astype(float), example["MZp2"].to_numpy()[rows])
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 7, 100, 10_000])
+def test_chunked_export_matches_single_frame(precursors, chunk_rows):
+    lines = np.linspace(precursors["MZ"].min() - 1, precursors["MZ"].max() + 1, 120).tolist()
+    lines += [300.0, 301.0]  # Empty windows get NA rows
+    expected = csv_of([build_window_table(precursors, lines)])
+    assignment = WindowAssignment.from_lines(precursors, lines)
+    assert b"".join(assignment.export("csv", chunk_rows=chunk_rows)) == expected
+
+
+def test_chunked_segmented_export_matches_single_frame(precursors):
+    rt = precursors["RT"].astype(float)
+    edges = np.quantile(rt, [0, 0.5, 1])
+    segments = [{"rt_start": float(start), "rt_end": float(end),
+                 "lines": np.linspace(350, 1250, 60 + 10 * i).tolist()}
+                for i, (start, end) in enumerate(zip(edges[:-1], edges[1:]))]
+    expected = csv_of([build_segmented_window_table(precursors, segments)])
+    assignment = WindowAssignment.from_segments(precursors, segments)
+    assert b"".join(assignment.export("csv", chunk_rows=50)) == expected
+
+
+@pytest.mark.skipif(not HAVE_PYARROW, reason="Parquet needs pyarrow")
+def test_chunked_parquet_matches_csv(precursors):
+    lines = np.linspace(350, 1250, 90).tolist()
+    assignment = WindowAssignment.from_lines(precursors, lines)
+    parquet = pd.read_parquet(io.BytesIO(b"".join(assignment.export("parquet", chunk_rows=64))))
+    csv = pd.read_csv(io.BytesIO(b"".join(assignment.export("csv"))))
+    assert len(parquet) == len(csv)
+    np.testing.assert_allclose(parquet["MZ"].to_numpy(dtype=float), csv["MZ"].to_numpy(dtype=float))
+
+
+def test_rt_is_exported_as_uploaded():
+    raw = (EXAMPLE_DATA / "win_df_1.csv").read_bytes().replace(b",15.28,", b",15.403456789,")
+    df = read_precursors(raw)
+    assert df["RT"].dtype == np.float64
+    exported = b"".join(WindowAssignment.from_lines(df, sorted(seed_lines(df))).export("csv"))
+    assert b",15.403456789," in exported
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_csv_matches_to_csv(precursors, monkeypatch, fast):
+    if not fast:
+        monkeypatch.setattr(export, "HAVE_PYARROW", False)
+    df = precursors.copy()
+    df.loc[::7, "MZp2"] = np.nan
+    df["Name"] = df["Name"].mask(df.index % 11 == 0, 'a,"b"').mask(df.index % 13 == 0, "line\nbreak")
+    lines = np.linspace(df["MZ"].min() - 5, df["MZ"].max() + 5, 300).tolist() + [100.0, 101.5]
+    table = build_window_table(df, lines)
+    table["Interference"] = np.arange(len(table))
+    # Whole numbers, and magnitudes where repr switches to exponents
+    table["Extra"] = np.resize([15.0, -0.0, 1e-05, 0.0001, 1e16, 123456789012.5, np.inf, np.nan], len(table))
+    assert csv_of([table]) == table.to_csv(index=False).encode()
+    assert csv_of([table.iloc[:0]]) == table.iloc[:0].to_csv(index=False).encode()
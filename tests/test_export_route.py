@@ -0,0 +1,45 @@
+import base64
+import json
+
+import flask
+import pytest
+
+from conftest import EXAMPLE_DATA
+
+
+@pytest.fixture(scope="module")
+def client(app):
+    server = app.register_export_route(flask.Flask(__name__), "/export")
+    return server.test_client()
+
+
+@pytest.fixture(scope="module")
+def segmented_request(app):
+    raw = (EXAMPLE_DATA / "win_df_1.csv").read_bytes()
+    key, lines = app.upload_file("data:text/csv;base64," + base64.b64encode(raw).decode(), "win_df_1.csv")[:2]
+    lines = sorted(lines)
+    segments = app.split_segment(app.whole_gradient(lines, 0.0, 100.0), 50.0)
+    return {"dataset_key": key, "lines": lines[:-1], "rt_segments": segments}
+
+
+def post(client, request):
+    return client.post("/export", data={"request": json.dumps(request)})
+
+
+def test_segment_export(client, segmented_request):
+    response = post(client, dict(segmented_request, active_segment=1))
+    assert response.status_code == 200
+    assert response.data.splitlines()[0].startswith(b"RT_start,RT_end,")
+
+
+@pytest.mark.parametrize("active", [2, -1, "1", 0.5])
+def test_unknown_segment_is_a_bad_request(client, segmented_request, active):
+    response = post(client, dict(segmented_request, active_segment=active))
+    assert response.status_code == 400
+    assert response.get_data(as_text=True) == f"active_segment {active!r} is not one of the 2 RT segments"
+
+
+def test_unknown_format_is_a_bad_request(client, segmented_request):
+    response = post(client, dict(segmented_request, format="xlsx"))
+    assert response.status_code == 400
+    assert "unknown export format 'xlsx'" in response.get_data(as_text=True)
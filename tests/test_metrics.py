@@ -0,0 +1,26 @@
+import pytest
+
+from isops.metrics import CallbackMetrics
+
+
+def test_background_job_records_reach_the_server(tmp_path):
+    diskcache = pytest.importorskip("diskcache")
+    metrics = CallbackMetrics()
+    metrics.spool = diskcache.Cache(str(tmp_path))
+
+    @metrics.instrument
+    def auto_fill(n):
+        return n + 1
+
+    # In the job process only the shared spool survives the call
+    job_metrics = CallbackMetrics()
+    job_metrics.spool = metrics.spool
+    job = job_metrics.job(job_metrics.instrument(auto_fill.__wrapped__))
+    assert job(1) == 2
+    assert auto_fill(2) == 3
+
+    rendered = metrics.render()
+    assert 'isops_callback_duration_seconds_count{callback="auto_fill"} 2' in rendered
+    assert 'isops_callback_calls_total{callback="auto_fill",trigger="none"} 2' in rendered
+    # Drained records are not counted twice
+    assert 'isops_callback_duration_seconds_count{callback="auto_fill"} 2' in metrics.render()
@@ -0,0 +1,80 @@
+import copy
+
+import numpy as np
+import pytest
+from dash import Patch
+
+
+def apply_patch(figure, patched):
+    """Apply a Patch's Assign, Delete and Insert operations as the Dash renderer does."""
+    figure = copy.deepcopy(figure)
+    for op in patched.to_plotly_json()["operations"]:
+        *path, last = op["location"]
+        parent = figure
+        for key in path:
+            parent = parent[key]
+        if op["operation"] == "Assign":
+            parent[last] = op["params"]["value"]
+        elif op["operation"] == "Delete":
+            del parent[last]
+        elif op["operation"] == "Insert":
+            parent[last].insert(op["params"]["index"], op["params"]["value"])
+        else:
+            raise AssertionError(f"unexpected operation {op['operation']}")
+    return figure
+
+
+def drawn(app, lines):
+    return {"layout": {"shapes": [app.line_shape(x, 0, 1) for x in lines]}}
+
+
+def patched_figure(app, old_lines, new_lines):
+    patched = app.patch_line_shapes(Patch(), old_lines, new_lines, 0, 1)
+    return apply_patch(drawn(app, old_lines), patched), patched
+
+
+@pytest.mark.parametrize("old_lines, new_lines", [
+    ([400.0, 410.0, 420.0], [400.0, 405.0, 410.0, 420.0]),  # insert in the middle
+    ([400.0, 410.0], [390.0, 400.0, 410.0]),  # insert first
+    ([400.0, 410.0], [400.0, 410.0, 430.0]),  # insert last
+    ([400.0, 405.0, 410.0, 420.0], [400.0, 410.0, 420.0]),  # delete
+    ([400.0, 405.0, 410.0], [405.0, 410.0]),  # delete first
+    ([400.0, 405.0, 410.0], []),  # delete all
+    ([400.0, 410.0, 420.0], [400.0, 412.5, 420.0]),  # move in place
+    ([400.0, 410.0, 420.0, 430.0], [410.0, 415.0, 420.0, 430.0]),  # move past a neighbour
+    ([400.0, 410.0, 420.0, 430.0], [405.0, 410.0, 425.0, 430.0]),  # two moves
+    ([400.0, 410.0, 410.0, 420.0], [400.0, 410.0, 420.0]),  # duplicate removed
+    ([], [400.0, 410.0]),  # first draw
+])
+def test_patch_turns_old_shapes_into_new(app, old_lines, new_lines):
+    figure, _ = patched_figure(app, old_lines, new_lines)
+    assert figure == drawn(app, new_lines)
+
+
+def test_unchanged_lines_record_nothing(app):
+    _, patched = patched_figure(app, [400.0, 410.0], [400.0, 410.0])
+    assert patched.to_plotly_json()["operations"] == []
+
+
+def test_single_move_patches_one_shape(app):
+    _, patched = patched_figure(app, [400.0, 410.0, 420.0, 430.0], [400.0, 410.0, 425.0, 430.0])
+    assert [(op["operation"], op["location"]) for op in patched.to_plotly_json()["operations"]] == [
+        ("Assign", ["layout", "shapes", 2, "x0"]), ("Assign", ["layout", "shapes", 2, "x1"])]
+
+
+def test_random_edits(app):
+    rng = np.random.default_rng(3)
+    for _ in range(300):
+        old_lines = sorted(rng.integers(0, 40, rng.integers(1, 12)).astype(float).tolist())
+        new_lines = list(old_lines)
+        for _ in range(rng.integers(1, 4)):
+            edit = rng.integers(3)
+            if edit == 0 or not new_lines:
+                new_lines.append(float(rng.integers(0, 40)))
+            elif edit == 1:
+                del new_lines[rng.integers(len(new_lines))]
+            else:
+                new_lines[rng.integers(len(new_lines))] = float(rng.integers(0, 40))
+            new_lines.sort()
+        figure, _ = patched_figure(app, old_lines, new_lines)
+        assert figure == drawn(app, new_lines), (old_lines, new_lines)
@@ -0,0 +1,25 @@
+import base64
+
+import plotly.graph_objects as go
+
+from benchmarks.run import triggered_by
+
+
+def upload(app, df):
+    contents = "data:text/csv;base64," + base64.b64encode(df.to_csv(index=False).encode()).decode()
+    key, lines = app.upload_file(contents, "precursors.csv")[:2]
+    return key, sorted(lines)
+
+
+def test_full_redraw_is_a_valid_figure(app, precursors):
+    key, lines = upload(app, precursors)
+    with triggered_by("dataset-key.data"):
+        figure, plotted, _, _ = app.update_plot(lines, key, None, [], None, None, "normal", 0)
+    assert plotted == lines
+    assert [shape["x0"] for shape in figure["layout"]["shapes"]] == lines
+    assert [trace["name"] for trace in figure["data"][:2]] == ["Envelope cut by a boundary",
+                                                             "Boundary cutting an envelope"]
+    # The unvalidated dicts are still a figure plotly accepts as is
+    validated = go.Figure(figure).to_plotly_json()
+    assert len(validated["layout"]["shapes"]) == len(lines)
+    assert [trace["type"] for trace in validated["data"]] == [trace["type"] for trace in figure["data"]]
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from isops.engine import read_precursors
+from isops.project import Project, project_bytes, read_project, write_project
+
+from conftest import EXAMPLE_DATA
+
+
+@pytest.fixture(scope="module")
+def table():
+    df = read_precursors((EXAMPLE_DATA / "win_df_1.csv").read_bytes())
+    df["Name"] = df["Name"].mask(df.index == 2)
+    df["pair_number"] = df["pair_number"].astype("str").mask(df.index == 1)
+    df["Note"] = pd.array(["é", None, "Δ"] * (len(df) // 3) + ["x"] * (len(df) % 3), dtype="string[python]")
+    df["Mixed"] = pd.Series([1, "a", np.nan] * (len(df) // 3) + [2.5] * (len(df) % 3), dtype=object)
+    return df
+
+
+def test_round_trip_keeps_values_and_dtypes(table, tmp_path):
+    arrays = {"mz_index": np.sort(table["MZ"].to_numpy()), "rows": np.arange(len(table), dtype=np.int32)}
+    state = {"lines": [400.0, 410.5], "parameters": {"max-region-width": 10}}
+    path = tmp_path / "design.isops"
+    write_project(path, Project(table, state, arrays))
+
+    for project in (read_project(path), read_project(project_bytes(Project(table, state, arrays)))):
+        pd.testing.assert_frame_equal(project.df, table)
+        assert project.df.dtypes.to_dict() == table.dtypes.to_dict()
+        assert project.df["Name"].cat.categories.dtype == table["Name"].cat.categories.dtype
+        assert project.state == state
+        for name, values in arrays.items():
+            np.testing.assert_array_equal(project.arrays[name], values)
+            assert project.arrays[name].dtype == values.dtype
+
+
+def test_categorical_codes_survive(table):
+    ordered = table.assign(Types=table["Types"].cat.as_ordered())
+    df = read_project(project_bytes(Project(ordered))).df
+    assert df["Types"].cat.ordered
+    np.testing.assert_array_equal(df["Name"].cat.codes, table["Name"].cat.codes)
+
+
+def test_rejects_other_files():
+    with pytest.raises(ValueError):
+        read_project(b"Name,MZ\nA,400\n")
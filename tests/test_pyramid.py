@@ -0,0 +1,26 @@
+import numpy as np
+
+from isops.pyramid import DEFAULT_BASE_WIDTH, MAX_BINS, MzPyramid
+
+
+def test_histogram_matches_numpy():
+    rng = np.random.default_rng(3)
+    mz = np.append(rng.uniform(350, 1250, 5000), np.nan)
+    pyramid = MzPyramid(mz)
+    assert pyramid.base_width == DEFAULT_BASE_WIDTH
+    centers, counts, width = pyramid.histogram(400, 800, 1000)
+    edges = np.append(centers - width / 2, centers[-1] + width / 2)
+    np.testing.assert_array_equal(counts, np.histogram(mz, edges)[0])
+
+
+def test_outlier_coarsens_the_finest_level():
+    mz = np.array([400.0, 400.004, 401.5, 1e7, np.inf])
+    pyramid = MzPyramid(mz)
+    assert len(pyramid) == 4
+    assert len(pyramid.levels[0]) <= MAX_BINS
+    assert pyramid.nbytes < 4 * MAX_BINS * 8
+    centers, counts, width = pyramid.histogram(0, 2e7, 100)
+    assert counts.sum() == 4
+    assert width >= pyramid.base_width
+    positions, stride = pyramid.viewport(399, 402, 10)
+    assert sorted(positions) == [0, 1, 2] and stride == 1
@@ -0,0 +1,24 @@
+def test_cache_builds_count_towards_the_registry(app, precursors):
+    registry = app.DatasetRegistry(max_bytes=1024 ** 3)
+    dataset = registry.put("a", precursors)
+    before = dataset.nbytes
+    dataset.pyramid, dataset.density, dataset.violation_tracker([], 0), dataset.window_stats([], 0)
+    assert dataset.nbytes > before
+    assert registry._nbytes == dataset.nbytes
+    # A second read of a cache does not count it again
+    dataset.pyramid
+    assert registry._nbytes == dataset.nbytes
+
+
+def test_growing_caches_evict_older_datasets(app, precursors):
+    registry = app.DatasetRegistry(max_bytes=1024 ** 3)
+    old = registry.put("old", precursors)
+    new = registry.put("new", precursors.copy())
+    registry.max_bytes = old.nbytes + new.nbytes
+    new.pyramid
+    assert registry.get("old") is None
+    assert registry.get("new") is new
+    assert registry._nbytes == new.nbytes
+    # Caches built on an evicted dataset no longer count
+    old.density
+    assert registry._nbytes == new.nbytes
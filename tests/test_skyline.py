@@ -0,0 +1,21 @@
+import pandas as pd
+import pytest
+
+from isops.engine import read_precursors
+from isops.skyline import read_skyline_bytes, read_skyline_export
+
+from conftest import EXAMPLE_DATA
+
+
+@pytest.mark.parametrize("chunksize", [3, 1000])
+def test_export_matches_prepared_table(chunksize):
+    df = read_skyline_export(EXAMPLE_DATA / "Skyline_export.csv", chunksize=chunksize)
+    pd.testing.assert_frame_equal(df, pd.read_csv(EXAMPLE_DATA / "win_df_1.csv"))
+
+
+def test_uploads_are_detected():
+    raw = (EXAMPLE_DATA / "Skyline_export.csv").read_bytes()
+    prepared = (EXAMPLE_DATA / "win_df_1.csv").read_bytes()
+    pd.testing.assert_frame_equal(read_precursors(raw), read_precursors(prepared))
+    tab_separated = raw.replace(b",", b"\t")
+    pd.testing.assert_frame_equal(read_skyline_bytes(tab_separated), read_skyline_bytes(raw))
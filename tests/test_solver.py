@@ -0,0 +1,87 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_precursors
+from isops.solver import ROUNDING_STEP, grid_cut_counts, solve_boundaries, target_envelopes
+from isops.sweep import parameter_grid
+
+
+def targets(mz, charge=2):
+    mz = np.asarray(mz, dtype=float)
+    return pd.DataFrame({"MZ": mz, "Charge": charge, "MZp1": mz + 1 / charge, "MZp2": mz + 2 / charge})
+
+
+@pytest.mark.parametrize("max_width", [0.3, 0.0, -1.0])
+def test_max_width_below_step_is_rejected(max_width):
+    # 0.3 used to loop forever: the next grid line within reach was the current one
+    with pytest.raises(ValueError):
+        solve_boundaries(targets([500.0, 510.0]), max_width=max_width)
+
+
+@pytest.mark.parametrize("step", [0.0, -0.5])
+def test_non_positive_step_is_rejected(step):
+    with pytest.raises(ValueError):
+        solve_boundaries(targets([500.0, 510.0]), max_width=10, step=step)
+
+
+def test_parameter_grid_rejects_unsolvable_schemes():
+    with pytest.raises(ValueError):
+        parameter_grid(max_widths=[5, 0.3], methods=["optimize"])
+    with pytest.raises(ValueError):
+        parameter_grid(steps=[0], methods=["optimize"])
+    # Auto-fill has no rounding step to check
+    assert len(parameter_grid(max_widths=[0.3], methods=["auto_fill"])) == 1
+
+
+@pytest.mark.parametrize("max_width", [0.5, 2, 10, 25])
+def test_max_width_is_a_hard_limit(max_width):
+    # Dense enough that the merged envelopes span the whole m/z range
+    df = generate_precursors(20000, seed=2)
+    solution = solve_boundaries(df, max_width=max_width)
+    lines = np.array(solution.lines)
+    assert np.all(np.diff(lines) > 0)
+    assert np.all(np.diff(lines) <= max_width)
+    np.testing.assert_array_equal(lines, np.round(lines / ROUNDING_STEP) * ROUNDING_STEP)
+    lo, hi = target_envelopes(df)
+    assert lines[0] <= lo.min() and lines[-1] >= hi.max()
+
+
+def test_separate_targets_are_never_cut():
+    solution = solve_boundaries(targets([400.2, 403.7, 420.0, 421.1, 480.6]), max_width=10)
+    assert solution.cut == 0
+    lo, hi = target_envelopes(targets([400.2, 403.7, 420.0, 421.1, 480.6]))
+    assert not np.any(grid_cut_counts(lo, hi, np.array(solution.lines)))
+    # 399.5 to 482.5 needs at least nine windows of at most 10 Th
+    assert solution.window_count == 9
+
+
+def brute_force(lo, hi, max_width, step=ROUNDING_STEP):
+    """(crossings, windows) of the best boundary set, trying every subset of grid points."""
+    first = int(np.floor(lo.min() / step))
+    last = int(np.ceil(hi.max() / step))
+    points = np.arange(first, last + 1) * step
+    cuts = grid_cut_counts(lo, hi, points)
+    best = None
+    inner = range(1, len(points) - 1)
+    for size in range(len(points) - 1):
+        for chosen in itertools.combinations(inner, size):
+            path = [0, *chosen, len(points) - 1]
+            if np.any(np.diff(points[path]) > max_width + 1e-9):
+                continue
+            score = (int(cuts[path].sum()), len(path) - 1)
+            best = score if best is None else min(best, score)
+    return best
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    df = targets(rng.uniform(500, 505, 4), charge=rng.choice([1, 2, 3], 4))
+    lo, hi = target_envelopes(df)
+    max_width = float(rng.choice([1.0, 1.5, 2.5]))
+    solution = solve_boundaries(df, max_width=max_width)
+    lines = np.array(solution.lines)
+    assert (int(grid_cut_counts(lo, hi, lines).sum()), len(lines) - 1) == brute_force(lo, hi, max_width)
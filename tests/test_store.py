@@ -0,0 +1,65 @@
+import itertools
+import os
+
+import pytest
+
+from isops import store
+from isops.store import SharedUploadStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Strictly increasing access times, so LRU order does not depend on the timer's resolution
+    ticks = itertools.count(1000.0)
+    monkeypatch.setattr(store.time, "time", lambda: next(ticks))
+
+
+def stored_bytes(upload_store):
+    with upload_store._connect() as conn:
+        return conn.execute("SELECT COALESCE(SUM(size), 0) FROM uploads").fetchone()[0]
+
+
+def test_instances_on_one_file_share_uploads(tmp_path):
+    first, second = SharedUploadStore(str(tmp_path)), SharedUploadStore(str(tmp_path))
+    assert first.get("a") is None
+    first.put("a", b"MZ,RT\n500,10\n")
+    assert second.get("a") == b"MZ,RT\n500,10\n"
+    second.put("b", b"MZ,RT\n600,20\n")
+    assert first.get("b") == b"MZ,RT\n600,20\n"
+    # Putting an existing key keeps its bytes
+    second.put("a", b"ignored")
+    assert first.get("a") == b"MZ,RT\n500,10\n"
+
+
+def test_eviction_respects_byte_limit(tmp_path, clock):
+    upload_store = SharedUploadStore(str(tmp_path), max_bytes=250)
+    for key in "abc":
+        upload_store.put(key, os.urandom(100))
+        assert stored_bytes(upload_store) <= 250
+    # The oldest upload went first
+    assert upload_store.get("a") is None
+    assert upload_store.get("b") is not None and upload_store.get("c") is not None
+
+    # Reading "b" makes "c" the least recently used
+    upload_store.get("b")
+    upload_store.put("d", os.urandom(100))
+    assert stored_bytes(upload_store) <= 250
+    assert [upload_store.get(key) is not None for key in "bcd"] == [True, False, True]
+
+
+def test_eviction_seen_by_other_instances(tmp_path, clock):
+    first = SharedUploadStore(str(tmp_path), max_bytes=250)
+    second = SharedUploadStore(str(tmp_path), max_bytes=250)
+    first.put("a", os.urandom(200))
+    second.put("b", os.urandom(200))
+    assert first.get("a") is None and first.get("b") is not None
+    assert stored_bytes(first) <= 250
+
+
+def test_upload_larger_than_limit_is_kept(tmp_path):
+    # The upload just put is never evicted, even when it alone exceeds the limit
+    upload_store = SharedUploadStore(str(tmp_path), max_bytes=10)
+    upload_store.put("a", os.urandom(5))
+    upload_store.put("big", os.urandom(50))
+    assert upload_store.get("a") is None
+    assert len(upload_store.get("big")) == 50
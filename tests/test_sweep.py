@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from isops.engine import auto_fill_lines, build_mz_index, round_half, seed_lines
+from isops.envelope import IsotopeEnvelope
+from isops.solver import solve_boundaries
+from isops.sweep import parameter_grid, run_sweep
+
+
+def direct_lines(df, envelope, params):
+    if params["method"] == "optimize":
+        return solve_boundaries(df, params["max_width"], params["margin_start"], params["margin_end"],
+                                params["step"], envelope).lines
+    seeds = sorted(set(float(line) for line in seed_lines(df)))
+    return auto_fill_lines(seeds, build_mz_index(df, envelope), params["max_width"])[0]
+
+
+def brute_force_scores(envelope, lines, max_width):
+    bounds = sorted(set(round_half(lines).tolist()))
+    windows = list(zip(bounds, bounds[1:]))
+    cut = [any(lo < bound < hi for bound in bounds) for lo, hi in zip(envelope.mz, envelope.top)]
+    return {
+        "windows": len(windows),
+        "violations": sum(cut),
+        "max_coisolated": max((int(np.count_nonzero((envelope.mz >= start) & (envelope.mz < end)))
+                               for start, end in windows), default=0),
+        "oversized": sum(end - start > max_width for start, end in windows),
+    }
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_sweep_matches_direct_runs(precursors, workers):
+    envelope = IsotopeEnvelope.from_frame(precursors)
+    grid = parameter_grid(max_widths=[2, 5], margins_start=[0.25, 0.5], methods=["optimize", "auto_fill"])
+    results = run_sweep(precursors, grid, workers=workers, envelope=envelope)
+
+    assert [{key: row[key] for key in params} for row, params in zip(results, grid)] == grid
+    for row, params in zip(results, grid):
+        lines = direct_lines(precursors, envelope, params)
+        expected = brute_force_scores(envelope, lines, params["max_width"])
+        assert {key: row[key] for key in expected} == expected, params
+        assert row["windows"] > 0
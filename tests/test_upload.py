@@ -0,0 +1,53 @@
+import base64
+import gzip
+import io
+
+import pandas as pd
+import pytest
+
+from conftest import EXAMPLE_DATA
+
+
+def data_url(raw):
+    return "data:application/octet-stream;base64," + base64.b64encode(raw).decode()
+
+
+@pytest.fixture
+def example_csv():
+    return (EXAMPLE_DATA / "win_df_1.csv").read_bytes()
+
+
+def test_tab_separated_upload_reads_like_csv(app, example_csv):
+    tsv = pd.read_csv(EXAMPLE_DATA / "win_df_1.csv").to_csv(sep="\t", index=False).encode()
+    df = app.read_upload(tsv)[0]
+    pd.testing.assert_frame_equal(df, app.read_upload(example_csv)[0])
+    status = app.upload_file(data_url(tsv), "win_df_1.tsv")[3]
+    assert status.startswith("Loaded win_df_1.tsv")
+
+
+@pytest.mark.parametrize("dropped", [["MZ"], ["RT"], ["MZ", "RT"]])
+def test_upload_without_required_columns_is_reported(app, example_csv, dropped):
+    raw = pd.read_csv(EXAMPLE_DATA / "win_df_1.csv").drop(columns=dropped).to_csv(index=False).encode()
+    key, lines, _, status = app.upload_file(data_url(raw), "table.txt")[:4]
+    assert key is None and lines == []
+    assert status == f"Could not read table.txt: missing column(s) {', '.join(dropped)}"
+
+
+def parquet_bytes(df):
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("filename, encode", [
+    ("win_df_1.csv.gz", gzip.compress),
+    ("win_df_1.parquet", lambda raw: parquet_bytes(pd.read_csv(io.BytesIO(raw)))),
+])
+def test_compressed_uploads_read_like_csv(app, example_csv, filename, encode):
+    raw = encode(example_csv)
+    df, indexes, session = app.read_upload(raw)
+    assert indexes is None and session is None
+    pd.testing.assert_frame_equal(df, app.read_upload(example_csv)[0])
+    key, lines, _, status = app.upload_file(data_url(raw), filename)[:4]
+    assert status.startswith(f"Loaded {filename}")
+    assert lines == app.upload_file(data_url(example_csv), "win_df_1.csv")[1]
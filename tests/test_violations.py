@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from isops.engine import round_half
+from isops.envelope import IsotopeEnvelope
+from isops.violations import FULL_RECOUNT_CHANGES, EnvelopeIndex, ViolationTracker
+
+
+def brute_force(df, lines):
+    """Rows with a rounded boundary strictly inside MZ..MZp2, and the boundaries doing it."""
+    envelope = IsotopeEnvelope.from_frame(df)
+    lo, hi = envelope.mz, envelope.top
+    boundaries = np.unique(round_half(lines))
+    inside = (boundaries[None, :] > lo[:, None]) & (boundaries[None, :] < hi[:, None])
+    return np.flatnonzero(inside.any(axis=1)), boundaries[inside.any(axis=0)]
+
+
+@pytest.fixture
+def tracker(precursors):
+    return ViolationTracker(EnvelopeIndex.from_frame(precursors))
+
+
+def test_tracker_matches_brute_force_through_edits(precursors, tracker):
+    rng = np.random.default_rng(3)
+    lo, hi = precursors["MZ"].min(), precursors["MZ"].max()
+    lines = np.sort(rng.uniform(lo, hi, 40)).tolist()
+    for step in range(60):
+        if step % 20 == 19:
+            # A wholesale change takes the full recount path
+            lines = np.sort(rng.uniform(lo, hi, FULL_RECOUNT_CHANGES + 10)).tolist()
+        else:
+            moved = rng.integers(len(lines))
+            lines[moved] += rng.normal(0, 2)
+            if step % 3 == 0:
+                lines.append(float(rng.uniform(lo, hi)))
+            if step % 5 == 0:
+                del lines[rng.integers(len(lines))]
+        report = tracker.update(lines)
+        rows, boundaries = brute_force(precursors, lines)
+        np.testing.assert_array_equal(report.rows, rows)
+        np.testing.assert_array_equal(report.boundaries, boundaries)
+
+
+def test_duplicate_boundaries_are_counted_per_line(precursors, tracker):
+    mz = float(precursors["MZ"].iloc[0]) + 0.2
+    assert tracker.update([mz, mz]).count > 0
+    # Removing one of two identical lines still leaves the envelope cut
+    assert tracker.update([mz]).count == tracker.update([mz, mz]).count
+    assert tracker.update([]).count == 0
+
+
+def test_status_changes_match_brute_force(precursors, tracker):
+    rng = np.random.default_rng(5)
+    lo, hi = precursors["MZ"].min(), precursors["MZ"].max()
+    old = np.sort(rng.uniform(lo, hi, 30)).tolist()
+    for _ in range(20):
+        new = list(old)
+        new[rng.integers(len(new))] += rng.normal(0, 3)
+        expected = np.setxor1d(brute_force(precursors, old)[0], brute_force(precursors, new)[0])
+        np.testing.assert_array_equal(tracker.status_changes(old, new), expected)
+        old = new
+    assert len(tracker.status_changes(old, list(old))) == 0
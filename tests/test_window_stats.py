@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from isops.engine import round_half
+from isops.envelope import IsotopeEnvelope
+from isops.window_stats import WindowStats
+
+
+def brute_force_row(df, envelope, start, end):
+    inside = (df["MZ"] >= start) & (df["MZ"] < end)
+    targets = df[inside]
+    types = targets.groupby("pair_number", observed=True)["Types"].agg(set)
+    r_start, r_end = round_half(start), round_half(end)
+    margin = None
+    if len(targets):
+        top = envelope.top[inside.to_numpy()]
+        margin = round(min(targets["MZ"].min() - r_start, r_end - top.max()), 4)
+    return {
+        "Start": start, "End": end, "Round_start": r_start, "Round_end": r_end,
+        "Width": round(end - start, 4), "Targets": len(targets),
+        "Complete_pairs": sum("Light" in kinds and kinds - {"Light"} != set() for kinds in types),
+        "Pairs": len(types), "Min_margin": margin,
+    }
+
+
+@pytest.mark.parametrize("n_lines", [2, 15, 300])
+def test_rows_match_brute_force(precursors, n_lines):
+    envelope = IsotopeEnvelope.from_frame(precursors)
+    stats = WindowStats(precursors, envelope=envelope)
+    lines = np.linspace(precursors["MZ"].min() - 1, precursors["MZ"].max() + 1, n_lines).round(3).tolist()
+    rows = stats.table(lines)
+    assert rows == [brute_force_row(precursors, envelope, start, end) for start, end in zip(lines, lines[1:])]
+
+
+def test_cached_rows_follow_edits(precursors):
+    envelope = IsotopeEnvelope.from_frame(precursors)
+    stats = WindowStats(precursors, envelope=envelope)
+    lines = np.linspace(350, 1250, 40).round(3).tolist()
+    stats.table(lines)
+    # Drag one boundary, then add another: only the new windows are recomputed
+    for lines in (lines[:5] + [lines[5] + 3.3] + lines[6:], sorted(lines + [777.7])):
+        expected = [brute_force_row(precursors, envelope, start, end) for start, end in zip(lines, lines[1:])]
+        assert stats.table(lines) == expected
@@ -0,0 +1,41 @@
+"""WSGI entry point for serving the designer with several worker processes.
+
+    ISOPS_STATE_DIR=/srv/isops gunicorn --workers 4 --bind 0.0.0.0:8050 "wsgi:create_app()"
+
+Every worker loads its own copy of the app. What they need to agree on
+lives in the state directory: uploaded files (so any worker can serve a
+dataset key the browser holds) and the results of background jobs
+(auto-fill, sweeps and saved projects), which need `pip install "dash[diskcache]"`.
+Everything else a session needs already travels with each request in the
+browser's dcc.Store components.
+"""
+import importlib.util
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+APP_PATH = Path(__file__).resolve().parent / "IsoPS_code_v1.16.py"
+APP_MODULE = "isops_app"
+# One host, many workers: the system temp directory is shared by all of them
+DEFAULT_STATE_DIR = os.path.join(tempfile.gettempdir(), "isops-state")
+
+
+def create_app(state_dir=None):
+    """Load the Dash app and return its Flask server.
+
+    state_dir defaults to $ISOPS_STATE_DIR, then to DEFAULT_STATE_DIR.
+    """
+    os.environ["ISOPS_STATE_DIR"] = state_dir or os.environ.get("ISOPS_STATE_DIR") or DEFAULT_STATE_DIR
+    if APP_MODULE not in sys.modules:
+        # The app's file name is not a valid module name, so load it by path. Registering
+        # it first lets Flask find its directory, and with it the assets folder.
+        spec = importlib.util.spec_from_file_location(APP_MODULE, APP_PATH)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[APP_MODULE] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[APP_MODULE]
+            raise
+    return sys.modules[APP_MODULE].create_app().server